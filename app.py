@@ -1,12 +1,17 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request
 import os
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
-import io
-import base64
+import gzip
 import logging
-from utils import generate_graph, prepare_data
+from urllib.parse import urlencode
+import metrics
+import profiling
+import query
+from graph_data import GRAPH_TYPES, IMAGE_MIMETYPES, graph_series, image_dpi, image_format
+from utils import generate_graph, generate_graph_image, prepare_data
+from dataset import DatasetManager
 
 matplotlib.use('Agg')
 
@@ -17,27 +22,26 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
 app.static_folder = 'static'
+metrics.instrument(app, GRAPH_TYPES)
+profiling.install(app)
+
+dataset_manager = DatasetManager("SCHOLAR.csv", "NSERC.csv", prepare_data)
 
 try:
-    citations_df = pd.read_csv("SCHOLAR.csv", header=None)
-    citations_df.columns = ["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"]
-    
-    grants_df = pd.read_csv("NSERC.csv")
+    dataset = dataset_manager.load()
     
-    logger.info(f"Citations data loaded: {len(citations_df)} records")
-    logger.info(f"Grants data loaded: {len(grants_df)} records")
+    logger.info(f"Citations data loaded: {len(dataset.citations)} records")
+    logger.info(f"Grants data loaded: {len(dataset.grants)} records")
     
-    universities = citations_df['University'].dropna().unique().tolist()
+    universities = dataset.citations['University'].dropna().unique().tolist()
     universities = [uni for uni in universities if uni != 'NOT_FOUND']
     universities.sort()
     
-    fiscal_years = citations_df['Fiscal Year'].dropna().unique().tolist()
+    fiscal_years = dataset.citations['Fiscal Year'].dropna().unique().tolist()
     fiscal_years.sort(reverse=True)
     
 except Exception as e:
     logger.error(f"Error loading data: {str(e)}")
-    citations_df = None
-    grants_df = None
     universities = []
     fiscal_years = []
 
@@ -56,33 +60,119 @@ def get_graph():
         
         logger.debug(f"Graph request - Type: {graph_type}, University: {university}, Time Frame: {time_frame}")
         
-        img_data = generate_graph(citations_df, grants_df, graph_type, university, time_frame)
-        return jsonify({'image': img_data})
+        dataset = dataset_manager.get()
+        img_data = generate_graph(dataset, graph_type, university, time_frame)
+        with metrics.stage("encode"):
+            response = jsonify({'image': img_data})
+        return response
         
     except Exception as e:
         logger.error(f"Error generating graph: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/graph.<extension>')
+@app.route('/graph/image')
+def get_graph_image(extension=None):
+    try:
+        graph_type = request.args.get('type', 'citation_vs_grants')
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        
+        fmt = image_format(extension, request.accept_mimetypes)
+        if fmt is None:
+            return jsonify({'error': f"Unsupported image format: {extension}"}), 404
+        # dashboard figures use the 10 x 6 inch figure size it sets in rcParams.
+        dpi = image_dpi(request.args, 100, plt.rcParams["figure.figsize"][0])
+        
+        dataset = dataset_manager.get()
+        image = generate_graph_image(dataset, graph_type, university, time_frame, fmt, dpi)
+        response = app.response_class(image, mimetype=IMAGE_MIMETYPES[fmt])
+        if fmt == 'svg':
+            if 'gzip' in request.accept_encodings:
+                with metrics.stage("encode"):
+                    response.set_data(gzip.compress(image, 6))
+                response.content_encoding = 'gzip'
+            response.vary.add('Accept-Encoding')
+        if extension is None:
+            response.vary.add('Accept')
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error generating graph image: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def summary_stats(dataset, university, time_frame):
+    cells = dataset.merged_cells(university, time_frame)
+    citations = dataset.stats.moments('CitationCount', cells)
+    grants = dataset.stats.moments('Amount($)', cells)
+    
+    return {
+        'total_citations': int(citations.total),
+        'total_grants': int(grants.total),
+        'avg_citations': round(citations.mean, 2),
+        'avg_grants': round(grants.mean, 2),
+        'researchers_count': dataset.stats.distinct(cells)
+    }
+
 @app.route('/data/summary')
 def get_data_summary():
     try:
         university = request.args.get('university', 'all')
         time_frame = request.args.get('timeframe', 'all')
         
-        df = prepare_data(citations_df, grants_df, university, time_frame)
+        dataset = dataset_manager.get()
         
-        stats = {
-            'total_citations': int(df['CitationCount'].sum()),
-            'total_grants': int(df['Amount($)'].sum()),
-            'avg_citations': round(df['CitationCount'].mean(), 2),
-            'avg_grants': round(df['Amount($)'].mean(), 2),
-            'researchers_count': df['Name'].nunique()
+        return jsonify(summary_stats(dataset, university, time_frame))
+    except Exception as e:
+        logger.error(f"Error calculating summary stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/dashboard')
+def get_dashboard():
+    try:
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        graph_types = [name for name in request.args.get('graphs', ','.join(GRAPH_TYPES)).split(',') if name]
+        
+        unknown = [name for name in graph_types if name not in GRAPH_TYPES]
+        if unknown:
+            return jsonify({'error': f"Unknown graph type: {', '.join(unknown)}"}), 400
+        
+        dataset = dataset_manager.get()
+        with metrics.stage("filter"):
+            filtered_df = query.execute(query.filtered_query(dataset.merged, university, time_frame, dataset.index))
+        metrics.count_rows("filter", len(filtered_df))
+        with metrics.stage("series"):
+            graphs = {graph_type: graph_series(filtered_df, graph_type) for graph_type in graph_types}
+        
+        comoments, _ = dataset.merged_correlation(university, time_frame)
+        payload = {
+            'university': university,
+            'timeframe': time_frame,
+            'summary': summary_stats(dataset, university, time_frame),
+            'graphs': graphs,
+            # No bootstrap here, so no interval.
+            'correlation': {
+                'university': university,
+                'n': comoments.count,
+                'pearson': None if np.isnan(comoments.pearson) else round(float(comoments.pearson), 4),
+            },
         }
+        if request.args.get('images') == '1':
+            payload['images'] = {
+                graph_type: '/graph.png?' + urlencode({'type': graph_type, 'university': university,
+                                                       'timeframe': time_frame})
+                for graph_type in graph_types
+            }
         
-        return jsonify(stats)
+        return jsonify(payload)
     except Exception as e:
-        logger.error(f"Error calculating summary stats: {str(e)}")
+        logger.error(f"Error building dashboard: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,86 @@
+"""Time for a complete bootstrap run: every university and time frame, vectorized versus a Python loop.
+
+Usage: python -m benchmarks.bootstrap [--scales 1 10] [--resamples 2000] [--workers 0 2]
+
+Uses the replicated sample data of benchmarks.summary_cube. "loop" draws and
+reduces one resample at a time with np.corrcoef/np.polyfit, for the 'all'
+filter of the first time frame only (extrapolated to the full run); the
+other columns run BootstrapEngine over all filters with that many worker
+processes (0 = in-process).
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.summary_cube import REPO_ROOT, TIME_FRAMES, scaled_frames
+
+
+def loop_bootstrap(x, y, resamples, seed):
+    rng = np.random.default_rng(seed)
+    pearson = np.empty(resamples)
+    slope = np.empty(resamples)
+    for i in range(resamples):
+        rows = rng.integers(0, len(x), size=len(x))
+        pearson[i] = np.corrcoef(x[rows], y[rows])[0, 1]
+        slope[i] = np.polyfit(x[rows], y[rows], 1)[0]
+    return pearson, slope
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_WARMUP"] = "0"
+    os.environ["CITCO_RENDER_WORKERS"] = "0"
+    os.environ["CITCO_BOOTSTRAP_WORKERS"] = "0"
+    logging.disable(logging.CRITICAL)
+    from bootstrap import BootstrapEngine
+    from dataset import Dataset
+    from main import preprocess_data, universities
+    from normalize import with_name_keys
+
+    names = ['all'] + universities
+    print(f"{len(names)} filters x {len(TIME_FRAMES)} time frames, {args.resamples} resamples, "
+          f"{os.cpu_count()} cores")
+    print(f"{'scale':>6}{'merged rows':>13}{'loop (s)':>10}"
+          + "".join(f"{f'{workers} workers (s)':>16}" for workers in args.workers))
+    for scale in args.scales:
+        citations, grants = scaled_frames(scale)
+        citations = with_name_keys(citations, flip=False)
+        grants = with_name_keys(grants)
+        merged = preprocess_data(citations, grants)
+        dataset = Dataset(f"scale-{scale}", citations, grants, merged)
+
+        rows = dataset.index.filter(merged, 'all', TIME_FRAMES[0])
+        x = rows["CitationCount"].to_numpy(dtype=float)
+        y = rows["Amount($)"].to_numpy(dtype=float)
+        start = time.perf_counter()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            loop_bootstrap(x, y, args.resamples, 0)
+        # Cost scales with the rows resampled; extrapolate from the 'all' filter to the whole run.
+        run_rows = sum(len(dataset.index.rows(name, time_frame)) for name in names for time_frame in TIME_FRAMES)
+        loop = (time.perf_counter() - start) * run_rows / len(x)
+
+        timings = []
+        for workers in args.workers:
+            engine = BootstrapEngine(workers=workers, resamples=args.resamples)
+            engine.start()
+            start = time.perf_counter()
+            for time_frame in TIME_FRAMES:
+                engine.intervals(dataset, names, time_frame)
+            timings.append(time.perf_counter() - start)
+            engine.close()
+        print(f"{scale:>6}{len(merged):>13}{loop:>9.2f}~" + "".join(f"{t:>16.2f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
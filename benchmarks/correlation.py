@@ -0,0 +1,87 @@
+"""/data/correlation latency: row scans versus the co-moment cube and rank index.
+
+Usage: python -m benchmarks.correlation [--scales 1 10 100] [--runs 5]
+
+Uses the replicated sample data of benchmarks.summary_cube. For every
+university and time frame, Pearson, Spearman and the least-squares fit are
+computed by filtering and ranking the rows (pandas corr/rank, np.polyfit),
+and from the dataset's CorrelationCube and RankIndex without its memo; the
+two must agree. Reports the median time per query.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+
+from benchmarks.summary_cube import REPO_ROOT, TIME_FRAMES, scaled_frames, time_queries
+
+
+def scan_correlation(dataset, university, time_frame):
+    from main import filter_data
+
+    merged = filter_data(dataset.merged, university, time_frame)
+    x, y = merged["CitationCount"], merged["Amount($)"]
+    if len(merged) < 2 or x.nunique() < 2:
+        return len(merged), None, None, None
+    slope, _ = np.polyfit(x, y, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return len(merged), x.corr(y), x.rank().corr(y.rank()), slope
+
+
+def cube_correlation(dataset, university, time_frame):
+    comoments = dataset.correlation.comoments(dataset.merged_cells(university, time_frame))
+    rho = dataset.ranks.spearman(dataset.index.rows(university, time_frame))
+    if comoments.count < 2 or np.isnan(comoments.slope):
+        return comoments.count, None, None, None
+    return comoments.count, comoments.pearson, rho, comoments.slope
+
+
+def close(a, b):
+    if a[0] != b[0]:
+        return False
+    return all((p is None and q is None) or (p is not None and q is not None and (p != p) == (q != q)
+                                             and (p != p or abs(p - q) <= 1e-8 * max(1.0, abs(q))))
+               for p, q in zip(a[1:], b[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_WARMUP"] = "0"
+    logging.disable(logging.CRITICAL)
+    from dataset import Dataset
+    from main import preprocess_data, universities
+    from normalize import with_name_keys
+
+    queries = [(university, time_frame) for university in ['all'] + universities
+               for time_frame in TIME_FRAMES]
+
+    print(f"{len(queries)} university/time-frame queries, median of {args.runs} runs")
+    print(f"{'scale':>6}{'merged rows':>13}{'scan (ms)':>11}{'cube (ms)':>11}{'speedup':>9}")
+    for scale in args.scales:
+        citations, grants = scaled_frames(scale)
+        citations = with_name_keys(citations, flip=False)
+        grants = with_name_keys(grants)
+        merged = preprocess_data(citations, grants)
+        dataset = Dataset(f"scale-{scale}", citations, grants, merged)
+
+        for university, time_frame in queries:
+            expected = scan_correlation(dataset, university, time_frame)
+            actual = cube_correlation(dataset, university, time_frame)
+            if not close(expected, actual):
+                sys.exit(f"Mismatch for {university}/{time_frame}: scan {expected}, cube {actual}")
+
+        scan = time_queries(scan_correlation, dataset, queries, args.runs)
+        cube = time_queries(cube_correlation, dataset, queries, args.runs)
+        print(f"{scale:>6}{len(merged):>13}{scan * 1000:>11.3f}{cube * 1000:>11.3f}{scan / cube:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
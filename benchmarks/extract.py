@@ -0,0 +1,77 @@
+"""Scholar page extraction: speed and memory per backend.
+
+Usage: python -m benchmarks.extract [--pages fixtures/scholar] [--repeat 20] [--backends bs4 lxml regex]
+
+Runs every backend in scholar_extract.py over the saved search and profile
+pages and reports pages per second and peak traced memory for each backend.
+That the backends agree is checked by tests/test_scholar_extract.py.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import scholar_extract
+
+METHODS = ("author_id", "profile", "publications")
+
+
+def load_pages(directory):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def extract_page(extractor, html):
+    return {method: getattr(extractor, method)(html) for method in METHODS}
+
+
+def measure(extractor, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            extract_page(extractor, html)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for html in pages.values():
+        extract_page(extractor, html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(pages) * repeat / elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default=os.path.join("fixtures", "scholar"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=list(scholar_extract.BACKENDS))
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No .html pages in {args.pages}")
+
+    backends = []
+    for name in args.backends:
+        try:
+            backends.append(scholar_extract.get_extractor(name))
+        except ImportError as e:
+            print(f"Skipping {name}: {str(e)}")
+
+    size = sum(len(html) for html in pages.values())
+    print(f"{len(pages)} pages ({size / 1024:.0f} KiB), {args.repeat} passes")
+    print(f"{'backend':>10}{'pages/s':>12}{'speedup':>10}{'peak MiB':>10}")
+    baseline = None
+    for extractor in backends:
+        rate, peak = measure(extractor, pages, args.repeat)
+        baseline = baseline or rate
+        print(f"{extractor.name:>10}{rate:>12.1f}{rate / baseline:>9.1f}x{peak / 2 ** 20:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""/graph (base64 PNG in JSON) versus the raw /graph.png, .webp and .svg bodies.
+
+Usage: python -m benchmarks.graph_formats [--runs 3]
+
+Requests every graph type for each university and time frame through the
+Flask test client, with the graph cache emptied before each request and
+rendering in-process (CITCO_RENDER_WORKERS=0), so each request pays for a
+full render. Reports the mean response body size and the server CPU time
+(process time) per request for each variant. SVG is sent gzip-compressed,
+as for a browser that accepts gzip.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from benchmarks.summary_cube import REPO_ROOT, TIME_FRAMES
+
+VARIANTS = [
+    ('/graph (JSON)', '/graph', {}, {}),
+    ('/graph.png', '/graph.png', {}, {}),
+    ('/graph.webp', '/graph.webp', {}, {}),
+    ('/graph.svg (gzip)', '/graph.svg', {}, {'Accept-Encoding': 'gzip'}),
+    ('/graph.png?dpi=40', '/graph.png', {'dpi': 40}, {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_WARMUP"] = "0"
+    os.environ["CITCO_RENDER_WORKERS"] = "0"
+    os.environ["CITCO_BOOTSTRAP_WORKERS"] = "0"
+    logging.disable(logging.CRITICAL)
+    import main as citco
+    from graph_cache import GraphCache
+    from graph_data import GRAPH_TYPES
+
+    citco.graph_cache = GraphCache()
+    client = citco.app.test_client()
+    queries = [{'type': graph_type, 'university': university, 'timeframe': time_frame}
+               for graph_type in GRAPH_TYPES
+               for university in ['all'] + citco.universities
+               for time_frame in TIME_FRAMES]
+
+    print(f"{len(queries)} graphs, {args.runs} runs, cache emptied before each request")
+    print(f"{'variant':<22}{'mean bytes':>12}{'vs JSON':>9}{'CPU ms/request':>16}{'vs JSON':>9}")
+    baseline = None
+    for name, path, extra, headers in VARIANTS:
+        sizes, cpu = [], []
+        for _ in range(args.runs):
+            for query in queries:
+                citco.graph_cache.clear()
+                start = time.process_time()
+                response = client.get(path, query_string={**query, **extra}, headers=headers)
+                cpu.append(time.process_time() - start)
+                if response.status_code != 200:
+                    sys.exit(f"{path} {query}: status {response.status_code}")
+                sizes.append(len(response.get_data()))
+        size = sum(sizes) / len(sizes)
+        ms = sum(cpu) / len(cpu) * 1000
+        if baseline is None:
+            baseline = (size, ms)
+        print(f"{name:<22}{size:>12.0f}{size / baseline[0] - 1:>+9.0%}{ms:>16.1f}{ms / baseline[1] - 1:>+9.0%}")
+
+
+if __name__ == "__main__":
+    main()
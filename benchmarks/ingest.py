@@ -0,0 +1,77 @@
+"""Time to pick up newly appended citation rows: incremental ingest versus a full reload.
+
+Usage: python -m benchmarks.ingest [--scale 200] [--append 300]
+
+Writes the sample data replicated `scale` times into a temporary directory,
+holds back the last `append` citation rows, loads the rest, then appends
+them and measures how long DatasetManager takes to serve them, first by
+tailing the file and then by a full reload. Both must give the same merged
+rows.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.snapshot_load import REPO_ROOT, write_scaled_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=200)
+    parser.add_argument("--append", type=int, default=300)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_SNAPSHOT"] = "0"
+    os.environ["CITCO_WARMUP"] = "0"
+    os.environ["CITCO_RENDER_WORKERS"] = "0"
+    logging.disable(logging.CRITICAL)
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    import main as app_main
+    from dataset import DatasetManager
+    os.chdir(cwd)
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_scaled_data(directory, args.scale)
+        citations_path = os.path.join(directory, "SCHOLAR.csv")
+        grants_path = os.path.join(directory, "NSERC.csv")
+        with open(citations_path, "rb") as f:
+            lines = f.readlines()
+        held_back = lines[-args.append:]
+        with open(citations_path, "wb") as f:
+            f.writelines(lines[:-args.append])
+
+        manager = DatasetManager(citations_path, grants_path, app_main.preprocess_data)
+        start = time.perf_counter()
+        manager.load()
+        initial = time.perf_counter() - start
+
+        with open(citations_path, "ab") as f:
+            f.writelines(held_back)
+        start = time.perf_counter()
+        incremental = manager.refresh()
+        incremental_seconds = time.perf_counter() - start
+
+        full_manager = DatasetManager(citations_path, grants_path, app_main.preprocess_data, incremental=False)
+        start = time.perf_counter()
+        full = full_manager.load()
+        full_seconds = time.perf_counter() - start
+
+        same = (incremental.merged.reset_index(drop=True).astype(str)
+                .equals(full.merged.reset_index(drop=True).astype(str)))
+        if manager.incremental_updates != 1 or not same:
+            sys.exit("Incremental ingest did not match the full reload")
+
+    print(f"{len(lines)} citation rows, {len(full.grants)} grants, {len(full.merged)} merged; "
+          f"{args.append} rows appended")
+    print(f"{'initial load':>16}{initial:>10.3f}s")
+    print(f"{'incremental':>16}{incremental_seconds:>10.3f}s")
+    print(f"{'full reload':>16}{full_seconds:>10.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Name linkage time as the name lists grow: blocked candidates versus all pairs.
+
+Usage: python -m benchmarks.linkage [--sizes 10000 30000 100000] [--seed 0]
+
+Generates n synthetic grant holders ("Last, First" as in NSERC.csv) and n
+Scholar names: 60% written the same way, 20% varied (hyphenated or split
+surname, middle initial, accent, initial for the given name, one-letter
+typo) and 20% people without a grant. Reports the time to link the lists,
+the candidate pairs scored per Scholar name, and precision/recall of the
+varied names against the generated truth. All-pairs scoring is timed on a
+sample and extrapolated to n x n.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SYLLABLES = ["ka", "ri", "mo", "ta", "len", "zu", "an", "bel", "cho", "da", "fer", "gi", "han", "is", "jo",
+             "kov", "li", "mar", "nak", "or", "pet", "qui", "ros", "sa", "tor", "ul", "vic", "wen", "xi",
+             "yam", "zel", "ber", "din", "el", "gar", "hu", "ing", "jam", "kim", "lo", "mun", "nor", "ost"]
+ACCENTS = {"e": "é", "o": "ö", "a": "á", "u": "ü"}
+
+
+def random_word(rng, parts):
+    return "".join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def vary(rng, first, last):
+    choice = rng.integers(6)
+    if choice == 0 and len(last) > 4:
+        cut = len(last) // 2
+        return f"{first} {last[:cut]}-{last[cut:].capitalize()}"
+    if choice == 1:
+        return f"{first} {rng.choice(list('ABCDEFGHJKLMNPRST'))}. {last}"
+    if choice == 2:
+        for plain, accented in ACCENTS.items():
+            if plain in last:
+                return f"{first} {last.replace(plain, accented, 1)}"
+    if choice == 3:
+        return f"{first[0]}. {last}"
+    if choice == 4 and len(last) > 5:
+        i = rng.integers(1, len(last) - 1)
+        return f"{first} {last[:i]}{last[i]}{last[i:]}"
+    return f"{first} {last}"
+
+
+def synthetic_names(n, rng):
+    firsts = [random_word(rng, rng.integers(2, 4)) for _ in range(n)]
+    lasts = [random_word(rng, rng.integers(2, 5)) for _ in range(n)]
+    grants = [f"{last}, {first}" for first, last in zip(firsts, lasts)]
+    scholar, truth = [], {}
+    for i, (first, last) in enumerate(zip(firsts, lasts)):
+        kind = i % 10
+        if kind < 6:
+            scholar.append(f"{first} {last}")
+        elif kind < 8:
+            name = vary(rng, first, last)
+            scholar.append(name)
+            if name.lower() != f"{first} {last}".lower():
+                truth[name.lower()] = f"{first} {last}".lower()
+        else:
+            scholar.append(f"{random_word(rng, 3)} {random_word(rng, 4)}")
+    return grants, scholar, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    import pandas as pd
+    from linkage import NameLinker, name_score, name_tokens
+    from normalize import name_keys
+
+    print(f"{'names':>8}{'link (s)':>10}{'us/name':>9}{'cands/name':>12}{'all pairs (s)':>15}"
+          f"{'precision':>11}{'recall':>8}")
+    for n in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        grants, scholar, truth = synthetic_names(n, rng)
+        grant_keys = name_keys(pd.Series(grants))
+        scholar_keys = name_keys(pd.Series(scholar), flip=False)
+
+        start = time.perf_counter()
+        linker = NameLinker(grant_keys)
+        links = linker.link(scholar_keys)
+        seconds = time.perf_counter() - start
+
+        grant_key_set = set(grant_keys)
+        unmatched = [key for key in pd.unique(scholar_keys) if key not in grant_key_set]
+        sample = unmatched[:200]
+        candidates = np.mean([len(linker.candidates(name_tokens(key))) for key in sample])
+
+        # All-pairs cost: score a few Scholar names against every grant key, extrapolate.
+        tokens = [name_tokens(key) for key in grant_keys[:n]]
+        probe = [name_tokens(key) for key in unmatched[:3]]
+        start = time.perf_counter()
+        for query in probe:
+            for other in tokens:
+                name_score(query, other)
+        all_pairs = (time.perf_counter() - start) / len(probe) * len(unmatched)
+
+        found = dict(zip(links["Scholar Key"], links["Grant Key"]))
+        correct = sum(1 for key, grant_key in found.items() if truth.get(key) == grant_key)
+        precision = correct / len(found) if found else float('nan')
+        recall = sum(1 for key, grant_key in truth.items() if found.get(key) == grant_key) / len(truth)
+        print(f"{n:>8}{seconds:>10.2f}{seconds / n * 1e6:>9.1f}{candidates:>12.1f}{all_pairs:>14.0f}~"
+              f"{precision:>11.3f}{recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
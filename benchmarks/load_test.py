@@ -0,0 +1,287 @@
+"""HTTP load test replaying dashboard sessions against a running main.py or app.py.
+
+Usage: python -m benchmarks.load_test [--url http://127.0.0.1:5003] [--concurrency 8]
+                                      [--sessions 100 | --duration 60] [--changes 5]
+                                      [--graph-image] [--think 0] [--seed 0]
+                                      [--report report.json] [--compare old_report.json]
+
+Each of `concurrency` virtual users runs sessions back to back, making the
+requests static/js/main.js makes: the page, then /dashboard (summary,
+correlation and every graph's series in one response), then `changes`
+random filter changes. A university or time frame change fetches
+/dashboard again; a chart type change is drawn from the last response and
+needs no request. With --graph-image the users act as browsers without
+canvas: /dashboard is requested with images=1 and the current chart's image
+is loaded from the URL it returns, also after chart type changes.
+Universities and time frames come from the page's <select> options.
+
+A request counts as an error on a connection failure, a non-2xx status,
+or a JSON body with an "error" key. The report lists, per endpoint and per
+endpoint + filter combination: request count, throughput, p50/p95/p99
+latency (to the last body byte) and error rate. --report writes it as
+JSON, and --compare prints the p50/p95 and error rate change of each
+endpoint against an earlier report.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, quote, urlsplit
+
+GRAPH_TYPES = ['citation_vs_grants', 'avg_citations', 'avg_grants']
+
+
+class Recorder:
+    """Latencies and errors per endpoint and per endpoint + filter combination."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint, combination, seconds, status, failed):
+        with self._lock:
+            for key in (endpoint, f"{endpoint} {combination}" if combination else None):
+                if key is None:
+                    continue
+                self.samples[key].append(seconds)
+                self.errors[key] += failed
+                self.statuses[key][str(status)] += 1
+
+
+class Client:
+    """One virtual user: a keep-alive connection and the dashboard's filter state."""
+
+    def __init__(self, url, recorder, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.connection = None
+
+    def get(self, path, params=None):
+        """(status, parsed JSON or None) for GET path?params; records the request."""
+        query = "&".join(f"{key}={quote(str(value))}" for key, value in (params or {}).items())
+        combination = " ".join(f"{key}={value}" for key, value in (params or {}).items())
+        start = time.perf_counter()
+        status, body, failed = None, None, True
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.connection.request("GET", f"{path}?{query}" if query else path)
+            response = self.connection.getresponse()
+            raw = response.read()
+            status = response.status
+            failed = not 200 <= status < 300
+            if response.getheader("Content-Type", "").startswith("application/json"):
+                body = json.loads(raw)
+                failed = failed or (isinstance(body, dict) and 'error' in body)
+            if response.will_close:
+                self.close()
+        except Exception as e:
+            status = type(e).__name__
+            self.close()
+        self.recorder.add(path, combination, time.perf_counter() - start, status, failed)
+        return status, body
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def page_options(html, select_id):
+    match = re.search(rf'<select id="{select_id}">(.*?)</select>', html, re.S)
+    return re.findall(r'<option value="([^"]*)"', match.group(1)) if match else ['all']
+
+
+def fetch_dashboard(client, state, graph_image):
+    params = {'university': state['university'], 'timeframe': state['timeframe']}
+    if graph_image:
+        params['images'] = '1'
+    _, body = client.get("/dashboard", params)
+    state['images'] = (body or {}).get('images') or {}
+
+
+def fetch_image(client, state):
+    # The image URLs carry the filter; fall back to the negotiated image like main.js does.
+    url = state['images'].get(state['type'])
+    if url is not None:
+        path, _, query = url.partition("?")
+        client.get(path, dict(parse_qsl(query)))
+    else:
+        client.get("/graph/image", {'type': state['type'], 'university': state['university'],
+                                    'timeframe': state['timeframe']})
+
+
+def run_session(client, rng, options, args):
+    state = {'type': GRAPH_TYPES[0], 'university': 'all', 'timeframe': 'all', 'images': {}}
+    client.get("/")
+    fetch_dashboard(client, state, args.graph_image)
+    if args.graph_image:
+        fetch_image(client, state)
+    for _ in range(args.changes):
+        if args.think:
+            time.sleep(rng.expovariate(1 / args.think))
+        change = rng.choice(['university', 'timeframe', 'type'])
+        if change == 'type':
+            state['type'] = GRAPH_TYPES[(GRAPH_TYPES.index(state['type']) + 1) % len(GRAPH_TYPES)]
+        else:
+            state[change] = rng.choice(options[change])
+            fetch_dashboard(client, state, args.graph_image)
+        if args.graph_image:
+            fetch_image(client, state)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(recorder, seconds):
+    report = {}
+    for key, samples in recorder.samples.items():
+        ordered = sorted(samples)
+        report[key] = {
+            'requests': len(ordered),
+            'throughput': round(len(ordered) / seconds, 3),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2),
+            'error_rate': round(recorder.errors[key] / len(ordered), 4),
+            'statuses': dict(recorder.statuses[key]),
+        }
+    return report
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'':<60}{'requests':>9}{'req/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'errors':>8}")
+    for key, row in rows:
+        print(f"{key[:59]:<60}{row['requests']:>9}{row['throughput']:>9.2f}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['error_rate']:>8.1%}")
+
+
+def compare(report, path):
+    with open(path) as f:
+        old = json.load(f)
+    print(f"\nChange against {path} ({old.get('commit') or 'unknown commit'}, {old.get('recorded')})")
+    print(f"{'endpoint':<30}{'p50':>10}{'p95':>10}{'errors':>16}")
+    for endpoint, row in sorted(report['endpoints'].items()):
+        before = old.get('endpoints', {}).get(endpoint)
+        if before is None:
+            print(f"{endpoint:<30}{'new':>10}")
+            continue
+        changes = [f"{(row[name] / before[name] - 1) * 100:>+9.0f}%" if before[name] else f"{'-':>10}"
+                   for name in ('p50_ms', 'p95_ms')]
+        print(f"{endpoint:<30}{''.join(changes)}{before['error_rate']:>8.1%} ->{row['error_rate']:>6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5003")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=100, help="total sessions (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="run for this many seconds instead")
+    parser.add_argument("--changes", type=int, default=5, help="filter changes per session")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between filter changes")
+    parser.add_argument("--graph-image", action="store_true", help="load server-rendered images, as browsers without canvas do")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=10, help="slowest filter combinations to print")
+    parser.add_argument("--report")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    probe = Client(args.url, Recorder(), args.timeout)
+    try:
+        probe.connection = http.client.HTTPConnection(probe.host, probe.port, timeout=args.timeout)
+        probe.connection.request("GET", "/")
+        html = probe.connection.getresponse().read().decode("utf-8", "replace")
+    except Exception as e:
+        sys.exit(f"Cannot load {args.url}/: {str(e)}")
+    finally:
+        probe.close()
+    options = {'university': page_options(html, "university-select"),
+               'timeframe': page_options(html, "timeframe-select")}
+    print(f"{args.url}: {len(options['university'])} universities, {len(options['timeframe'])} time frames, "
+          f"{args.concurrency} virtual users")
+
+    remaining = [args.sessions]
+    completed = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else None
+
+    def user(number):
+        rng = random.Random(args.seed * 1000003 + number)
+        client = Client(args.url, recorder, args.timeout)
+        while True:
+            with lock:
+                if deadline is None:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            run_session(client, rng, options, args)
+            with lock:
+                completed[0] += 1
+        client.close()
+
+    threads = [threading.Thread(target=user, args=(number,), daemon=True) for number in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    rows = summarize(recorder, seconds)
+    endpoints = {key: row for key, row in rows.items() if " " not in key}
+    combinations = {key: row for key, row in rows.items() if " " in key}
+    total = sum(row['requests'] for row in endpoints.values())
+    errors = sum(recorder.errors[key] for key in endpoints)
+    print(f"{completed[0]} sessions, {total} requests in {seconds:.1f}s: {total / seconds:.1f} req/s, "
+          f"{errors / max(total, 1):.1%} errors")
+    print_table("Per endpoint", sorted(endpoints.items()))
+    slowest = sorted(combinations.items(), key=lambda item: item[1]['p95_ms'], reverse=True)[:args.top]
+    print_table(f"Slowest {len(slowest)} filter combinations by p95", slowest)
+
+    report = {
+        'recorded': datetime.datetime.now().isoformat(timespec='seconds'),
+        'url': args.url,
+        'options': {name: value for name, value in vars(args).items() if name not in ('report', 'compare')},
+        'sessions': completed[0],
+        'seconds': round(seconds, 3),
+        'requests': total,
+        'throughput': round(total / seconds, 3),
+        'error_rate': round(errors / max(total, 1), 4),
+        'endpoints': endpoints,
+        'combinations': combinations,
+    }
+    try:
+        from benchmarks.suite import git_commit
+        report['commit'] = git_commit()
+    except Exception:
+        report['commit'] = None
+    if args.compare:
+        compare(report, args.compare)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"\nWrote {args.report}")
+
+
+if __name__ == "__main__":
+    main()
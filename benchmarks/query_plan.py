@@ -0,0 +1,63 @@
+"""Per-request merged queries: merge everything then filter, versus the optimized plan.
+
+Usage: python -m benchmarks.query_plan [--rows 10000 100000] [--institutions 300 5000] [--repeat 3] [--seed 0]
+
+For synthetic frames of each size and institution count (benchmarks.synthetic),
+the query behind utils.prepare_data and dashboard.py's graphs is run for a few
+university and time-frame filters two ways: the plan exactly as written (scan every column,
+normalize every row, join, then filter, which is what the code did before
+query.py) and after query.optimize (predicates below the join, unused
+columns pruned, the join limited to the candidate fiscal years). The results
+must be identical; the best time of `repeat` runs of each is reported.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES = [('all', 'all'), ('all', '3y'), ('University of Waterloo', 'all'), ('University of Waterloo', '3y'),
+           ('Toronto', '1y'), ('University of', '3y'), ('all', '10y')]
+
+
+def best_time(run, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--institutions", type=int, nargs="+", default=[300, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    logging.disable(logging.CRITICAL)
+    import query
+    from benchmarks.synthetic import synthetic_frames
+
+    for rows, institutions in [(rows, institutions) for rows in args.rows for institutions in args.institutions]:
+        citations, grants = synthetic_frames(rows, args.seed, institutions)
+        print(f"\n{rows} rows, {institutions} institutions, best of {args.repeat}")
+        print(f"{'university':<26}{'time frame':<12}{'rows out':>9}{'as written (s)':>16}{'optimized (s)':>15}{'speedup':>9}")
+        for university, time_frame in QUERIES:
+            plan = query.merged_query(citations, grants, university, time_frame)
+            written, expected = best_time(plan.execute, args.repeat)
+            optimized, result = best_time(lambda: query.execute(plan), args.repeat)
+            if not result.reset_index(drop=True).equals(expected.reset_index(drop=True)):
+                sys.exit(f"{university} {time_frame}: the optimized plan returned different rows")
+            print(f"{university:<26}{time_frame:<12}{len(result):>9}{written:>16.4f}{optimized:>15.4f}"
+                  f"{written / optimized:>8.1f}x")
+        print(query.explain(query.optimize(query.merged_query(citations, grants, *QUERIES[3]))))
+
+
+if __name__ == "__main__":
+    main()
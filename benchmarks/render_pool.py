@@ -0,0 +1,86 @@
+"""Graph rendering throughput: fresh figures versus reused templates and worker processes.
+
+Usage: python -m benchmarks.render_pool [--renders 60] [--threads 8] [--workers 1 2 4]
+
+Renders the three graph types over the sample data from `threads` concurrent
+request threads. "fresh" builds and styles a new figure for every render, as
+main.py did before the render pool; "templates" reuses the pre-styled figures
+in-process (CITCO_RENDER_WORKERS=0); the remaining rows go through a
+RenderPool with that many worker processes.
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def payloads(merged):
+    from graph_data import scatter_payload
+
+    x = merged["CitationCount"].to_numpy(dtype=float)
+    y = merged["Amount($)"].to_numpy(dtype=float)
+    jobs = [('citation_vs_grants', (scatter_payload(x, y),))]
+    for graph_type, column in (('avg_citations', "CitationCount"), ('avg_grants', "Amount($)")):
+        means = merged.groupby("Fiscal Year")[column].mean().sort_index()
+        jobs.append((graph_type, ([str(year) for year in means.index], means.to_numpy(dtype=float))))
+    return jobs
+
+
+def run(render, jobs, renders, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda i: render(*jobs[i % len(jobs)]), range(renders)))
+    return renders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_RENDER_WORKERS"] = "0"
+    os.environ["CITCO_WARMUP"] = "0"
+    logging.disable(logging.CRITICAL)
+    import main
+    from render_pool import TEMPLATES, RenderPool, build_templates
+
+    jobs = payloads(main.dataset_manager.get().merged)
+    build_templates()  # applies the style the templates are drawn in
+    fresh_lock = threading.Lock()
+
+    def render_fresh(kind, payload):
+        with fresh_lock:
+            template = TEMPLATES[kind]()
+            template.draw(*payload)
+            png = template.image()
+            template.figure.clear()
+            return png
+
+    print(f"{args.renders} renders from {args.threads} threads, {os.cpu_count()} cores")
+    print(f"{'renderer':>14}{'renders/s':>12}")
+    print(f"{'fresh':>14}{run(render_fresh, jobs, args.renders, args.threads):>12.1f}")
+
+    local = RenderPool(workers=0, max_pending=args.threads)
+    print(f"{'templates':>14}{run(lambda kind, payload: local.render_png(kind, *payload), jobs, args.renders, args.threads):>12.1f}")
+
+    for workers in args.workers:
+        pool = RenderPool(workers=workers, max_pending=args.threads)
+        pool.start()
+        try:
+            rate = run(lambda kind, payload: pool.render_png(kind, *payload), jobs, args.renders, args.threads)
+        finally:
+            pool.close()
+        print(f"{f'{workers} workers':>14}{rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Citation vs grants render time as the number of rows grows: every point versus density above a threshold.
+
+Usage: python -m benchmarks.scatter_density [--rows 1000 10000 100000 1000000] [--repeat 3]
+
+Draws synthetic (citations, amount) rows with the in-process scatter
+template. "points" always draws each row as a marker (what the chart did
+before the density mode, up to --max-points rows); "auto" switches to the
+density image above CITCO_DENSITY_THRESHOLD rows. Times include building
+the payload and its fit line.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_time(render, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-points", type=int, default=100000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    logging.disable(logging.CRITICAL)
+    from graph_data import DENSITY_THRESHOLD, scatter_payload
+    from render_pool import RenderPool
+
+    pool = RenderPool(workers=0)
+    pool.render_png('message', "warm-up")
+    rng = np.random.default_rng(0)
+
+    print(f"density threshold {DENSITY_THRESHOLD} rows")
+    print(f"{'rows':>10}{'points':>10}{'auto':>10}")
+    for n in args.rows:
+        x = rng.gamma(2.0, 2000.0, n)
+        y = 30000 + 5 * x + rng.normal(0, 10000, n)
+        auto = best_time(lambda: pool.render_png('citation_vs_grants', scatter_payload(x, y)), args.repeat)
+        if n <= args.max_points:
+            points = best_time(lambda: pool.render_png('citation_vs_grants', scatter_payload(x, y, threshold=n)),
+                               args.repeat)
+            points = f"{points:.3f}s"
+        else:
+            points = "-"
+        print(f"{n:>10}{points:>10}{auto:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
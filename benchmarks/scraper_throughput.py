@@ -0,0 +1,62 @@
+"""Scraper throughput against the local Scholar stand-in.
+
+Usage: python -m benchmarks.scraper_throughput [--items 200] [--latency 0.05] [--concurrency 1 4 16]
+
+Starts scholar_stub.py in-process with a fixed per-response latency and runs
+the asyncio scraper over synthetic (name, fiscal year) items at each
+concurrency level, reporting rows per minute. The rate limit is disabled so
+the numbers show the engine itself, not the politeness budget.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+
+import scholar_stub
+from jobstore import JobStore
+from scholar_async import AsyncScraper
+
+
+def synthetic_items(count, years_per_author=3):
+    # Multi-year grantees, like the NSERC export: each author holds `years_per_author` fiscal years.
+    return [(f"Researcher{i // years_per_author}, Test", f"{2014 + i % years_per_author}-{2015 + i % years_per_author}")
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--pages", help="directory of recorded pages for the stub")
+    args = parser.parse_args()
+
+    logging.getLogger("scholar_async").setLevel(logging.WARNING)
+    logging.getLogger("jobstore").setLevel(logging.WARNING)
+    server, base_url = scholar_stub.start_server(pages_dir=args.pages, latency=args.latency)
+    items = synthetic_items(args.items)
+
+    print(f"{args.items} items, {args.latency * 1000:.0f} ms stub latency")
+    print(f"{'concurrency':>12}{'seconds':>10}{'requests':>10}{'rows/min':>12}")
+    try:
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as directory:
+                store = JobStore(os.path.join(directory, "jobs.db"))
+                store.seed(items, "synthetic")
+                scraper = AsyncScraper(base_url, concurrency=concurrency, rate=0, retries=0)
+                stats = asyncio.run(scraper.run(store))
+                output_file = os.path.join(directory, "citations.csv")
+                store.export_csv(output_file)
+                store.close()
+                with open(output_file, newline="", encoding="utf-8") as f:
+                    assert sum(1 for _ in csv.reader(f)) == len(items) + 1
+            print(f"{concurrency:>12}{stats['seconds']:>10.2f}{stats['requests']:>10}"
+                  f"{stats['rows_per_minute']:>12.0f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
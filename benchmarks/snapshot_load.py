@@ -0,0 +1,116 @@
+"""Compare cold start of main.py when loading from CSV versus the columnar snapshot.
+
+Usage: python -m benchmarks.snapshot_load [--scale N] [--runs N]
+
+The sample SCHOLAR.csv/NSERC.csv are replicated `scale` times (with distinct
+names so the merge still matches) into a temporary directory, and each load
+path is timed in a fresh interpreter so resident memory is not shared.
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_scaled_data(directory, scale):
+    with open(os.path.join(REPO_ROOT, "SCHOLAR.csv"), newline="", encoding="utf-8") as f:
+        citations = list(csv.reader(f))
+    with open(os.path.join(REPO_ROOT, "NSERC.csv"), newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        grants_header = next(reader)
+        grants = list(reader)
+
+    # "Last, First" flips to "First Last", so suffixing both surnames keeps pairs matching.
+    with open(os.path.join(directory, "SCHOLAR.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for k in range(scale):
+            for row in citations:
+                writer.writerow([f"{row[0]}{k}"] + row[1:])
+    with open(os.path.join(directory, "NSERC.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(grants_header)
+        for k in range(scale):
+            for row in grants:
+                last, _, first = row[0].partition(",")
+                writer.writerow([f"{last}{k},{first}"] + row[1:])
+
+
+def child(mode):
+    # Import the heavy dependencies first so both paths measure only the data load.
+    import flask  # noqa: F401
+    import matplotlib.pyplot  # noqa: F401
+    import pandas  # noqa: F401
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    sys.path.insert(0, REPO_ROOT)
+    import main
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    dataset = main.dataset_manager.get()
+    print(json.dumps({
+        "mode": mode,
+        "seconds": elapsed,
+        "rss_delta_kb": rss_after - rss_before,
+        "rss_peak_kb": rss_after,
+        "merged_rows": len(dataset.merged),
+    }))
+
+
+def run_child(mode, directory):
+    env = dict(os.environ)
+    env["CITCO_SNAPSHOT_DIR"] = os.path.join(directory, "snapshot")
+    env["CITCO_SNAPSHOT"] = "0" if mode == "csv" else "1"
+    env["CITCO_WARMUP"] = "0"
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.snapshot_load", "--child", mode],
+        cwd=directory, env=dict(env, PYTHONPATH=REPO_ROOT),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", choices=["csv", "snapshot"])
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_scaled_data(directory, args.scale)
+        # First snapshot run parses the CSVs and writes the snapshot; it is not timed.
+        run_child("snapshot", directory)
+
+        results = {}
+        for mode in ("csv", "snapshot"):
+            runs = [run_child(mode, directory) for _ in range(args.runs)]
+            results[mode] = {
+                "seconds": statistics.median(r["seconds"] for r in runs),
+                "rss_delta_kb": statistics.median(r["rss_delta_kb"] for r in runs),
+                "rss_peak_kb": statistics.median(r["rss_peak_kb"] for r in runs),
+                "merged_rows": runs[0]["merged_rows"],
+            }
+
+    print(f"scale={args.scale} runs={args.runs}")
+    print(f"{'path':<10}{'load (s)':>10}{'rss delta (MB)':>16}{'rss peak (MB)':>15}{'merged rows':>13}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['seconds']:>10.3f}{r['rss_delta_kb'] / 1024:>16.1f}"
+              f"{r['rss_peak_kb'] / 1024:>15.1f}{r['merged_rows']:>13}")
+
+
+if __name__ == "__main__":
+    main()
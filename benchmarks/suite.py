@@ -0,0 +1,215 @@
+"""Per-stage timings of the analysis pipeline on synthetic data, with a regression check.
+
+Usage: python -m benchmarks.suite [--rows 10000 100000] [--institutions 300 5000] [--repeat 3]
+                                  [--stages STAGE ...] [--history benchmarks/history.json]
+                                  [--tolerance 0.25] [--update-baseline]
+
+For each row count and institution count (the cardinality of the
+affiliations), benchmarks.synthetic generates NSERC- and SCHOLAR-shaped
+frames and every stage is timed `repeat` times: name flipping (flip_name per
+name and the vectorized name_keys), preprocess_data, the Dataset build
+(filter index and cubes), filter_data and FilterIndex.filter over a few
+university/time-frame queries, utils.prepare_data, each dashboard
+create_*_graph function, and fig_to_base64 of each figure.
+
+Every run is appended to the history file with the commit, library versions
+and core count. The first run at a row and institution count becomes its baseline (or pass
+--update-baseline to replace it). A stage whose best time exceeds the
+baseline's by more than `tolerance` and by at least --min-delta seconds is
+reported as a regression, and the suite exits with status 1.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.synthetic import DEFAULT_INSTITUTIONS, synthetic_frames
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 'University of' matches a large share of the affiliations, the worst case for the filter index.
+QUERIES = [('all', 'all'), ('University of Waterloo', '3y'), ('Toronto', '1y'), ('University of', '3y'),
+           ('all', '10y')]
+GRAPH_TYPES = ['citation_vs_grants', 'avg_citations', 'avg_grants']
+
+
+def stages(citations, grants):
+    """(name, setup, run, teardown) for each stage; run(setup()) is the timed part."""
+    import matplotlib.pyplot as plt
+
+    import dashboard
+    from dataset import Dataset
+    from main import filter_data, preprocess_data
+    from normalize import flip_name, name_keys, with_name_keys
+    from utils import prepare_data
+
+    merged = preprocess_data(citations, grants)
+    keyed_citations = with_name_keys(citations, flip=False)
+    keyed_grants = with_name_keys(grants)
+    dataset = Dataset("suite", keyed_citations, keyed_grants, preprocess_data(keyed_citations, keyed_grants))
+    graphs = {
+        'citation_vs_grants': dashboard.create_citation_vs_grants_graph,
+        'avg_citations': dashboard.create_avg_citations_graph,
+        'avg_grants': dashboard.create_avg_grants_graph,
+    }
+
+    def nothing(result=None):
+        return None
+
+    yield 'flip_name', nothing, lambda _: grants["Name"].map(flip_name), nothing
+    yield 'name_keys', nothing, lambda _: name_keys(grants["Name"]), nothing
+    yield 'preprocess_data', nothing, lambda _: preprocess_data(citations, grants), nothing
+    yield ('dataset_build', nothing,
+           lambda _: Dataset("suite", keyed_citations, keyed_grants, dataset.merged), nothing)
+    yield ('filter_data', nothing,
+           lambda _: [filter_data(merged, university, time_frame) for university, time_frame in QUERIES], nothing)
+    yield ('filter_index', nothing,
+           lambda _: [dataset.index.filter(dataset.merged, university, time_frame)
+                      for university, time_frame in QUERIES], nothing)
+    yield 'prepare_data', nothing, lambda _: prepare_data(citations, grants, 'University of Waterloo', '3y'), nothing
+    for graph_type in GRAPH_TYPES:
+        create = graphs[graph_type]
+        yield f'create_{graph_type}_graph', nothing, lambda _, create=create: create(merged), plt.close
+    for graph_type in GRAPH_TYPES:
+        create = graphs[graph_type]
+        # fig_to_base64 closes the figure itself.
+        yield f'fig_to_base64[{graph_type}]', lambda create=create: create(merged), dashboard.fig_to_base64, nothing
+
+
+def time_stage(setup, run, teardown, repeat):
+    seconds = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        result = run(argument)
+        seconds.append(time.perf_counter() - start)
+        teardown(result)
+    return {'min': min(seconds), 'median': statistics.median(seconds)}
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment():
+    import matplotlib
+    import numpy as np
+    import pandas as pd
+
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'cpus': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return {'baseline': {}, 'runs': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def regressions(timings, baseline, tolerance, min_delta):
+    found = []
+    for stage, timing in timings.items():
+        before = baseline.get(stage)
+        if before is not None and timing['min'] > before * (1 + tolerance) and timing['min'] - before >= min_delta:
+            found.append(stage)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--institutions", type=int, nargs="+", default=[DEFAULT_INSTITUTIONS, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", help="only stages whose name starts with one of these")
+    parser.add_argument("--history", default=os.path.join(REPO_ROOT, "benchmarks", "history.json"))
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.005)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ.setdefault("CITCO_WARMUP", "0")
+    os.environ.setdefault("CITCO_RENDER_WORKERS", "0")
+    os.environ.setdefault("CITCO_BOOTSTRAP_WORKERS", "0")
+    logging.disable(logging.CRITICAL)
+    history = load_history(args.history)
+    run = {
+        'recorded': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'environment': environment(),
+        'repeat': args.repeat,
+        'results': {},
+        'regressions': {},
+    }
+    failed = False
+    for rows, institutions in [(rows, institutions) for rows in args.rows for institutions in args.institutions]:
+        citations, grants = synthetic_frames(rows, args.seed, institutions)
+        # Runs at the default cardinality keep the plain row-count key of older histories.
+        size = str(rows) if institutions == DEFAULT_INSTITUTIONS else f"{rows}x{institutions}"
+        timings = {}
+        print(f"\n{rows} rows, {institutions} institutions ({citations['University'].nunique()} distinct "
+              f"affiliations), best and median of {args.repeat}")
+        print(f"{'stage':<36}{'best (s)':>10}{'median (s)':>12}{'baseline':>10}{'change':>9}")
+        baseline = history['baseline'].get(size, {}).get('stages', {})
+        for name, setup, stage, teardown in stages(citations, grants):
+            if args.stages and not any(name.startswith(prefix) for prefix in args.stages):
+                continue
+            timing = time_stage(setup, stage, teardown, args.repeat)
+            timings[name] = timing
+            before = baseline.get(name)
+            change = f"{(timing['min'] / before - 1) * 100:>+8.0f}%" if before else f"{'-':>9}"
+            flag = "  REGRESSION" if regressions({name: timing}, baseline, args.tolerance, args.min_delta) else ""
+            print(f"{name:<36}{timing['min']:>10.4f}{timing['median']:>12.4f}"
+                  f"{before if before is not None else float('nan'):>10.4f}{change}{flag}")
+
+        slower = regressions(timings, baseline, args.tolerance, args.min_delta)
+        run['results'][size] = timings
+        run['regressions'][size] = slower
+        if slower:
+            failed = True
+            print(f"{len(slower)} stage(s) slower than the baseline by more than {args.tolerance:.0%}: "
+                  f"{', '.join(slower)}")
+        # Stages without a baseline get one from this run; --update-baseline replaces all it ran.
+        new = [name for name in timings if args.update_baseline or name not in baseline]
+        if new:
+            stored = dict(baseline)
+            stored.update({name: timings[name]['min'] for name in new})
+            history['baseline'][size] = {'commit': run['commit'], 'recorded': run['recorded'],
+                                         'stages': stored}
+            print(f"Recorded the baseline of {len(new)} stage(s) for {rows} rows, {institutions} institutions")
+
+    history['runs'].append(run)
+    save_history(args.history, history)
+    print(f"\nAppended the run to {args.history}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
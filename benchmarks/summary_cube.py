@@ -0,0 +1,122 @@
+"""/data/summary latency: row scans versus the per-version stats cube.
+
+Usage: python -m benchmarks.summary_cube [--scales 1 10 100] [--runs 5]
+
+The sample SCHOLAR.csv/NSERC.csv rows are replicated `scale` times in memory
+(with distinct names so the merge still matches). For every university and
+time frame the summary is computed both by scanning the filtered frames, as
+main.py did before the cube, and from the cube; the two must agree, and the
+median time per query is reported for each scale.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIME_FRAMES = ['all', '1y', '3y', '6y', '10y']
+
+
+def scaled_frames(scale):
+    from dataset import load_citations_csv, load_grants_csv
+
+    citations = load_citations_csv(os.path.join(REPO_ROOT, "SCHOLAR.csv"))
+    grants = load_grants_csv(os.path.join(REPO_ROOT, "NSERC.csv"))
+    citations = pd.concat([citations.assign(Name=citations["Name"] + str(k)) for k in range(scale)],
+                          ignore_index=True)
+    last_first = grants["Name"].str.partition(",")
+    grants = pd.concat([grants.assign(Name=last_first[0] + str(k) + "," + last_first[2]) for k in range(scale)],
+                       ignore_index=True)
+    return citations, grants
+
+
+def scan_summary(dataset, university, time_frame):
+    from main import filter_data
+    from normalize import name_key_column, university_researchers
+
+    grants = filter_data(dataset.grants, 'all', time_frame)
+    if university != 'all':
+        grants = grants[name_key_column(grants).isin(university_researchers(dataset.researchers, university))]
+    merged = filter_data(dataset.merged, university, time_frame)
+    return {
+        'total_citations': int(merged['CitationCount'].sum()),
+        'total_grants': int(grants['Amount($)'].sum()),
+        'avg_citations': round(merged['CitationCount'].mean(), 2),
+        'avg_grants': round(grants['Amount($)'].mean(), 2),
+        'researchers_count': merged['Name'].nunique(),
+    }
+
+
+def cube_summary(dataset, university, time_frame):
+    grants = dataset.grants_stats.moments('Amount($)', dataset.grants_cells(university, time_frame))
+    cells = dataset.merged_cells(university, time_frame)
+    citations = dataset.stats.moments('CitationCount', cells)
+    return {
+        'total_citations': int(citations.total),
+        'total_grants': int(grants.total),
+        'avg_citations': round(citations.mean, 2),
+        'avg_grants': round(grants.mean, 2),
+        'researchers_count': dataset.stats.distinct(cells),
+    }
+
+
+def same(a, b):
+    return all(a[k] == b[k] or (a[k] != a[k] and b[k] != b[k]) for k in a)
+
+
+def time_queries(summary, dataset, queries, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for university, time_frame in queries:
+            summary(dataset, university, time_frame)
+        times.append((time.perf_counter() - start) / len(queries))
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    os.environ["CITCO_WARMUP"] = "0"
+    logging.disable(logging.CRITICAL)
+    from dataset import Dataset
+    from main import preprocess_data, universities
+    from normalize import with_name_keys
+
+    queries = [(university, time_frame) for university in ['all'] + universities + ['Waterloo']
+               for time_frame in TIME_FRAMES]
+
+    print(f"{len(queries)} university/time-frame queries, median of {args.runs} runs")
+    print(f"{'scale':>6}{'merged rows':>13}{'build (s)':>11}{'scan (ms)':>11}{'cube (ms)':>11}{'speedup':>9}")
+    for scale in args.scales:
+        citations, grants = scaled_frames(scale)
+        citations = with_name_keys(citations, flip=False)
+        grants = with_name_keys(grants)
+        merged = preprocess_data(citations, grants)
+        start = time.perf_counter()
+        dataset = Dataset(f"scale-{scale}", citations, grants, merged)
+        build = time.perf_counter() - start
+
+        for university, time_frame in queries:
+            expected = scan_summary(dataset, university, time_frame)
+            actual = cube_summary(dataset, university, time_frame)
+            if not same(expected, actual):
+                sys.exit(f"Mismatch for {university}/{time_frame}: scan {expected}, cube {actual}")
+
+        scan = time_queries(scan_summary, dataset, queries, args.runs)
+        cube = time_queries(cube_summary, dataset, queries, args.runs)
+        print(f"{scale:>6}{len(merged):>13}{build:>11.3f}{scan * 1000:>11.3f}{cube * 1000:>11.3f}"
+              f"{scan / cube:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Synthetic NSERC- and SCHOLAR-shaped data at any scale.
+
+Usage: python -m benchmarks.synthetic --rows 100000 [--seed 0] [--institutions 300] --out DIR
+
+Writes DIR/NSERC.csv and DIR/SCHOLAR.csv with about `rows` rows each, in
+the same columns and formats as the real files. Researchers hold about
+eight fiscal years of grants; surnames follow a Zipf-like distribution
+over a limited pool, so common names collide across people and
+universities the way real ones do. About 70% of the grant holders have
+Scholar records, and citation counts loosely track grant amounts.
+
+Scholar affiliations are free text, as in SCHOLAR.csv where almost every
+researcher's is distinct: a bare institution name, "Role, Department,
+Institution", "Role of Department, Institution", or no institution at
+all. Institutions are the real universities followed by generated ones,
+`institutions` in all, with Zipf-like sizes, so the University column has
+thousands of distinct values at 100k rows.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+UNIVERSITIES = [
+    "University of Toronto", "University of British Columbia", "McGill University", "University of Waterloo",
+    "University of Alberta", "University of Calgary", "Simon Fraser University", "Queen's University",
+    "Carleton University", "University of Victoria", "University of Guelph", "University of Regina",
+    "University of New Brunswick", "Brock University",
+]
+INSTITUTION_FORMS = ["University of {}", "{} University", "{} Institute of Technology", "{} College",
+                     "Université de {}", "{} Polytechnic"]
+DEFAULT_INSTITUTIONS = 300
+ROLES = ["Professor", "Associate Professor", "Assistant Professor", "Professor Emeritus", "Research Scientist",
+         "Canada Research Chair", "Lecturer", "Postdoctoral Fellow"]
+DEPARTMENTS = ["Computer Science", "Electrical and Computer Engineering", "Mathematics", "Statistics",
+               "Physics", "Information Studies", "Software Engineering", "Systems Design Engineering"]
+FIELDS = ["Machine Learning", "Computer Vision", "Quantum Computing", "Networks", "Data Science",
+          "Climate Change Ecologist", "Human-Computer Interaction", "Robotics"]
+FISCAL_YEARS = [f"{year}-{year + 1}" for year in range(2008, 2024)]
+PROGRAMS = [
+    "Discovery Grants Program - Individual",
+    "Discovery Grants Program - Accelerator Supplements",
+    "Research Tools and Instruments",
+]
+FIRST_NAMES = ["James", "Mary", "Wei", "Li", "Mohamed", "Fatima", "John", "Sarah", "David", "Anna", "Hatem",
+               "Maura", "Kevin", "Thomas", "Jozsef", "Priya", "Raj", "Chen", "Yuki", "Olga", "Pierre", "Marie",
+               "Ahmed", "Sofia", "Daniel", "Elena", "Michael", "Laura", "Omar", "Ines"]
+SYLLABLES = ["ka", "ri", "mo", "ta", "len", "zu", "an", "bel", "cho", "da", "fer", "gi", "han", "is", "jo",
+             "kov", "li", "mar", "nak", "or", "pet", "ros", "sa", "tor", "ul", "vic", "wen", "yam", "zel"]
+YEARS_PER_RESEARCHER = 8
+SCHOLAR_SHARE = 0.7
+
+
+def surname_pool(size, rng):
+    words = {"".join(rng.choice(SYLLABLES, rng.integers(2, 4))).capitalize() for _ in range(size * 2)}
+    return np.array(sorted(words))[:size]
+
+
+def institution_pool(size, rng):
+    """The real universities, then generated "University of <Place>"-style names, `size` in all."""
+    names = list(UNIVERSITIES[:size])
+    seen = set(names)
+    while len(names) < size:
+        place = "".join(rng.choice(SYLLABLES, rng.integers(2, 4))).capitalize()
+        name = rng.choice(INSTITUTION_FORMS).format(place)
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return np.array(names, dtype=object)
+
+
+def affiliations(n_people, institutions, rng):
+    """One free-text Scholar affiliation per person."""
+    # Zipf-like: a few large institutions, a long tail of small ones.
+    weights = 1.0 / np.arange(1, len(institutions) + 1) ** 0.8
+    institution = rng.choice(institutions, n_people, p=weights / weights.sum())
+    role = rng.choice(ROLES, n_people).astype(object)
+    department = rng.choice(DEPARTMENTS, n_people).astype(object)
+    form = rng.choice(5, n_people, p=[0.35, 0.35, 0.15, 0.1, 0.05])
+    affiliation = institution.copy()
+    titled = form == 1
+    affiliation[titled] = role[titled] + ", " + department[titled] + ", " + institution[titled]
+    of = form == 2
+    affiliation[of] = role[of] + " of " + department[of] + ", " + institution[of]
+    field = form == 3
+    affiliation[field] = rng.choice(FIELDS, field.sum()).astype(object) + ", " + role[field]
+    affiliation[form == 4] = "Unknown affiliation"
+    return affiliation
+
+
+def synthetic_frames(rows, seed=0, institutions=DEFAULT_INSTITUTIONS):
+    """(citations_df, grants_df) shaped like SCHOLAR.csv and NSERC.csv, about `rows` rows each.
+
+    `institutions` sets how many distinct institutions the affiliations name.
+    """
+    rng = np.random.default_rng(seed)
+    n_people = max(rows // YEARS_PER_RESEARCHER, 10)
+
+    surnames = surname_pool(max(n_people // 4, 20), rng)
+    # Zipf-like: a few surnames are very common, most are rare.
+    weights = 1.0 / np.arange(1, len(surnames) + 1)
+    last = rng.choice(surnames, n_people, p=weights / weights.sum())
+    first = rng.choice(FIRST_NAMES, n_people)
+    university = affiliations(n_people, institution_pool(institutions, rng), rng)
+    level = rng.lognormal(10.4, 0.5, n_people)
+    impact = level * rng.lognormal(-4.0, 1.0, n_people)
+
+    grant_people = rng.integers(0, n_people, rows)
+    grant_years = rng.integers(0, len(FISCAL_YEARS), rows)
+    grants_df = pd.DataFrame({
+        "Name": pd.Series(last[grant_people]) + ", " + pd.Series(first[grant_people]),
+        "Project Title": "Project " + pd.Series(grant_people).astype(str),
+        "Amount($)": (np.round(level[grant_people] * rng.lognormal(0, 0.2, rows), -3)).astype(np.int64),
+        "Fiscal Year": np.array(FISCAL_YEARS)[grant_years],
+        "Program": rng.choice(PROGRAMS, rows, p=[0.8, 0.15, 0.05]),
+    })
+
+    scholars = np.flatnonzero(rng.random(n_people) < SCHOLAR_SHARE)
+    citation_people = rng.choice(scholars, rows)
+    citation_years = rng.integers(0, len(FISCAL_YEARS), rows)
+    start_years = 2008 + citation_years - 6
+    citations_df = pd.DataFrame({
+        "Name": pd.Series(first[citation_people]) + " " + pd.Series(last[citation_people]),
+        "University": university[citation_people],
+        "Fiscal Year": np.array(FISCAL_YEARS)[citation_years],
+        "CitationWindow": pd.Series(start_years).astype(str) + "-" + (start_years + 5).astype(str),
+        "CitationCount": np.round(impact[citation_people] * rng.lognormal(0, 0.4, rows)).astype(np.int64),
+    })
+    return citations_df, grants_df
+
+
+def write_synthetic_data(directory, rows, seed=0, institutions=DEFAULT_INSTITUTIONS):
+    citations_df, grants_df = synthetic_frames(rows, seed, institutions)
+    grants_df.to_csv(os.path.join(directory, "NSERC.csv"), index=False)
+    # SCHOLAR.csv has no header row.
+    citations_df.to_csv(os.path.join(directory, "SCHOLAR.csv"), index=False, header=False)
+    return citations_df, grants_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--institutions", type=int, default=DEFAULT_INSTITUTIONS)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    citations_df, grants_df = write_synthetic_data(args.out, args.rows, args.seed, args.institutions)
+    print(f"Wrote {len(grants_df)} grants and {len(citations_df)} citation rows "
+          f"({citations_df['University'].nunique()} distinct affiliations) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Bootstrap confidence intervals for the citation vs grants correlation and slope.
+
+Each resample is a row of one (resamples x n) index matrix; the Pearson r
+and least-squares slope of every resample are reduced together along that
+axis, in batches that keep the matrix to about BOOTSTRAP_BATCH_CELLS
+entries. Universities are spread over a pool of worker processes, and
+results are cached per dataset version (the last MAX_CACHED_INTERVALS
+filters) and seeded from it, so repeated requests return the same intervals.
+
+CITCO_BOOTSTRAP_RESAMPLES sets the number of resamples (default 2000) and
+CITCO_BOOTSTRAP_WORKERS the number of processes (default: one per core, 0
+runs in-process).
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from filter_index import normalize_time_frame
+from render_pool import process_context
+from stats_cube import CoMoments
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_RESAMPLES = int(os.environ.get("CITCO_BOOTSTRAP_RESAMPLES", "2000"))
+BOOTSTRAP_WORKERS = int(os.environ.get("CITCO_BOOTSTRAP_WORKERS", os.cpu_count() or 1))
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_BATCH_CELLS = 4_000_000
+MIN_BOOTSTRAP_ROWS = 5
+MAX_CACHED_INTERVALS = 1024
+# The result for a university filter that matches no university in the data.
+NO_ROWS = {'n': 0, 'pearson': None, 'slope': None, 'pearson_ci': None, 'slope_ci': None}
+
+
+def resample_statistics(x, y, resamples, seed):
+    """Pearson r and slope of `resamples` bootstrap resamples of the (x, y) pairs."""
+    n = len(x)
+    rng = np.random.default_rng(seed)
+    batch = max(BOOTSTRAP_BATCH_CELLS // n, 1)
+    pearson = np.empty(resamples)
+    slope = np.empty(resamples)
+    for start in range(0, resamples, batch):
+        size = min(batch, resamples - start)
+        rows = rng.integers(0, n, size=(size, n), dtype=np.int32 if n < 2 ** 31 else np.int64)
+        xs = x[rows]
+        ys = y[rows]
+        xs -= xs.mean(axis=1, keepdims=True)
+        ys -= ys.mean(axis=1, keepdims=True)
+        sxx = np.einsum('ij,ij->i', xs, xs)
+        syy = np.einsum('ij,ij->i', ys, ys)
+        sxy = np.einsum('ij,ij->i', xs, ys)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pearson[start:start + size] = sxy / np.sqrt(sxx * syy)
+            slope[start:start + size] = sxy / sxx
+    return pearson, slope
+
+
+def percentile_interval(values, confidence):
+    """Central percentile interval, or None if most resamples had no defined value."""
+    finite = values[np.isfinite(values)]
+    if not len(finite) or len(finite) * 2 < len(values):
+        return None
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(finite, [tail, 100 - tail])
+    return [round(float(low), 4), round(float(high), 4)]
+
+
+def bootstrap_interval(x, y, resamples, confidence, seed):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    comoments = CoMoments.of(x, y)
+    result = {
+        'n': len(x),
+        'pearson': comoments.pearson,
+        'slope': comoments.slope,
+        'pearson_ci': None,
+        'slope_ci': None,
+    }
+    if len(x) >= MIN_BOOTSTRAP_ROWS:
+        pearson, slope = resample_statistics(x, y, resamples, seed)
+        result['pearson_ci'] = percentile_interval(pearson, confidence)
+        result['slope_ci'] = percentile_interval(slope, confidence)
+    for name in ('pearson', 'slope'):
+        result[name] = None if np.isnan(result[name]) else round(float(result[name]), 4)
+    return result
+
+
+class BootstrapEngine:
+    """Runs and caches bootstrap intervals for the filters of a dataset version."""
+
+    def __init__(self, workers=BOOTSTRAP_WORKERS, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE):
+        self.workers = workers
+        self.resamples = resamples
+        self.confidence = confidence
+        self._executor = None
+        self._version = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.last_seconds = 0.0
+
+    def start(self):
+        """Start the worker processes; until then intervals are computed in-process."""
+        if self.workers > 0 and self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=process_context())
+                # Workers are only started on demand; make them all now.
+                for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+                    future.result()
+            except Exception as e:
+                logger.error(f"Error starting bootstrap workers, running in-process: {str(e)}")
+                self.workers = 0
+                self._executor = None
+
+    def _seed(self, version, university, time_frame):
+        return zlib.crc32(f"{version}|{university}|{time_frame}".encode())
+
+    @staticmethod
+    def _matches_any(index, university):
+        university_ids, _ = index.select(university)
+        return university_ids is None or len(university_ids) > 0
+
+    def intervals(self, dataset, universities, time_frame, frames=None):
+        """Bootstrap results for each university filter ('all' for every row) under `time_frame`.
+
+        `frames` maps a university to its filtered rows when the caller has
+        them already, so they are not filtered again. Filters that match no
+        university get NO_ROWS without being run or cached.
+        """
+        time_frame = normalize_time_frame(time_frame)
+        known = [name for name in universities if self._matches_any(dataset.index, name)]
+        with self._lock:
+            if self._version != dataset.version:
+                self._version = dataset.version
+                self._results = OrderedDict()
+            results = {}
+            for name in known:
+                key = (name, time_frame)
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    results[name] = self._results[key]
+        missing = [name for name in known if name not in results]
+
+        if missing:
+            start = time.perf_counter()
+            jobs = []
+            for name in missing:
+                rows = (frames or {}).get(name)
+                if rows is None:
+                    rows = dataset.index.filter(dataset.merged, name, time_frame)
+                jobs.append((rows["CitationCount"].to_numpy(dtype=np.float64),
+                             rows["Amount($)"].to_numpy(dtype=np.float64),
+                             self.resamples, self.confidence, self._seed(dataset.version, name, time_frame)))
+            if self._executor is None:
+                computed = [bootstrap_interval(*job) for job in jobs]
+            else:
+                computed = [future.result() for future in
+                            [self._executor.submit(bootstrap_interval, *job) for job in jobs]]
+            self.runs += 1
+            self.last_seconds = time.perf_counter() - start
+            logger.info(f"Bootstrapped {len(missing)} filters for {time_frame} in {self.last_seconds:.2f}s")
+
+            results.update(zip(missing, computed))
+            with self._lock:
+                if self._version == dataset.version:
+                    for name in missing:
+                        self._results[(name, time_frame)] = results[name]
+                    while len(self._results) > MAX_CACHED_INTERVALS:
+                        self._results.popitem(last=False)
+
+        return [dict(university=name, **results.get(name, NO_ROWS)) for name in universities]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
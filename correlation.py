@@ -0,0 +1,89 @@
+"""Rank correlation over filtered subsets of the merged rows.
+
+Pearson correlation and the least-squares fit merge from per-cell
+co-moments (stats_cube.CorrelationCube), but Spearman's rho needs the ranks
+within the selected rows, which do not merge across cells. RankIndex keeps
+each column's sort order, computed once per dataset and merged (not
+re-sorted) when rows are appended, so ranking a subset is a masked cumsum
+over that order instead of a sort.
+"""
+import threading
+
+import numpy as np
+
+from stats_cube import CoMoments
+
+MAX_CACHED_QUERIES = 1024
+
+
+class SortedColumn:
+    def __init__(self, values, order):
+        self.values = values
+        self.order = order
+        ordered = values[order]
+        # Rows with equal values share a tie group and get their average rank.
+        self.tie_groups = np.concatenate([[0], np.cumsum(ordered[1:] != ordered[:-1])]) if len(order) else order
+
+    @classmethod
+    def of(cls, values):
+        return cls(values, np.argsort(values, kind="stable"))
+
+    def extended(self, new_values):
+        values = np.concatenate([self.values, new_values])
+        new_order = np.argsort(new_values, kind="stable")
+        # Insert the sorted new rows after any equal old ones.
+        slots = np.searchsorted(self.values[self.order], new_values[new_order], side="right")
+        order = np.insert(self.order, slots, new_order + len(self.values))
+        return SortedColumn(values, order)
+
+    def ranks(self, selected):
+        """Average ranks (1-based) of the selected rows, ordered by row position."""
+        picked = selected[self.order]
+        positions = np.cumsum(picked)[picked]
+        groups = self.tie_groups[picked]
+        average = np.bincount(groups, weights=positions) / np.maximum(np.bincount(groups), 1)
+        ranks = np.zeros(len(selected))
+        ranks[self.order[picked]] = average[groups]
+        return ranks[selected]
+
+
+class RankIndex:
+    """Sort orders of two columns of a frame, for Spearman's rho over row subsets."""
+
+    def __init__(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self._x = SortedColumn.of(x)
+        self._y = SortedColumn.of(y)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def extended(self, x, y):
+        """A copy with rows appended."""
+        index = RankIndex.__new__(RankIndex)
+        index._x = self._x.extended(np.asarray(x, dtype=np.float64))
+        index._y = self._y.extended(np.asarray(y, dtype=np.float64))
+        index._cache = {}
+        index._lock = threading.Lock()
+        return index
+
+    @property
+    def size(self):
+        return len(self._x.values)
+
+    def spearman(self, rows, key=None):
+        """Spearman's rho over the rows at positions `rows`; memoized under `key` if given."""
+        if key is not None and key in self._cache:
+            return self._cache[key]
+
+        selected = np.zeros(self.size, dtype=bool)
+        selected[rows] = True
+        selected &= ~(np.isnan(self._x.values) | np.isnan(self._y.values))
+        rho = CoMoments.of(self._x.ranks(selected), self._y.ranks(selected)).pearson
+
+        if key is not None:
+            with self._lock:
+                if len(self._cache) >= MAX_CACHED_QUERIES:
+                    self._cache.clear()
+                self._cache[key] = rho
+        return rho
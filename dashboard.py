@@ -1,10 +1,11 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib
-import numpy as np
 import io
 import base64
 import logging
+import metrics
+import query
+from graph_data import DENSITY_THRESHOLD, IMAGE_SAVEFIG_ARGS, RegressionSums
 
 matplotlib.use('Agg')
 
@@ -14,70 +15,44 @@ logger = logging.getLogger(__name__)
 plt.style.use("seaborn-v0_8-whitegrid")
 plt.rcParams.update({"figure.figsize": (10, 6), "axes.titlesize": 14, "axes.labelsize": 12})
 
-def flip_name(name):
-    if "," in name:
-        parts = name.split(",")
-        return parts[1].strip() + " " + parts[0].strip()
-    return name.strip()
-
 def preprocess_data(citations_df, grants_df):
     try:
-        citations_df = citations_df.copy()
-        grants_df = grants_df.copy()
-        
-        grants_df["Flipped Name"] = grants_df["Name"].apply(flip_name)
-        
-        citations_df["Name"] = citations_df["Name"].str.lower().str.strip()
-        citations_df["Fiscal Year"] = citations_df["Fiscal Year"].astype(str).str.strip()
-        grants_df["Name"] = grants_df["Flipped Name"].str.lower().str.strip()
-        grants_df["Fiscal Year"] = grants_df["Fiscal Year"].astype(str).str.strip()
-        
-        merged_df = pd.merge(citations_df, grants_df, on=["Name", "Fiscal Year"])
-        final_df = merged_df[["Name", "University_x", "Fiscal Year", "CitationCount", "Amount($)"]]
-        final_df.rename(columns={"University_x": "University"}, inplace=True)
-        
-        final_df["CitationCount"] = pd.to_numeric(final_df["CitationCount"], errors="coerce")
-        final_df["Amount($)"] = pd.to_numeric(final_df["Amount($)"], errors="coerce")
-        final_df = final_df.dropna(subset=["CitationCount", "Amount($)"])
-        final_df = final_df[(final_df["CitationCount"] >= 0)]
-        
-        return final_df
+        return query.execute(query.merged_query(citations_df, grants_df))
     except Exception as e:
         logger.error(f"Error preprocessing data: {str(e)}")
         raise
 
 def filter_data(df, university=None, time_frame=None):
-    filtered_df = df.copy()
-    
-    if university and university != 'all':
-        filtered_df = filtered_df[filtered_df['University'].str.contains(university, case=False, na=False)]
-    
-    if time_frame and time_frame != 'all':
-        if time_frame == '1y':
-            most_recent = filtered_df['Fiscal Year'].max()
-            filtered_df = filtered_df[filtered_df['Fiscal Year'] == most_recent]
-        elif time_frame == '3y':
-            years = sorted(filtered_df['Fiscal Year'].unique(), reverse=True)
-            if len(years) > 3:
-                years = years[:3]
-            filtered_df = filtered_df[filtered_df['Fiscal Year'].isin(years)]
-        elif time_frame == '5y':
-            years = sorted(filtered_df['Fiscal Year'].unique(), reverse=True)
-            if len(years) > 5:
-                years = years[:5]
-            filtered_df = filtered_df[filtered_df['Fiscal Year'].isin(years)]
-    
-    return filtered_df
+    return query.execute(query.filtered_query(df, university, time_frame))
+
+def graph_plan(plan, graph_type):
+    """The rows of `plan` a graph is drawn from, or their yearly averages for the avg_* graphs."""
+    if graph_type == 'avg_citations':
+        return plan.aggregate("Fiscal Year", "CitationCount", "mean")
+    if graph_type == 'avg_grants':
+        return plan.aggregate("Fiscal Year", "Amount($)", "mean")
+    return plan.project(["CitationCount", "Amount($)"])
+
+def graph_query(citations_df, grants_df, graph_type, university=None, time_frame=None):
+    return graph_plan(query.merged_query(citations_df, grants_df, university, time_frame), graph_type)
+
+def merged_graph_query(merged_df, graph_type, university=None, time_frame=None, index=None):
+    """graph_query over already merged rows, filtered through `index` if given."""
+    return graph_plan(query.filtered_query(merged_df, university, time_frame, index), graph_type)
 
 def create_citation_vs_grants_graph(df):
+    x = df["CitationCount"].to_numpy(dtype=float)
+    y = df["Amount($)"].to_numpy(dtype=float)
     fig, ax = plt.subplots()
     
-    ax.scatter(df["CitationCount"], df["Amount($)"], alpha=0.6)
+    if len(x) > DENSITY_THRESHOLD:
+        ax.hexbin(x, y, gridsize=60, bins='log', mincnt=1, cmap='Blues')
+    else:
+        ax.scatter(x, y, alpha=0.6)
     
-    if len(df) > 1:
-        z = np.polyfit(df["CitationCount"], df["Amount($)"], 1)
-        p = np.poly1d(z)
-        ax.plot(df["CitationCount"], p(df["CitationCount"]), "r--", alpha=0.8)
+    line = RegressionSums().add(x, y).line()
+    if line is not None:
+        ax.plot(*line, "r--", alpha=0.8)
     
     ax.set_xlabel("Citation Count (By Years)")
     ax.set_ylabel("Grant Amount ($)")
@@ -88,7 +63,9 @@ def create_citation_vs_grants_graph(df):
     return fig
 
 def create_avg_citations_graph(df):
-    graph_data = df.groupby("Fiscal Year")["CitationCount"].mean().reset_index()
+    return plot_avg_citations(df.groupby("Fiscal Year")["CitationCount"].mean().reset_index())
+
+def plot_avg_citations(graph_data):
     graph_data = graph_data.sort_values("Fiscal Year")
     
     fig, ax = plt.subplots()
@@ -106,7 +83,9 @@ def create_avg_citations_graph(df):
     return fig
 
 def create_avg_grants_graph(df):
-    graph_data = df.groupby("Fiscal Year")["Amount($)"].mean().reset_index()
+    return plot_avg_grants(df.groupby("Fiscal Year")["Amount($)"].mean().reset_index())
+
+def plot_avg_grants(graph_data):
     graph_data = graph_data.sort_values("Fiscal Year")
     
     fig, ax = plt.subplots()
@@ -123,55 +102,72 @@ def create_avg_grants_graph(df):
     
     return fig
 
-def fig_to_base64(fig):
+def fig_to_image(fig, fmt='png', dpi=100):
     img_buf = io.BytesIO()
-    fig.tight_layout()
-    fig.savefig(img_buf, format='png', dpi=100)
-    img_buf.seek(0)
-    img_data = base64.b64encode(img_buf.getvalue()).decode('utf-8')
+    with metrics.stage("savefig"):
+        fig.tight_layout()
+        fig.savefig(img_buf, format=fmt, dpi=dpi, **IMAGE_SAVEFIG_ARGS[fmt])
     plt.close(fig)
-    return img_data
+    return img_buf.getvalue()
 
-def generate_graph_data(citations_df, grants_df, graph_type='citation_vs_grants', university=None, time_frame=None):
+def fig_to_base64(fig):
+    img_data = fig_to_image(fig)
+    with metrics.stage("base64"):
+        return base64.b64encode(img_data).decode('utf-8')
+
+def generate_graph_figure(citations_df, grants_df, graph_type='citation_vs_grants', university=None, time_frame=None):
+    return plot_graph(graph_query(citations_df, grants_df, graph_type, university, time_frame), graph_type)
+
+def plot_graph(plan, graph_type='citation_vs_grants'):
     try:
-        final_df = preprocess_data(citations_df, grants_df)
-        
-        filtered_df = filter_data(final_df, university, time_frame)
+        with metrics.stage("query"):
+            filtered_df = query.execute(plan)
+        metrics.count_rows("query", len(filtered_df))
         
         if filtered_df.empty:
             logger.warning("No data available after filtering")
             fig, ax = plt.subplots()
             ax.text(0.5, 0.5, "No data available for the selected filters", 
                     horizontalalignment='center', verticalalignment='center', transform=ax.transAxes)
-            return fig_to_base64(fig)
+            return fig
         
         if graph_type == 'citation_vs_grants':
-            fig = create_citation_vs_grants_graph(filtered_df)
+            with metrics.stage("create"):
+                fig = create_citation_vs_grants_graph(filtered_df)
         elif graph_type == 'avg_citations':
-            fig = create_avg_citations_graph(filtered_df)
+            with metrics.stage("create"):
+                fig = plot_avg_citations(filtered_df)
         elif graph_type == 'avg_grants':
-            fig = create_avg_grants_graph(filtered_df)
+            with metrics.stage("create"):
+                fig = plot_avg_grants(filtered_df)
         else:
             logger.warning(f"Unknown graph type: {graph_type}")
             fig, ax = plt.subplots()
             ax.text(0.5, 0.5, f"Unknown graph type: {graph_type}", 
                     horizontalalignment='center', verticalalignment='center', transform=ax.transAxes)
         
-        return fig_to_base64(fig)
+        return fig
     
     except Exception as e:
         logger.error(f"Error generating graph: {str(e)}")
         fig, ax = plt.subplots()
         ax.text(0.5, 0.5, f"Error generating graph: {str(e)}", 
                 horizontalalignment='center', verticalalignment='center', transform=ax.transAxes)
-        return fig_to_base64(fig)
+        return fig
+
+def generate_graph_data(citations_df, grants_df, graph_type='citation_vs_grants', university=None, time_frame=None):
+    return fig_to_base64(generate_graph_figure(citations_df, grants_df, graph_type, university, time_frame))
+
+def generate_graph_image(citations_df, grants_df, graph_type='citation_vs_grants', university=None, time_frame=None,
+                         fmt='png', dpi=100):
+    return fig_to_image(generate_graph_figure(citations_df, grants_df, graph_type, university, time_frame), fmt, dpi)
 
 if __name__ == "__main__":
     try:
-        citations_df = pd.read_csv("SCHOLAR.csv", header=None)
-        citations_df.columns = ["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"]
+        from dataset import load_citations, load_grants
         
-        grants_df = pd.read_csv("NSERC.csv")
+        citations_df = load_citations("SCHOLAR.csv")
+        grants_df = load_grants("NSERC.csv")
         
         citation_vs_grants_img = generate_graph_data(citations_df, grants_df, 'citation_vs_grants')
         avg_citations_img = generate_graph_data(citations_df, grants_df, 'avg_citations')
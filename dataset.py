@@ -0,0 +1,352 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+import snapshot
+from correlation import RankIndex
+from filter_index import FilterIndex
+from ingest import CsvTail, FileRewritten, GrantKeyIndex
+from linkage import LINK_COLUMNS, LINKAGE_ENABLED, LINKAGE_VERSION, NameLinker, apply_links
+from normalize import NAME_KEY, NORMALIZE_VERSION, name_key_column, researcher_universities, with_name_keys
+from query import MERGE_VERSION
+from stats_cube import CorrelationCube, StatsCube, UniversityGroups
+
+logger = logging.getLogger(__name__)
+
+CITATION_COLUMNS = ["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"]
+SUMMARY_COLUMNS = ["CitationCount", "Amount($)"]
+CORRELATION_COLUMNS = ("CitationCount", "Amount($)")
+
+
+def load_citations_csv(path):
+    citations_df = pd.read_csv(path, header=None)
+    citations_df.columns = CITATION_COLUMNS
+    return citations_df
+
+
+def load_grants_csv(path):
+    return pd.read_csv(path)
+
+
+def load_citations(path):
+    return snapshot.load_table("citations", path, load_citations_csv)[0]
+
+
+def load_grants(path):
+    return snapshot.load_table("grants", path, load_grants_csv)[0]
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Dataset:
+    """One immutable build of the citations/grants data.
+
+    Handlers must treat the frames as read-only; a reload builds a new
+    Dataset rather than touching this one. When `previous` is given, the
+    citations and merged frames are previous's with rows appended and the
+    grants are unchanged, so only the new rows are folded into the
+    aggregates.
+    """
+
+    def __init__(self, version, citations_df, grants_df, merged_df, previous=None, linker=None, links=None):
+        self.version = version
+        self.citations = citations_df
+        self.grants = grants_df
+        self.merged = merged_df
+        self.linker = linker
+        self.links = links if links is not None else pd.DataFrame(columns=LINK_COLUMNS)
+        if previous is None:
+            self.index = FilterIndex(merged_df)
+            self.researchers = researcher_universities(citations_df)
+            self.grants_index = FilterIndex(grants_df, university_column=None)
+            self.grant_keys = GrantKeyIndex(grants_df)
+            self.stats = StatsCube.from_index(self.index, merged_df, SUMMARY_COLUMNS, ids=merged_df["Name"])
+            x, y = (merged_df[column] for column in CORRELATION_COLUMNS)
+            self.correlation = CorrelationCube(self.index.university_codes, len(self.index.universities),
+                                               self.index.year_codes, len(self.index.years), x, y)
+            self.ranks = RankIndex(x, y)
+        else:
+            self.index = previous.index.extended(merged_df)
+            new_citations = citations_df.iloc[len(previous.citations):]
+            self.researchers = pd.concat([previous.researchers, researcher_universities(new_citations)],
+                                         ignore_index=True).drop_duplicates().reset_index(drop=True)
+            self.grants_index = previous.grants_index
+            self.grant_keys = previous.grant_keys
+            start = len(previous.merged)
+            new_merged = merged_df.iloc[start:]
+            self.stats = previous.stats.extended(
+                self.index.university_codes[start:], len(self.index.universities),
+                self.index.year_codes[start:], len(self.index.years),
+                {column: new_merged[column] for column in SUMMARY_COLUMNS}, new_merged["Name"])
+            x, y = (new_merged[column] for column in CORRELATION_COLUMNS)
+            self.correlation = previous.correlation.extended(
+                self.index.university_codes[start:], len(self.index.universities),
+                self.index.year_codes[start:], len(self.index.years), x, y)
+            self.ranks = previous.ranks.extended(x, y)
+
+        self.grant_groups = UniversityGroups(name_key_column(grants_df), self.researchers)
+        self.grants_stats = StatsCube(self.grant_groups.codes, self.grant_groups.size,
+                                      self.grants_index.year_codes, len(self.grants_index.years),
+                                      {"Amount($)": grants_df["Amount($)"]})
+
+    def merged_cells(self, university=None, time_frame=None):
+        """Cells of `stats` covering the rows `index.filter` would return."""
+        return self.stats.cells(*self.index.select(university, time_frame))
+
+    def merged_correlation(self, university=None, time_frame=None):
+        """CoMoments of CitationCount vs Amount($) and Spearman's rho over the filtered merged rows."""
+        comoments = self.correlation.comoments(self.merged_cells(university, time_frame))
+        rho = self.ranks.spearman(self.index.rows(university, time_frame), key=(university, time_frame))
+        return comoments, rho
+
+    def grants_cells(self, university=None, time_frame=None):
+        """Cells of `grants_stats` for grants held by researchers at `university` in the time frame.
+
+        The time frame counts back from the latest fiscal year across all grants.
+        """
+        _, year_ids = self.grants_index.select('all', time_frame)
+        group_ids = None
+        if university and university != 'all':
+            group_ids = self.grant_groups.match(university)
+        return self.grants_stats.cells(group_ids, year_ids)
+
+
+class DatasetManager:
+    """Builds the merged dataset once and rebuilds it when the source CSVs change.
+
+    `build` is the merge step (e.g. `preprocess_data`) and receives the
+    citations and grants frames with their normalized "Name Key" column. Changes on disk are detected from the files'
+    mtime/size, checked by `get` at most every `check_interval` seconds. It
+    rebuilds on a background thread and keeps returning the old Dataset
+    until the new one is fully built and swapped in; `refresh` does the same
+    on the calling thread and returns the result. Callbacks registered
+    with `on_reload` then receive it and whether it was a full rebuild
+    (`callback(dataset, full)`); they run on the building thread and should
+    return quickly.
+
+    When only the citations file changed and it grew at the end, just the
+    appended rows are parsed, merged and added to the current Dataset (see
+    ingest.py); anything else triggers a full rebuild.
+    """
+
+    def __init__(self, citations_path, grants_path, build, check_interval=2.0, incremental=True):
+        self.citations_path = citations_path
+        self.grants_path = grants_path
+        self.build = build
+        self.check_interval = check_interval
+        self.incremental = incremental
+        self._dataset = None
+        self._signature = None
+        self._last_check = 0.0
+        self._build_lock = threading.Lock()
+        self._listeners = []
+        self._tail = None
+        self.full_reloads = 0
+        self.incremental_updates = 0
+        self.ingested_rows = 0
+        self.ingest_seconds = 0.0
+        self.last_lag = 0.0
+
+    def on_reload(self, callback):
+        self._listeners.append(callback)
+
+    def _current_signature(self):
+        return (file_signature(self.citations_path), file_signature(self.grants_path))
+
+    def load(self):
+        with self._build_lock:
+            return self._rebuild()
+
+    def _swap(self, dataset, signature, full):
+        self._dataset = dataset
+        self._signature = signature
+        for callback in self._listeners:
+            try:
+                callback(dataset, full)
+            except Exception as e:
+                logger.error(f"Error in dataset reload callback: {str(e)}")
+        return dataset
+
+    def _start_tail(self, signature):
+        self._tail = None
+        if not self.incremental:
+            return
+        try:
+            tail = CsvTail(self.citations_path, signature[0][1])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Not tailing {self.citations_path}: {str(e)}")
+            return
+        # If the file moved on while it was being loaded, the offset is unreliable; the next change reloads fully.
+        if file_signature(self.citations_path) == signature[0]:
+            self._tail = tail
+
+    def _load_links(self, version, linker, citations_df):
+        links = snapshot.read_versioned_table("name_links", version)
+        if links is not None:
+            return links
+        start = time.perf_counter()
+        links = linker.link(citations_df[NAME_KEY])
+        logger.info(f"Linked {len(links)} Scholar names to grant holders in {time.perf_counter() - start:.3f}s")
+        if snapshot.SNAPSHOT_ENABLED:
+            try:
+                snapshot.write_table("name_links", links, version=version)
+            except Exception as e:
+                logger.error(f"Error writing name links snapshot: {str(e)}")
+        return links
+
+    def _rebuild(self):
+        signature = self._current_signature()
+        start = time.perf_counter()
+        citations_df, citations_sha1 = snapshot.load_table("citations", self.citations_path, load_citations_csv)
+        grants_df, grants_sha1 = snapshot.load_table("grants", self.grants_path, load_grants_csv)
+        # The version keys the merged and name link snapshots, so it covers the code that builds them too.
+        version_source = citations_sha1 + grants_sha1 + f"merge-v{MERGE_VERSION}-normalize-v{NORMALIZE_VERSION}"
+        if LINKAGE_ENABLED:
+            version_source += f"links-v{LINKAGE_VERSION}"
+        version = hashlib.sha1(version_source.encode()).hexdigest()[:16]
+        self.full_reloads += 1
+        self._start_tail(signature)
+
+        if self._dataset is not None and self._dataset.version == version:
+            self._signature = signature
+            return self._dataset
+
+        citations_df = with_name_keys(citations_df, flip=False)
+        grants_df = with_name_keys(grants_df)
+        linker = links = None
+        if LINKAGE_ENABLED:
+            linker = NameLinker(grants_df[NAME_KEY])
+            grants_df = linker.canonicalize(grants_df)
+            links = self._load_links(version, linker, citations_df)
+            citations_df = apply_links(citations_df, links)
+
+        merged_df = snapshot.read_versioned_table("merged", version)
+        if merged_df is None:
+            merged_df = self.build(citations_df, grants_df)
+            if snapshot.SNAPSHOT_ENABLED:
+                try:
+                    snapshot.write_table("merged", merged_df, version=version)
+                except Exception as e:
+                    logger.error(f"Error writing merged snapshot: {str(e)}")
+        dataset = Dataset(version, citations_df, grants_df, merged_df, linker=linker, links=links)
+
+        logger.info(f"Dataset {version} built in {time.perf_counter() - start:.3f}s "
+                    f"({len(citations_df)} citations, {len(grants_df)} grants, {len(merged_df)} merged)")
+        return self._swap(dataset, signature, full=True)
+
+    def _ingest(self, signature):
+        """Append the rows added to the citations file; None if the tail cannot continue."""
+        start = time.perf_counter()
+        try:
+            data = self._tail.read()
+        except FileRewritten as e:
+            logger.info(f"{str(e)}, reloading")
+            return None
+
+        current = self._dataset
+        if not data:
+            self._signature = signature
+            return current
+
+        new_citations = with_name_keys(load_citations_csv(io.BytesIO(data)), flip=False)
+        links = current.links
+        if current.linker is not None:
+            new_citations = apply_links(new_citations, links)
+            known = set(current.citations[NAME_KEY])
+            new_links = current.linker.link(new_citations.loc[~new_citations[NAME_KEY].isin(known), NAME_KEY],
+                                            taken=known)
+            if not new_links.empty:
+                new_citations = apply_links(new_citations, new_links)
+                links = pd.concat([links, new_links], ignore_index=True)
+        grant_rows = current.grant_keys.rows(new_citations)
+        new_merged = self.build(new_citations, current.grants.iloc[grant_rows])
+
+        citations_df = pd.concat([current.citations, new_citations], ignore_index=True)
+        merged_df = pd.concat([current.merged, new_merged], ignore_index=True)
+        version = hashlib.sha1((current.version + hashlib.sha1(data).hexdigest()).encode()).hexdigest()[:16]
+        dataset = Dataset(version, citations_df, current.grants, merged_df, previous=current,
+                          linker=current.linker, links=links)
+
+        self.incremental_updates += 1
+        self.ingested_rows += len(new_citations)
+        self.ingest_seconds = time.perf_counter() - start
+        self.last_lag = max(time.time() - self._tail.mtime, 0.0)
+        logger.info(f"Dataset {version}: ingested {len(new_citations)} citation rows "
+                    f"({len(new_merged)} merged) in {self.ingest_seconds:.3f}s")
+        return self._swap(dataset, signature, full=False)
+
+    def _refresh(self):
+        signature = self._current_signature()
+        if self._tail is not None and signature[1] == self._signature[1]:
+            dataset = self._ingest(signature)
+            if dataset is not None:
+                return dataset
+        return self._rebuild()
+
+    def ingest_status(self):
+        """How far the served data trails the citations file."""
+        status = {
+            'path': self.citations_path,
+            'tailing': self._tail is not None,
+            'full_reloads': self.full_reloads,
+            'incremental_updates': self.incremental_updates,
+            'ingested_rows': self.ingested_rows,
+            'last_ingest_seconds': round(self.ingest_seconds, 6),
+            'lag_seconds': round(self.last_lag, 3),
+        }
+        try:
+            mtime_ns, size = file_signature(self.citations_path)
+        except OSError:
+            return status
+        if self._tail is not None:
+            status['offset'] = self._tail.offset
+            status['bytes_behind'] = max(size - self._tail.offset, 0)
+        # Unseen changes: the lag is how long ago the file changed.
+        if self._signature is not None and (mtime_ns, size) != self._signature[0]:
+            status['lag_seconds'] = round(max(time.time() - mtime_ns / 1e9, 0.0), 3)
+        return status
+
+    def get(self):
+        dataset = self._dataset
+        if dataset is None:
+            raise RuntimeError("Dataset has not been loaded")
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return dataset
+        self._last_check = now
+
+        try:
+            changed = self._current_signature() != self._signature
+        except OSError as e:
+            logger.error(f"Error checking data files: {str(e)}")
+            return dataset
+
+        # Only one rebuild at a time; every request keeps serving the old build until it is swapped.
+        if changed and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, name="dataset-refresh", daemon=True).start()
+
+        return dataset
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.error(f"Error reloading data: {str(e)}")
+        finally:
+            self._build_lock.release()
+
+    def refresh(self):
+        """Pick up any change to the data files now, on this thread, and return the current Dataset."""
+        with self._build_lock:
+            if self._current_signature() != self._signature:
+                return self._refresh()
+            return self._dataset
@@ -0,0 +1,172 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+MAX_CACHED_QUERIES = 1024
+# Filters on more values than this use one np.isin pass over the codes instead of gathering row ids.
+MAX_GATHERED_VALUES = 16
+
+
+def time_frame_years(time_frame):
+    """Number of most recent fiscal years a time frame keeps, or None for all."""
+    if not time_frame or time_frame == 'all':
+        return None
+    match = re.fullmatch(r"(\d+)y", time_frame)
+    return int(match.group(1)) if match else None
+
+
+def normalize_time_frame(time_frame):
+    """Canonical name of a time frame, 'all' or '<N>y' as in query.TIME_FRAMES, so equal filters share cache keys."""
+    n_years = time_frame_years(time_frame)
+    return 'all' if n_years is None else f"{n_years}y"
+
+
+class FilterIndex:
+    """Row index over a frame's University and Fiscal Year columns.
+
+    Built once per dataset version. The columns are factorized into codes,
+    and the row ids of each distinct value are kept contiguous (a stable
+    argsort of the codes plus per-value offsets). A filter on a few values
+    gathers their row ids; a filter matching many universities is one
+    `np.isin` over the codes. Either way no `str.contains` or `unique()`
+    scan touches the rows. Results are memoized per (university, time_frame).
+    """
+
+    def __init__(self, df, university_column='University', year_column='Fiscal Year'):
+        self.university_column = university_column
+        self.year_column = year_column
+        if university_column is None:
+            university_codes = np.zeros(len(df), dtype=np.intp)
+            universities = pd.Index([None])
+        else:
+            university_codes, universities = pd.factorize(df[university_column])
+        year_codes, years = pd.factorize(df[year_column])
+        self._set_codes(university_codes, pd.Index(universities), year_codes, pd.Index(years))
+
+    def extended(self, df):
+        """Index over `df`, whose leading rows are the ones this index covers.
+
+        Only the appended rows are factorized, against the values already
+        known, so an ingest does not re-encode the whole columns.
+        """
+        index = FilterIndex.__new__(FilterIndex)
+        index.university_column = self.university_column
+        index.year_column = self.year_column
+        new = df.iloc[self.size:]
+        if self.university_column is None:
+            university_codes, universities = np.zeros(len(new), dtype=np.intp), self.universities
+        else:
+            university_codes, universities = _extend_codes(self.universities, new[self.university_column])
+        year_codes, years = _extend_codes(self.years, new[self.year_column])
+        index._set_codes(np.concatenate([self.university_codes, university_codes]), universities,
+                         np.concatenate([self.year_codes, year_codes]), years)
+        return index
+
+    def _set_codes(self, university_codes, universities, year_codes, years):
+        self.size = len(university_codes)
+        self.universities = universities
+        self.years = years
+        self.university_codes = university_codes
+        self.year_codes = year_codes
+
+        self._university_order, self._university_offsets = _value_rows(university_codes, len(universities))
+        self._year_order, self._year_offsets = _value_rows(year_codes, len(years))
+
+        # Which fiscal years occur for each university, so "last N years" can be
+        # resolved within a university without touching the rows.
+        self._university_years = np.zeros((len(self.universities), len(self.years)), dtype=bool)
+        present = (university_codes >= 0) & (year_codes >= 0)
+        self._university_years[university_codes[present], year_codes[present]] = True
+
+        # Same order as sorted(unique(), reverse=True) on the column.
+        self._years_desc = np.array(sorted(range(len(self.years)), key=lambda i: self.years[i], reverse=True),
+                                    dtype=np.intp)
+
+        self._university_names = pd.Series(self.universities, dtype=object)
+        self._all_rows = np.arange(self.size)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _match_universities(self, university):
+        if not university or university == 'all':
+            return np.arange(len(self.universities))
+        matches = self._university_names.str.contains(university, case=False, na=False)
+        return np.flatnonzero(matches.to_numpy(dtype=bool))
+
+    def select(self, university=None, time_frame=None):
+        """University and fiscal year ids a filter keeps.
+
+        Either is None when that side is unfiltered, which also keeps rows
+        whose value is missing.
+        """
+        if not university or university == 'all':
+            university_ids = None
+            years_present = np.ones(len(self.years), dtype=bool)
+        else:
+            university_ids = self._match_universities(university)
+            years_present = self._university_years[university_ids].any(axis=0)
+
+        year_ids = None
+        n_years = time_frame_years(time_frame)
+        if n_years is not None:
+            ordered = self._years_desc[years_present[self._years_desc]]
+            year_ids = ordered[:n_years]
+        return university_ids, year_ids
+
+    def _compute_rows(self, university, time_frame):
+        university_ids, year_ids = self.select(university, time_frame)
+        if university_ids is None and year_ids is None:
+            return self._all_rows
+        if university_ids is None:
+            return _rows_with(self.year_codes, self._year_order, self._year_offsets, year_ids)
+        rows = _rows_with(self.university_codes, self._university_order, self._university_offsets, university_ids)
+        if year_ids is not None:
+            rows = rows[np.isin(self.year_codes[rows], year_ids)]
+        return rows
+
+    def rows(self, university=None, time_frame=None):
+        """Sorted positions of the rows matching the filter."""
+        key = (university, time_frame)
+        rows = self._cache.get(key)
+        if rows is None:
+            rows = self._compute_rows(university, time_frame)
+            rows.flags.writeable = False
+            with self._lock:
+                if len(self._cache) >= MAX_CACHED_QUERIES:
+                    self._cache.clear()
+                self._cache[key] = rows
+        return rows
+
+    def filter(self, df, university=None, time_frame=None):
+        return df.iloc[self.rows(university, time_frame)]
+
+
+def _extend_codes(values, column):
+    """Codes of `column` against `values`, appending values not seen yet."""
+    codes = values.get_indexer(column)
+    unseen = (codes < 0) & column.notna().to_numpy()
+    if not unseen.any():
+        return codes, values
+    added, added_values = pd.factorize(column[unseen])
+    codes[unseen] = added + len(values)
+    return codes, values.append(pd.Index(added_values))
+
+
+def _value_rows(codes, n_values):
+    """Row ids grouped by code (missing values first) and each code's offset into them."""
+    order = np.argsort(codes, kind="stable")
+    offsets = np.zeros(n_values + 2, dtype=np.intp)
+    np.cumsum(np.bincount(codes + 1, minlength=n_values + 1), out=offsets[1:])
+    return order, offsets
+
+
+def _rows_with(codes, order, offsets, ids):
+    """Sorted row ids whose code is one of `ids`."""
+    if len(ids) <= MAX_GATHERED_VALUES:
+        groups = [order[offsets[i + 1]:offsets[i + 2]] for i in ids]
+        if len(groups) == 1:
+            return groups[0]
+        return np.sort(np.concatenate(groups)) if groups else np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.isin(codes, ids))
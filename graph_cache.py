@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+GRAPH_CACHE_DIR = os.environ.get("CITCO_GRAPH_CACHE_DIR", "graph_cache")
+# Share of max_bytes a full disk cache is pruned down to, so it does not prune on every write.
+PRUNE_TO = 0.9
+
+
+def graph_etag(version, graph_type, university, time_frame):
+    key = "|".join([version, graph_type, university, time_frame])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+class DiskGraphCache:
+    """Rendered graphs on disk, one file per key, so they survive restarts.
+
+    Keys are content addresses (see `graph_etag`): they change with the
+    dataset version, so a file never needs invalidating. Files are named
+    with the image format's extension. The directory's size is tracked as
+    files are written; when a write takes it past `max_bytes`, the least
+    recently used files are pruned down to PRUNE_TO of it.
+    """
+
+    def __init__(self, directory=GRAPH_CACHE_DIR, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.reads = 0
+        self.writes = 0
+        self.pruned = 0
+        # Unknown until the first write scans the directory.
+        self._bytes = None
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+
+    def path(self, key, fmt='png'):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def get(self, key, fmt='png'):
+        path = self.path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        self.reads += 1
+        return value
+
+    def put(self, key, value, fmt='png'):
+        path = self.path(key, fmt)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+            self.writes += 1
+        except OSError as e:
+            logger.error(f"Error writing graph cache file {path}: {str(e)}")
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            else:
+                self._bytes += len(value)
+            full = self._bytes > self.max_bytes
+        if full:
+            self.prune(int(self.max_bytes * PRUNE_TO))
+
+    def _files(self):
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".tmp"):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def prune(self, target=None):
+        """Delete least recently used files until the cache fits in `target` (default `max_bytes`); returns how many."""
+        target = self.max_bytes if target is None else target
+        # One prune at a time; a write racing an ongoing prune leaves it to that one.
+        if not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            with self._lock:
+                self._bytes = total
+            self.pruned += removed
+        finally:
+            self._prune_lock.release()
+        if removed:
+            logger.info(f"Pruned {removed} old graph files from {self.directory}")
+        return removed
+
+    def stats(self):
+        files = list(self._files())
+        return {
+            'directory': self.directory,
+            'files': len(files),
+            'bytes': sum(size for _, size, _ in files),
+            'max_bytes': self.max_bytes,
+            'reads': self.reads,
+            'writes': self.writes,
+            'pruned': self.pruned,
+        }
+
+
+class GraphCache:
+    """LRU cache of rendered graph images bounded by entry count and total bytes.
+
+    Keys should include the dataset version so that entries from an older
+    build are never served; they simply age out. With a `disk` cache,
+    misses fall through to it and new images are written to both, unless
+    they are not to be persisted.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, fmt='png', persist=True):
+        self._put_memory(key, value)
+        if persist and self.disk is not None:
+            self.disk.put(key, value, fmt)
+
+    def _put_memory(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_or_create(self, key, create, fmt='png', persist=True):
+        """Cached image for `key`, else `create()`'s, which is cached in memory and, if `persist`, on disk."""
+        value = self.get(key)
+        if value is None and persist and self.disk is not None:
+            value = self.disk.get(key, fmt)
+            if value is not None:
+                self._put_memory(key, value)
+                return value
+        if value is None:
+            value = create()
+            self.put(key, value, fmt, persist)
+        return value
+
+    def contains(self, key, fmt='png'):
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.disk is not None and os.path.exists(self.disk.path(key, fmt))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk': self.disk.stats() if self.disk is not None else None,
+            }
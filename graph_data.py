@@ -0,0 +1,190 @@
+import os
+
+import numpy as np
+
+
+GRAPH_TYPES = ('citation_vs_grants', 'avg_citations', 'avg_grants')
+MAX_SCATTER_POINTS = 2000
+# Above this many rows the rendered scatter becomes a density image.
+DENSITY_THRESHOLD = int(os.environ.get("CITCO_DENSITY_THRESHOLD", "20000"))
+DENSITY_BINS = 200
+IMAGE_MIMETYPES = {'png': 'image/png', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+# savefig arguments per format; lossless WebP is exact and the smallest of the three for these charts.
+IMAGE_SAVEFIG_ARGS = {
+    'png': {},
+    'webp': {'pil_kwargs': {'lossless': True}},
+    'svg': {'metadata': {'Date': None}},
+}
+# Resolutions a `dpi` or `width` request is rounded up to, so clients can only ask for a few variants.
+DPI_STEPS = (20, 40, 60, 80, 100, 150, 200, 300)
+
+
+class RegressionSums:
+    """Running sums of a stream of (x, y) points, enough for a least-squares line.
+
+    Values are shifted by the first batch's means before summing, so the
+    sums of squares of large amounts do not swamp the fit in float64.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.shift = None
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_xx = 0.0
+        self.x_min = float('inf')
+        self.x_max = float('-inf')
+
+    def add(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not len(x):
+            return self
+        if self.shift is None:
+            self.shift = (float(x.mean()), float(y.mean()))
+        dx = x - self.shift[0]
+        dy = y - self.shift[1]
+        self.n += len(x)
+        self.sum_x += float(dx.sum())
+        self.sum_y += float(dy.sum())
+        self.sum_xy += float(dx @ dy)
+        self.sum_xx += float(dx @ dx)
+        self.x_min = min(self.x_min, float(x.min()))
+        self.x_max = max(self.x_max, float(x.max()))
+        return self
+
+    def fit(self):
+        if self.n < 2 or self.x_min == self.x_max:
+            return None
+        sxx = self.sum_xx - self.sum_x * self.sum_x / self.n
+        if not sxx > 0:
+            return None
+        slope = (self.sum_xy - self.sum_x * self.sum_y / self.n) / sxx
+        intercept = self.shift[1] + self.sum_y / self.n - slope * (self.shift[0] + self.sum_x / self.n)
+        return {'slope': slope, 'intercept': intercept}
+
+    def line(self):
+        """End points of the fitted line across the x range, or None."""
+        fit = self.fit()
+        if fit is None:
+            return None
+        x = np.array([self.x_min, self.x_max])
+        return x, fit['slope'] * x + fit['intercept']
+
+
+def fit_line(x, y):
+    return RegressionSums().add(x, y).fit()
+
+
+def _bin_codes(values, bins):
+    low, high = float(values.min()), float(values.max())
+    if high == low:
+        low, high = low - 0.5, high + 0.5
+    codes = ((values - low) * (bins / (high - low))).astype(np.intp)
+    return np.minimum(codes, bins - 1), low, high
+
+
+def density_grid(x, y, bins=DENSITY_BINS):
+    """Point counts on a bins x bins grid over the data range, rows running up the y axis."""
+    x_codes, x_low, x_high = _bin_codes(x, bins)
+    y_codes, y_low, y_high = _bin_codes(y, bins)
+    counts = np.bincount(y_codes * bins + x_codes, minlength=bins * bins).reshape(bins, bins)
+    return counts.astype(np.uint32), (x_low, x_high, y_low, y_high)
+
+
+def scatter_payload(x, y, threshold=DENSITY_THRESHOLD, bins=DENSITY_BINS):
+    """What the citation vs grants chart draws: the points, or above `threshold` points their density grid.
+
+    Either way its size is bounded by `threshold` and `bins`, not by the
+    number of rows, and the fit line is reduced to its two end points.
+    """
+    sums = RegressionSums().add(x, y)
+    payload = {'n': sums.n, 'line': sums.line()}
+    if sums.n > threshold:
+        payload['density'] = density_grid(x, y, bins)
+    else:
+        payload['points'] = np.column_stack([x, y])
+    return payload
+
+
+def downsample(n, max_points, seed=0):
+    """Stable random subset of row positions, so the same data always yields the same points."""
+    if n <= max_points:
+        return None
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n, size=max_points, replace=False))
+
+
+def scatter_series(df, max_points=MAX_SCATTER_POINTS):
+    x = df["CitationCount"].to_numpy(dtype=float)
+    y = df["Amount($)"].to_numpy(dtype=float)
+
+    # The fit and ranges always come from every row; only the drawn points are sampled.
+    series = {
+        'n': len(x),
+        'fit': fit_line(x, y),
+        'x_range': [float(x.min()), float(x.max())],
+        'y_range': [float(y.min()), float(y.max())],
+    }
+    rows = downsample(len(x), max_points)
+    if rows is not None:
+        x, y = x[rows], y[rows]
+    series['sampled'] = rows is not None
+    series['x'] = x.tolist()
+    series['y'] = y.tolist()
+    return series
+
+
+def yearly_mean_series(df, column):
+    graph_data = df.groupby("Fiscal Year")[column].mean().sort_index()
+    return {
+        'n': len(df),
+        'years': [str(year) for year in graph_data.index],
+        'values': [round(float(value), 2) for value in graph_data.to_numpy()],
+    }
+
+
+def graph_series(df, graph_type, max_points=MAX_SCATTER_POINTS):
+    """Data behind a graph type, ready to be drawn by the browser."""
+    if graph_type not in GRAPH_TYPES:
+        raise ValueError(f"Unknown graph type: {graph_type}")
+
+    if df.empty:
+        series = {'n': 0}
+    elif graph_type == 'citation_vs_grants':
+        series = scatter_series(df, max_points)
+    elif graph_type == 'avg_citations':
+        series = yearly_mean_series(df, "CitationCount")
+    else:
+        series = yearly_mean_series(df, "Amount($)")
+
+    series['type'] = graph_type
+    return series
+
+
+def image_format(extension, accept):
+    """Format for /graph.<extension>, or without one the best that `accept` (the Accept header) allows.
+
+    None for an unsupported extension; PNG if the client accepts none of the formats.
+    """
+    if extension is not None:
+        return extension if extension in IMAGE_MIMETYPES else None
+    best = accept.best_match(list(IMAGE_MIMETYPES.values()), default=IMAGE_MIMETYPES['png'])
+    return next(fmt for fmt, mimetype in IMAGE_MIMETYPES.items() if mimetype == best)
+
+
+def image_dpi(args, default, figure_width):
+    """Resolution from a `dpi` or `width` (pixels) query parameter, rounded up to one of DPI_STEPS."""
+    try:
+        if 'width' in args:
+            dpi = float(args['width']) / figure_width
+        elif 'dpi' in args:
+            dpi = float(args['dpi'])
+        else:
+            return default
+    except ValueError:
+        return default
+    if not np.isfinite(dpi):
+        return default
+    return next((step for step in DPI_STEPS if step >= dpi), DPI_STEPS[-1])
@@ -1,11 +1,16 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
 import time
-import csv
 import os
 import random
 from urllib.parse import quote
+import snapshot
+from jobstore import DONE, NOT_FOUND, JobStore
+from scholar_extract import get_extractor
+
+SCHOLAR_BASE_URL = os.environ.get("SCHOLAR_BASE_URL", "https://scholar.google.com")
+JOBS_DB = os.environ.get("SCRAPE_JOBS_DB", "scrape_jobs.db")
+EXTRACTOR = get_extractor()
 
 def get_headers():
     user_agents = [
@@ -28,7 +33,7 @@ def get_headers():
 def read_nserc_data(file_path):
     if file_path.endswith('.xlsx') or file_path.endswith('.xls'):
         try:
-            return pd.read_excel(file_path)
+            return snapshot.load_table("nserc_dataset", file_path, pd.read_excel)[0]
         except Exception as e:
             print(f"Error reading Excel file: {e}")
             exit(1)
@@ -45,204 +50,153 @@ def read_nserc_data(file_path):
         print(f"Unsupported file format: {file_path}")
         exit(1)
 
-input_file = "NSERC_DATASET.xlsx" 
-output_file = "researcher_citations.csv"
+def search_url(name, base_url=SCHOLAR_BASE_URL):
+    return f"{base_url}/citations?view_op=search_authors&mauthors={quote(name)}"
 
-print(f"Reading input file: {input_file}")
-df = read_nserc_data(input_file)
+def profile_url(author_id, base_url=SCHOLAR_BASE_URL):
+    return f"{base_url}/citations?user={author_id}&hl=en"
 
-# print("First 5 rows of input data:")
-# print(df.head())
+def publications_url(author_id, base_url=SCHOLAR_BASE_URL):
+    return f"{base_url}/citations?user={author_id}&hl=en&cstart=0&pagesize=100"
 
-if 'Name' in df.columns:
-    df['Name'] = df['Name'].str.replace('"', '').str.strip()
-    print("Cleaned 'Name' column")
-else:
-    print(f"Warning: 'Name' column not found in {list(df.columns)}")
-    exit(1)
+def parse_author_id(html):
+    return EXTRACTOR.author_id(html)
 
-if not os.path.exists(output_file):
-    with open(output_file, "w", newline='', encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"])
-    print(f"Created new output file: {output_file}")
+def parse_author_profile(html):
+    return EXTRACTOR.profile(html)
 
-processed_names = set()
-if os.path.exists(output_file):
-    with open(output_file, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        try:
-            next(reader)  
-            for row in reader:
-                if row and len(row) >= 3:  
-                    name = row[0]  
-                    fiscal_year = row[2]  
-                   
-                    name_year_key = f"{name}_{fiscal_year}"
-                    processed_names.add(name_year_key)
-        except StopIteration:
-            print("Output file exists but appears to be empty or contains only a header.")
-    print(f"found {len(processed_names)} previously processed entries")
-
-grouped = df.groupby(["Name", "Fiscal Year"]).first().reset_index()
-print(f"Total unique Name/Fiscal Year combinations: {len(grouped)}")
-
-CHUNK_SIZE = 25
-chunk_start = 465 # change this part on reruns -->>>>>> terminal will say next chunk value put that number here pls!!!! (e.g., 25, 50, 75...)
-chunk_end = min(chunk_start + CHUNK_SIZE, len(grouped))
-chunk = grouped.iloc[chunk_start:chunk_end]
-print(f"Processing chunk from {chunk_start} to {chunk_end-1} ({len(chunk)} entries)")
+def parse_publications(html):
+    """(year, citations) for every publication row that has a year."""
+    return EXTRACTOR.publications(html)
+
+def citations_in_range(publications, year_start, year_end):
+    return sum(citations for year, citations in publications if year_start <= year <= year_end)
+
+def citation_window(fiscal_year):
+    year_parts = fiscal_year.split("-")
+    if len(year_parts) == 2:
+        year_start = int(year_parts[0]) - 6
+        year_end = int(year_parts[0]) - 1
+    else:
+        year_start = int(fiscal_year) - 6
+        year_end = int(fiscal_year) - 1
+    return year_start, year_end
 
 def search_author(name):
-    search_url = f"https://scholar.google.com/citations?view_op=search_authors&mauthors={quote(name)}"
-    
-    response = requests.get(search_url, headers=get_headers())
+    response = requests.get(search_url(name), headers=get_headers())
     if response.status_code != 200:
         print(f"search request failed with status code {response.status_code}")
         return None
-        
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    profile_links = soup.select('a[href*="user="]')
-    
-    if not profile_links:
-        return None
     
-    author_id = profile_links[0]['href'].split('user=')[1].split('&')[0]
-    return author_id
+    return parse_author_id(response.text)
 
 def get_author_profile(author_id):
-    profile_url = f"https://scholar.google.com/citations?user={author_id}&hl=en"
-    
-    response = requests.get(profile_url, headers=get_headers())
+    response = requests.get(profile_url(author_id), headers=get_headers())
     if response.status_code != 200:
         print(f"profile req failed with status code {response.status_code}")
         raise Exception(f"failed to fetch profile: {response.status_code}")
-        
-    soup = BeautifulSoup(response.text, 'html.parser')
     
-    name_elem = soup.select_one('#gsc_prf_in')
-    affiliation_elem = soup.select_one('.gsc_prf_il')
-    
-    name = name_elem.text if name_elem else "N/A"
-    affiliation = affiliation_elem.text if affiliation_elem else "UNKNOWN"
-    
-    return {
-        "name": name,
-        "affiliation": affiliation
-    }
+    return parse_author_profile(response.text)
 
-def get_publications_in_range(author_id, year_start, year_end):
-    publications_url = f"https://scholar.google.com/citations?user={author_id}&hl=en&cstart=0&pagesize=100"
-    
-    response = requests.get(publications_url, headers=get_headers())
+def get_publications(author_id):
+    response = requests.get(publications_url(author_id), headers=get_headers())
     if response.status_code != 200:
         print(f"publications request failed with status code {response.status_code}")
         raise Exception(f"failed to fetch publications: {response.status_code}")
-        
-    soup = BeautifulSoup(response.text, 'html.parser')
     
-    total_citations = 0
-    
-    pub_rows = soup.select('tr.gsc_a_tr')
-    
-    for row in pub_rows:
-        year_elem = row.select_one('.gsc_a_y')
-        if not year_elem or not year_elem.text:
-            continue
-            
-        try:
-            year = int(year_elem.text)
-            if year_start <= year <= year_end:
-                citation_elem = row.select_one('.gsc_a_c')
-                if citation_elem and citation_elem.text and citation_elem.text.strip().isdigit():
-                    total_citations += int(citation_elem.text)
-        except ValueError:
-            continue
-    
-    return total_citations
+    return parse_publications(response.text)
 
-for index, row in chunk.iterrows():
-    name = row["Name"]
-    fiscal_year = row["Fiscal Year"]
-    
-    original_name_year_key = f"{name}_{fiscal_year}"
-    
-    if original_name_year_key in processed_names:
-        print(f"skipping already processed name: {name} for {fiscal_year}")
-        continue
-    
-    print(f"Processing {name} for {fiscal_year}")
+def citation_rows(profile_data, fiscal_years, publications):
+    """One citations CSV row per fiscal year, all from a single fetch of the author's publications."""
+    rows = []
+    for fiscal_year in fiscal_years:
+        year_start, year_end = citation_window(fiscal_year)
+        total_citations = citations_in_range(publications, year_start, year_end)
+        rows.append([profile_data["name"], profile_data["affiliation"], fiscal_year,
+                     f"{year_start}-{year_end}", total_citations])
+    return rows
+
+def not_found_rows(name, fiscal_years):
+    return [[name, "NOT_FOUND", fiscal_year, "N/A", -1] for fiscal_year in fiscal_years]
+
+def load_work_items(input_file):
+    print(f"Reading input file: {input_file}")
+    df = read_nserc_data(input_file)
+
+    # print("First 5 rows of input data:")
+    # print(df.head())
+
+    if 'Name' in df.columns:
+        df['Name'] = df['Name'].str.replace('"', '').str.strip()
+        print("Cleaned 'Name' column")
+    else:
+        print(f"Warning: 'Name' column not found in {list(df.columns)}")
+        exit(1)
+
+    grouped = df.groupby(["Name", "Fiscal Year"]).first().reset_index()
+    print(f"Total unique Name/Fiscal Year combinations: {len(grouped)}")
+    return grouped
+
+def main():
+    input_file = "NSERC_DATASET.xlsx" 
+    output_file = "researcher_citations.csv"
+
+    store = JobStore(JOBS_DB)
+    # Only re-read the input when it changed since it was last queued.
+    source_key = snapshot.file_digest(input_file)
+    if store.get_meta("seed_source") != source_key:
+        grouped = load_work_items(input_file)
+        store.seed(zip(grouped["Name"], grouped["Fiscal Year"]), source_key)
+    store.import_csv(output_file)
+    print(f"Job states: {store.counts()}")
+
+    CHUNK_SIZE = 25
+    processed = 0
+    try:
+        while True:
+            chunk = store.claim_authors(CHUNK_SIZE)
+            if not chunk:
+                break
+            print(f"Processing {len(chunk)} authors")
+
+            for name, fiscal_years in chunk.items():
+                print(f"Processing {name} for {', '.join(fiscal_years)}")
     
-    time.sleep(random.uniform(5, 10))
+                time.sleep(random.uniform(5, 10))
     
-    try:
-        author_id = search_author(name)
-        
-        if not author_id:
-            print(f"no corresponding author found for {name}. moving to next...")
-            
-            with open(output_file, "a", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([name, "NOT_FOUND", fiscal_year, "N/A", -1])
-            
-            processed_names.add(original_name_year_key)
-            continue
-        
-        year_parts = fiscal_year.split("-")
-        if len(year_parts) == 2:
-            year_start = int(year_parts[0]) - 6
-            year_end = int(year_parts[0]) - 1
-        else:
-            year_start = int(fiscal_year) - 6
-            year_end = int(fiscal_year) - 1
-            
-        citation_window = f"{year_start}-{year_end}"
+                try:
+                    author_id = search_author(name)
         
-        profile_data = get_author_profile(author_id)
-        name_clean = profile_data["name"]
-        affiliation = profile_data["affiliation"]
+                    if not author_id:
+                        print(f"no corresponding author found for {name}. moving to next...")
+                        rows = not_found_rows(name, fiscal_years)
+                        store.record([(name, row[2], NOT_FOUND, row) for row in rows])
+                        processed += len(rows)
+                        continue
         
-        total_citations = get_publications_in_range(author_id, year_start, year_end)
+                    profile_data = get_author_profile(author_id)
+                    publications = get_publications(author_id)
         
-        with open(output_file, "a", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([name_clean, affiliation, fiscal_year, citation_window, total_citations])
+                    rows = citation_rows(profile_data, fiscal_years, publications)
+                    store.record([(name, row[2], DONE, row) for row in rows])
+                    processed += len(rows)
         
-        processed_names.add(original_name_year_key)
+                    for row in rows:
+                        print(f"Success: {row[0]} | {row[1]} | {row[3]} → {row[4]} citations")
         
-        print(f"Success: {name_clean} | {affiliation} | {citation_window} → {total_citations} citations")
+                    time.sleep(random.uniform(30, 45))
         
-        time.sleep(random.uniform(30, 45))
-        
-    except Exception as e:
-        print(f"error with {name}: {str(e)}")
-        print("waiting")
-        time.sleep(random.uniform(300, 600)) 
-        
-        try:
-            university = row.get('University', '') if 'University' in row else ''
-            search_query = f"{name} {university}"
-            
-            print(f"alternate search regex test: {search_query}")
-            
-            with open(output_file, "a", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([name, "ERROR", fiscal_year, "N/A", -1])
-            
-            processed_names.add(original_name_year_key)
-            
-        except Exception as e2:
-            print(f"second attempt failed for {name}: {str(e2)}")
-            
-            with open(output_file, "a", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([name, "ERROR", fiscal_year, "N/A", -1])
-            
-            processed_names.add(original_name_year_key)
-            
-            time.sleep(random.uniform(600, 900)) 
-
-print(f"\ndone results saved to {output_file}")
-print(f"Processed {len(chunk)} entries from chunk {chunk_start} to {chunk_end-1}")
-print(f"Next chunk start value: {chunk_end}")
\ No newline at end of file
+                except Exception as e:
+                    print(f"error with {name}: {str(e)}")
+                    store.fail([(name, fiscal_year, str(e)) for fiscal_year in fiscal_years])
+                    print("waiting")
+                    time.sleep(random.uniform(300, 600)) 
+    finally:
+        store.export_csv(output_file)
+        store.close()
+
+    print(f"\ndone results saved to {output_file}")
+    print(f"Processed {processed} entries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Incremental ingestion of rows appended to the citations CSV.
+
+The scrapers grow the citations file at the end. Instead of re-reading and
+re-merging the whole file, DatasetManager keeps a CsvTail on it: each check
+reads the complete lines written since the last byte offset, and the new
+rows are joined against a GrantKeyIndex and appended to the current
+Dataset. A file that was truncated, or rewritten with different leading
+content, raises FileRewritten and falls back to a full reload.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from normalize import NAME_KEY
+
+# Bytes just before the read offset that are compared on every read, to spot a rewrite in place.
+TAIL_CHECK_BYTES = 4096
+
+
+class FileRewritten(Exception):
+    pass
+
+
+class CsvTail:
+    """Reads the complete lines appended to a file since the last call.
+
+    `offset` is how much of the file has already been consumed (e.g. by a
+    full load) and must fall on a line boundary.
+    """
+
+    def __init__(self, path, offset):
+        self.path = path
+        self.offset = 0
+        self._digest = hashlib.sha1()
+        self._recent = b""
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._consume(f.read(offset))
+        if self._recent and not self._recent.endswith(b"\n"):
+            raise ValueError(f"{path} does not end a line at byte {offset}")
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+
+    def _consume(self, data):
+        self.offset += len(data)
+        self._digest.update(data)
+        self._recent = (self._recent + data)[-TAIL_CHECK_BYTES:]
+
+    def _check_prefix(self, f, file_id):
+        if file_id != self._file_id:
+            # Replaced (e.g. an atomic rename): accept it only if it still starts with what we read.
+            digest = hashlib.sha1()
+            remaining = self.offset
+            while remaining:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+            if remaining or digest.digest() != self._digest.digest():
+                raise FileRewritten(f"{self.path} was replaced with different content")
+            self._file_id = file_id
+            return
+        start = self.offset - len(self._recent)
+        f.seek(start)
+        if f.read(len(self._recent)) != self._recent:
+            raise FileRewritten(f"{self.path} was rewritten in place")
+
+    def read(self):
+        """Bytes of the complete lines appended since the last read (b"" if none)."""
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < self.offset:
+                raise FileRewritten(f"{self.path} was truncated")
+            self._check_prefix(f, (stat.st_dev, stat.st_ino))
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+
+        # A line still being written is left for the next read.
+        data = data[:data.rfind(b"\n") + 1]
+        self._consume(data)
+        return data
+
+    @property
+    def bytes_behind(self):
+        return max(self.size - self.offset, 0)
+
+
+def join_keys(df):
+    years = df["Fiscal Year"].astype(str).str.strip()
+    return (df[NAME_KEY] + "\x1f" + years).to_numpy(dtype=str)
+
+
+class GrantKeyIndex:
+    """Positions of the grant rows for each (name key, fiscal year).
+
+    Lets a handful of new citation rows be joined against just their
+    matching grants instead of re-merging the whole grants table.
+    """
+
+    def __init__(self, grants_df):
+        keys = join_keys(grants_df)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def rows(self, citations_df):
+        """Sorted grant row positions matching any row of `citations_df` (which needs its name keys)."""
+        if citations_df.empty:
+            return np.zeros(0, dtype=np.intp)
+        keys = join_keys(citations_df)
+        left = np.searchsorted(self._keys, keys, side="left")
+        right = np.searchsorted(self._keys, keys, side="right")
+        positions = [self._order[start:end] for start, end in zip(left, right) if end > start]
+        if not positions:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(positions))
@@ -0,0 +1,303 @@
+"""SQLite-backed work queue for the Scholar scrapers.
+
+Each (name, fiscal_year) work item is a row in the `jobs` table and moves
+through the states below. A run claims pending items, records results in
+batched transactions and exports the finished rows to the citations CSV, so a
+crashed or interrupted run simply resumes where it stopped.
+
+Jobs are keyed by the NSERC name ("Last, First"), but a found author's CSV
+row carries their Scholar profile name. Importing an existing CSV therefore
+matches rows to jobs by `match_keys`, and keeps rows that match no job so the
+export writes them back unchanged.
+"""
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+OUTPUT_COLUMNS = ["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT NOT NULL,
+    fiscal_year TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_eligible REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result_name TEXT,
+    university TEXT,
+    citation_window TEXT,
+    citation_count INTEGER,
+    updated REAL,
+    PRIMARY KEY (name, fiscal_year)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, next_eligible);
+CREATE TABLE IF NOT EXISTS carried_rows (
+    position INTEGER PRIMARY KEY,
+    name TEXT,
+    university TEXT,
+    fiscal_year TEXT,
+    citation_window TEXT,
+    citation_count TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def name_tokens(name):
+    """Lowercase ASCII words of a name in "First Last" order, flipping "Last, First"."""
+    if "," in name:
+        last, first = name.split(",", 1)
+        name = f"{first} {last}"
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    return re.findall(r"[a-z]+", name)
+
+
+def match_keys(name):
+    """(full, first + last) name keys; "Last, First" and "First Last" spellings of a name share them."""
+    tokens = name_tokens(name)
+    if not tokens:
+        return None, None
+    return "".join(tokens), f"{tokens[0]} {tokens[-1]}"
+
+
+def read_rows(path):
+    """Data rows of a citations CSV, without the header."""
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row[:5] for row in csv.reader(f) if len(row) >= 5 and row[:5] != OUTPUT_COLUMNS]
+
+
+class JobStore:
+    def __init__(self, path="scrape_jobs.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.recover()
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self, statements):
+        """Run (sql, rows) pairs in one transaction and return each statement's row count."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                counts = [self._conn.executemany(sql, rows).rowcount for sql, rows in statements]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return counts
+
+    def get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def recover(self):
+        """Return items left in flight by a crashed run to the queue."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT))
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} in-flight jobs from an interrupted run")
+
+    def seed(self, items, source_key):
+        """Add (name, fiscal_year) items, skipping the work when `source_key` was already seeded."""
+        if self.get_meta("seed_source") == source_key:
+            return 0
+        added, _ = self._transaction([
+            ("INSERT OR IGNORE INTO jobs (name, fiscal_year) VALUES (?, ?)",
+             [(str(name), str(fiscal_year)) for name, fiscal_year in items]),
+            ("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [("seed_source", source_key)]),
+        ])
+        logger.info(f"Seeded {added} new jobs")
+        return added
+
+    def import_csv(self, path):
+        """Mark items already present in a citations CSV as finished.
+
+        A row is matched to an unmatched job of its fiscal year with the same
+        name, else the same full name key, else the same first + last key if
+        only one job has it. The rows still unmatched are then taken per
+        Scholar name: they go to the one job name that has all of their
+        fiscal years left and shares a word with it ("Steve Brown" and
+        "Brown, Stephen"). Rows that match nothing are kept for `export_csv`.
+        """
+        if self.get_meta("imported_csv") == os.path.abspath(path) or not os.path.exists(path):
+            return
+        by_name, by_key, by_short = {}, {}, {}
+        for name, fiscal_year in self._conn.execute("SELECT name, fiscal_year FROM jobs ORDER BY rowid"):
+            key, short = match_keys(name)
+            by_name[(name, fiscal_year)] = name
+            by_key.setdefault((key, fiscal_year), []).append(name)
+            by_short.setdefault((short, fiscal_year), []).append(name)
+
+        matched = {}
+        unmatched = []
+        for position, row in enumerate(read_rows(path)):
+            name, fiscal_year = row[0], row[2]
+            key, short = match_keys(name)
+            candidates = [[by_name[(name, fiscal_year)]] if (name, fiscal_year) in by_name else [],
+                          by_key.get((key, fiscal_year), []),
+                          [job for job in by_short.get((short, fiscal_year), [])
+                           if len(by_short[(short, fiscal_year)]) == 1]]
+            job = next((job for jobs in candidates for job in jobs if (job, fiscal_year) not in matched), None)
+            if job is None:
+                unmatched.append((position, row))
+            else:
+                matched[(job, fiscal_year)] = (position, row)
+
+        groups = {}
+        for position, row in unmatched:
+            groups.setdefault(row[0], []).append((position, row))
+        carried = []
+        for name, rows in groups.items():
+            years = {row[2] for _, row in rows}
+            words = set(name_tokens(name))
+            jobs = [job for job in dict.fromkeys(job for job, _ in by_name)
+                    if words & set(name_tokens(job))
+                    and all((job, year) in by_name and (job, year) not in matched for year in years)]
+            if len(jobs) == 1 and len(years) == len(rows):
+                for position, row in rows:
+                    matched[(jobs[0], row[2])] = (position, row)
+            else:
+                carried += rows
+
+        updates = []
+        for (job, fiscal_year), (_, row) in matched.items():
+            name, university, _, window, count = row
+            state = {"NOT_FOUND": NOT_FOUND, "ERROR": ERROR}.get(university, DONE)
+            try:
+                count = int(count)
+            except ValueError:
+                count = -1
+            updates.append((state, name, university, window, count, time.time(), job, fiscal_year))
+        carried = [row for _, row in sorted(carried)]
+        self._transaction([
+            ("UPDATE jobs SET state = ?, result_name = ?, university = ?, citation_window = ?, "
+             "citation_count = ?, updated = ? WHERE name = ? AND fiscal_year = ?", updates),
+            ("DELETE FROM carried_rows", [()]),
+            ("INSERT INTO carried_rows (name, university, fiscal_year, citation_window, citation_count) "
+             "VALUES (?, ?, ?, ?, ?)", carried),
+            ("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [("imported_csv", os.path.abspath(path))]),
+        ])
+        logger.info(f"Imported {len(updates)} rows from {path}; kept {len(carried)} rows that match no job")
+
+    def claim_authors(self, limit):
+        """Claim every eligible pending item for up to `limit` names.
+
+        Returns {name: [fiscal_year, ...]} so each author is scraped once for
+        all of their fiscal years.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT name, fiscal_year FROM jobs WHERE state = ? AND next_eligible <= ? AND name IN ("
+                    "  SELECT name FROM jobs WHERE state = ? AND next_eligible <= ?"
+                    "  GROUP BY name ORDER BY MIN(rowid) LIMIT ?"
+                    ") ORDER BY rowid", (PENDING, now, PENDING, now, limit)).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET state = ? WHERE name = ? AND fiscal_year = ?",
+                    [(IN_FLIGHT, name, fiscal_year) for name, fiscal_year in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        authors = {}
+        for name, fiscal_year in rows:
+            authors.setdefault(name, []).append(fiscal_year)
+        return authors
+
+    def record(self, results):
+        """Commit a batch of `(name, fiscal_year, state, row)` results.
+
+        `state` is DONE or NOT_FOUND and `row` is the item's citations CSV row.
+        Failures go through `fail` instead so they can be retried.
+        """
+        now = time.time()
+        self._transaction([(
+            "UPDATE jobs SET state = ?, result_name = ?, university = ?, citation_window = ?, "
+            "citation_count = ?, last_error = NULL, updated = ? WHERE name = ? AND fiscal_year = ?",
+            [(state, row[0], row[1], row[3], row[4], now, name, fiscal_year)
+             for name, fiscal_year, state, row in results],
+        )])
+
+    def fail(self, failures, max_attempts=3, backoff=600):
+        """Requeue failed items with exponential backoff, or mark them ERROR after `max_attempts`."""
+        now = time.time()
+        with self._lock:
+            attempts = {
+                (name, fiscal_year): self._conn.execute(
+                    "SELECT attempts FROM jobs WHERE name = ? AND fiscal_year = ?", (name, fiscal_year)
+                ).fetchone()[0] + 1
+                for name, fiscal_year, _ in failures
+            }
+        updates = []
+        for name, fiscal_year, message in failures:
+            attempt = attempts[(name, fiscal_year)]
+            state = ERROR if attempt >= max_attempts else PENDING
+            updates.append((state, attempt, now + backoff * 2 ** (attempt - 1), str(message), now,
+                            name, fiscal_year))
+        self._transaction([(
+            "UPDATE jobs SET state = ?, attempts = ?, next_eligible = ?, last_error = ?, updated = ? "
+            "WHERE name = ? AND fiscal_year = ?", updates,
+        )])
+
+    def counts(self):
+        return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def next_eligible(self):
+        row = self._conn.execute(
+            "SELECT MIN(next_eligible) FROM jobs WHERE state = ?", (PENDING,)).fetchone()
+        return row[0]
+
+    def export_csv(self, path):
+        """Write every finished item, then the carried rows, to `path` in the citations CSV format.
+
+        The file is left alone if that would leave it with fewer rows than it has.
+        """
+        rows = []
+        for name, fiscal_year, state, result_name, university, window, citation_count in self._conn.execute(
+                "SELECT name, fiscal_year, state, result_name, university, citation_window, citation_count "
+                "FROM jobs WHERE state IN (?, ?, ?) ORDER BY rowid", (DONE, NOT_FOUND, ERROR)):
+            if state == DONE:
+                rows.append([result_name, university, fiscal_year, window, citation_count])
+            else:
+                rows.append([name, "NOT_FOUND" if state == NOT_FOUND else "ERROR", fiscal_year, "N/A", -1])
+        rows += [list(row) for row in self._conn.execute(
+            "SELECT name, university, fiscal_year, citation_window, citation_count FROM carried_rows "
+            "ORDER BY position")]
+
+        existing = len(read_rows(path))
+        if len(rows) < existing:
+            logger.error(f"Not exporting {len(rows)} rows over the {existing} in {path}; "
+                         f"import it first (or move it aside)")
+            return 0
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(OUTPUT_COLUMNS)
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+        logger.info(f"Exported {len(rows)} rows to {path}")
+        return len(rows)
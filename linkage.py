@@ -0,0 +1,202 @@
+"""Record linkage between Scholar and NSERC researcher names.
+
+The merge joins on name keys ("first last", lowercased), which misses the
+same person written differently on the two sides: "AbouZeid, Hatem" vs
+"Hatem Abou-Zeid", an initial instead of a given name, a dropped accent.
+NSERC itself spells one holder differently across fiscal years, so grant
+keys that only differ in punctuation, accents or case are first collapsed
+to one canonical key (the first seen) on the grant side. NameLinker then
+indexes the canonical keys under a few blocking keys
+(the letters of the whole name, first initial + surname, and a phonetic
+surname code), looks up each Scholar key that has no exact match, and
+scores only the grant keys that share a block with it. A link is kept if
+it scores at least LINK_THRESHOLD, clearly beats the runner-up, and no
+other Scholar name claims the same grant holder.
+
+The resulting table (Scholar key -> grant key) rewrites the citations'
+name keys before the merge; a Scholar key equal to a non-canonical grant
+spelling is linked to the canonical key too, so every fiscal year joins.
+DatasetManager persists it per dataset version next to the merged
+snapshot. `python linkage.py` prints it as CSV for review. Set
+CITCO_NAME_LINKAGE=0 to join on exact keys only.
+"""
+import os
+import re
+import sys
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from normalize import NAME_KEY
+
+LINKAGE_ENABLED = os.environ.get("CITCO_NAME_LINKAGE", "1") != "0"
+# Bump when matching changes, so merged snapshots built with older links are not reused.
+LINKAGE_VERSION = 3
+LINK_THRESHOLD = 0.9
+# Floor for a given name that is a prefix of the other ("chris", "christine"). It is
+# ambiguous, so with an identical surname it stays under LINK_THRESHOLD: it ranks
+# candidates but does not link on its own.
+PREFIX_SCORE = 0.7
+LINK_MARGIN = 0.03
+# Blocks larger than this (very common surnames) are skipped; the other blocks still apply.
+MAX_BLOCK_SIZE = 200
+LINK_COLUMNS = ["Scholar Key", "Grant Key", "Score", "Method"]
+
+TITLES = {"dr", "prof", "professor", "phd", "peng", "msc", "md", "jr", "sr", "ii", "iii"}
+
+
+def name_tokens(key):
+    """Lowercase ASCII name parts, without punctuation, parentheticals or titles."""
+    text = unicodedata.normalize("NFKD", key).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"\([^)]*\)", " ", text)
+    # Hyphens and apostrophes join a name part: "abou-zeid" and "o'brien" are one token.
+    text = re.sub(r"['’-]", "", text)
+    return [token for token in re.findall(r"[a-z]+", text) if token not in TITLES]
+
+
+def phonetic(token):
+    """Consonant skeleton: first letter plus the following consonants, doubles collapsed."""
+    tail = re.sub(r"[aeiouyhw]", "", token[1:])
+    return token[:1] + re.sub(r"(.)\1+", r"\1", tail)
+
+
+def block_keys(tokens):
+    first, last = tokens[0], tokens[-1]
+    keys = {"c:" + "".join(tokens), f"i:{first[0]}|{last}", f"p:{first[0]}|{phonetic(last)}"}
+    if len(tokens) > 1:
+        # Written surname first.
+        keys.add(f"i:{last[0]}|{first}")
+    return keys
+
+
+def _ratio(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _given_score(a, b):
+    if a == b:
+        return 1.0
+    if (len(a) == 1 or len(b) == 1) and a[0] == b[0]:
+        return 0.9
+    if len(a) > 1 and len(b) > 1 and (a.startswith(b) or b.startswith(a)):
+        return max(PREFIX_SCORE, _ratio(a, b))
+    return _ratio(a, b)
+
+
+def name_score(a, b):
+    """Similarity of two token lists in [0, 1]; surname counts more than given name."""
+    if "".join(a) == "".join(b):
+        return 1.0
+    if len(a) < 2 or len(b) < 2:
+        return _ratio("".join(a), "".join(b))
+    surname = max(_ratio(a[-1], b[-1]), _ratio("".join(a[1:]), "".join(b[1:])))
+    return 0.6 * surname + 0.4 * _given_score(a[0], b[0])
+
+
+class NameLinker:
+    """Blocking index over the distinct grant holder name keys."""
+
+    def __init__(self, grant_keys):
+        self.canonical = {}
+        by_letters = {}
+        keys, tokens = [], []
+        for key in pd.unique(pd.Series(grant_keys).dropna()):
+            key_tokens = name_tokens(key)
+            letters = "".join(key_tokens) or key
+            if letters in by_letters:
+                self.canonical[key] = by_letters[letters]
+                continue
+            by_letters[letters] = self.canonical[key] = key
+            keys.append(key)
+            tokens.append(key_tokens)
+        self.keys = np.array(keys, dtype=object)
+        self._tokens = tokens
+        self._blocks = None
+
+    def canonicalize(self, grants_df):
+        """`grants_df` with every spelling of a holder's name key replaced by the canonical one."""
+        keys = grants_df[NAME_KEY]
+        return grants_df.assign(**{NAME_KEY: keys.map(self.canonical).fillna(keys)})
+
+    def _build(self):
+        # Deferred until the first lookup: a persisted link table needs no index.
+        self._blocks = defaultdict(list)
+        for i, tokens in enumerate(self._tokens):
+            if tokens:
+                for block in block_keys(tokens):
+                    self._blocks[block].append(i)
+
+    def candidates(self, tokens):
+        if self._blocks is None:
+            self._build()
+        found = set()
+        for block in block_keys(tokens):
+            members = self._blocks.get(block, ())
+            if len(members) <= MAX_BLOCK_SIZE:
+                found.update(members)
+        return found
+
+    def best_match(self, key):
+        """(grant key, score, method) for a Scholar key without an exact match, or None."""
+        tokens = name_tokens(key)
+        if not tokens:
+            return None
+        candidates = self.candidates(tokens)
+        scored = sorted(((name_score(tokens, self._tokens[i]), i) for i in candidates), reverse=True)
+        if not scored or scored[0][0] < LINK_THRESHOLD:
+            return None
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < LINK_MARGIN:
+            return None
+        score, i = scored[0]
+        method = "normalized" if "".join(tokens) == "".join(self._tokens[i]) else "fuzzy"
+        return self.keys[i], score, method
+
+    def link(self, scholar_keys, taken=()):
+        """Link table for the Scholar keys that are not a canonical grant key.
+
+        A key equal to another spelling of a grant key links to its
+        canonical key. The rest are matched; canonical keys that already
+        have an exact Scholar match, or are in `taken` (linked earlier), are
+        not linked again, and if several Scholar keys pick the same grant
+        key, the best scoring one keeps it.
+        """
+        scholar_keys = pd.unique(pd.Series(scholar_keys).dropna())
+        exact = {key for key in scholar_keys if key in self.canonical}
+        unavailable = {self.canonical[key] for key in exact} | set(taken)
+
+        rows = [(key, self.canonical[key], 1.0, "variant") for key in exact if self.canonical[key] != key]
+        best = {}
+        for key in scholar_keys:
+            if key in exact:
+                continue
+            match = self.best_match(key)
+            if match is None or match[0] in unavailable:
+                continue
+            grant_key, score, method = match
+            if grant_key not in best or score > best[grant_key][1]:
+                best[grant_key] = (key, score, method)
+
+        rows += [(key, grant_key, round(score, 4), method) for grant_key, (key, score, method) in best.items()]
+        return pd.DataFrame(rows, columns=LINK_COLUMNS).sort_values("Scholar Key", ignore_index=True)
+
+
+def apply_links(df, links):
+    """`df` with its name keys replaced by the linked grant keys."""
+    if links is None or links.empty:
+        return df
+    mapping = pd.Series(links["Grant Key"].to_numpy(), index=links["Scholar Key"].to_numpy())
+    keys = df[NAME_KEY]
+    return df.assign(**{NAME_KEY: keys.map(mapping).fillna(keys)})
+
+
+if __name__ == "__main__":
+    from dataset import load_citations, load_grants
+    from normalize import name_keys
+
+    citations_path = sys.argv[1] if len(sys.argv) > 1 else "SCHOLAR.csv"
+    grants_path = sys.argv[2] if len(sys.argv) > 2 else "NSERC.csv"
+    linker = NameLinker(name_keys(load_grants(grants_path)["Name"]))
+    linker.link(name_keys(load_citations(citations_path)["Name"], flip=False)).to_csv(sys.stdout, index=False)
@@ -1,262 +1,133 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib
 import numpy as np
-import io
 import base64
+import contextvars
+import gzip
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import metrics
+import profiling
+import query
+from bootstrap import BootstrapEngine
+from dataset import DatasetManager
+from graph_cache import GRAPH_CACHE_DIR, DiskGraphCache, GraphCache, graph_etag
+from graph_data import GRAPH_TYPES, IMAGE_MIMETYPES, graph_series, image_dpi, image_format, scatter_payload
+from render_pool import DPI, FIGURE_SIZE, RENDER_VERSION, RenderBusy, RenderPool, RenderTimeout, RenderWorkerDied
+from warmup import GraphWarmup
+from query import TIME_FRAMES
 
 matplotlib.use('Agg')
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+WARMUP_ENABLED = os.environ.get("CITCO_WARMUP", "1") != "0"
+
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
 app.static_folder = 'static'
-
-def flip_name(name):
-    if "," in name:
-        parts = name.split(",")
-        return parts[1].strip() + " " + parts[0].strip()
-    return name.strip()
+metrics.instrument(app, GRAPH_TYPES)
+profiling.install(app)
 
 def preprocess_data(citations_df, grants_df):
     try:
-        citations_df = citations_df.copy()
-        grants_df = grants_df.copy()
-        
-        grants_df["Flipped Name"] = grants_df["Name"].apply(flip_name)
-        
-        citations_df["Name"] = citations_df["Name"].str.lower().str.strip()
-        citations_df["Fiscal Year"] = citations_df["Fiscal Year"].astype(str).str.strip()
-        grants_df["Name"] = grants_df["Flipped Name"].str.lower().str.strip()
-        grants_df["Fiscal Year"] = grants_df["Fiscal Year"].astype(str).str.strip()
-        
-        merged_df = pd.merge(citations_df, grants_df, on=["Name", "Fiscal Year"], suffixes=('_citation', '_grant'))
-        
-        final_df = merged_df[["Name", "University", "Fiscal Year", "CitationCount", "Amount($)"]]
-        
-        final_df["CitationCount"] = pd.to_numeric(final_df["CitationCount"], errors="coerce")
-        final_df["Amount($)"] = pd.to_numeric(final_df["Amount($)"], errors="coerce")
-        final_df = final_df.dropna(subset=["CitationCount", "Amount($)"])
-        final_df = final_df[(final_df["CitationCount"] >= 0)]
-        
-        return final_df
+        return query.execute(query.merged_query(citations_df, grants_df))
     except Exception as e:
         logger.error(f"Error preprocessing data: {str(e)}")
         raise
 
-def filter_data(df, university=None, time_frame=None):
-    filtered_df = df.copy()
-    
-    if university and university != 'all':
-        filtered_df = filtered_df[filtered_df['University'].str.contains(university, case=False, na=False)]
-    
-    if time_frame and time_frame != 'all':
-        if time_frame == '1y':
-            most_recent = filtered_df['Fiscal Year'].max()
-            filtered_df = filtered_df[filtered_df['Fiscal Year'] == most_recent]
-        elif time_frame == '3y':
-            years = sorted(filtered_df['Fiscal Year'].unique(), reverse=True)
-            if len(years) > 3:
-                years = years[:3]
-            filtered_df = filtered_df[filtered_df['Fiscal Year'].isin(years)]
-        elif time_frame == '6y':
-            years = sorted(filtered_df['Fiscal Year'].unique(), reverse=True)
-            if len(years) > 6:
-                years = years[:6]
-            filtered_df = filtered_df[filtered_df['Fiscal Year'].isin(years)]
-        elif time_frame == '10y':
-            years = sorted(filtered_df['Fiscal Year'].unique(), reverse=True)
-            if len(years) > 10:
-                years = years[:10]
-            filtered_df = filtered_df[filtered_df['Fiscal Year'].isin(years)]
-    
-    return filtered_df
+def filter_data(df, university=None, time_frame=None, index=None):
+    return query.execute(query.filtered_query(df, university, time_frame, index))
 
-def create_citation_vs_grants_graph(df):
-    plt.style.use('seaborn-v0_8-darkgrid')
-    
-    primary_color = "#eb5e28" 
-    secondary_color = "#252422" 
-    bg_color = "#F2EAD3"  
-    
-    fig, ax = plt.subplots(facecolor=bg_color)
-    ax.set_facecolor(bg_color)
-    
-    ax.scatter(df["CitationCount"], df["Amount($)"], alpha=0.7, color=primary_color, edgecolor=secondary_color)
-    
-    if len(df) > 1:
-        z = np.polyfit(df["CitationCount"], df["Amount($)"], 1)
-        p = np.poly1d(z)
-        ax.plot(df["CitationCount"], p(df["CitationCount"]), linestyle='--', color=secondary_color, linewidth=2, alpha=0.8)
-    
-    ax.set_xlabel("Citation Count (By Year)", color=secondary_color, fontweight='bold')
-    ax.set_ylabel("Grant Amount ($)", color=secondary_color, fontweight='bold')
-    ax.set_title("Citation Count vs Grant Amount", color=secondary_color, fontsize=14, fontweight='bold')
-    
-    ax.grid(True, linestyle='--', alpha=0.4, color=secondary_color)
-    
-    ax.tick_params(colors=secondary_color)
-    for spine in ax.spines.values():
-        spine.set_edgecolor(secondary_color)
-    
-    fig.tight_layout()
-    
-    return fig
+class GraphMessage(Exception):
+    """A graph that cannot be drawn. It is shown as a message image, which is never cached."""
+    pass
 
-def create_avg_citations_graph(df):
-    plt.style.use('seaborn-v0_8-darkgrid')
-    
-    primary_color = "#2a9d8f"  
-    secondary_color = "#252422"  
-    bg_color = "#F2EAD3"  
-    
-    graph_data = df.groupby("Fiscal Year")["CitationCount"].mean().reset_index()
-    graph_data = graph_data.sort_values("Fiscal Year")
-    
-    fig, ax = plt.subplots(facecolor=bg_color)
-    ax.set_facecolor(bg_color)
-    
-    ax.plot(graph_data["Fiscal Year"], graph_data["CitationCount"], 
-            linestyle='-', marker='o', linewidth=2.5, 
-            color=primary_color, markeredgecolor=secondary_color,
-            markerfacecolor=primary_color, markersize=8)
-    
-    ax.set_xlabel("Fiscal Year", color=secondary_color, fontweight='bold')
-    ax.set_ylabel("Average Citation Count", color=secondary_color, fontweight='bold')
-    ax.set_title("Average Citation Count Over Time", color=secondary_color, fontsize=14, fontweight='bold')
-    ax.tick_params(axis='x', rotation=45, colors=secondary_color)
-    ax.tick_params(axis='y', colors=secondary_color)
-    
-    ax.grid(True, linestyle='--', alpha=0.4, color=secondary_color)
-    
-    for spine in ax.spines.values():
-        spine.set_edgecolor(secondary_color)
-    
-    for x, y in zip(graph_data["Fiscal Year"], graph_data["CitationCount"]):
-        ax.annotate(f"{y:.1f}", (x, y), 
-                   textcoords="offset points", 
-                   xytext=(0,10), 
-                   ha='center',
-                   color=secondary_color,
-                   fontweight='bold')
-    
-    fig.tight_layout()
-    
-    return fig
+def message_image(message, fmt='png', dpi=DPI):
+    return render_pool.render_image('message', message, fmt=fmt, dpi=dpi, local=profiling.profiled())
 
-def create_avg_grants_graph(df):
-    plt.style.use('seaborn-v0_8-darkgrid')
-    
-    primary_color = "#D88C00"  
-    secondary_color = "#252422"  
-    bg_color = "#F2EAD3" 
-    
-    graph_data = df.groupby("Fiscal Year")["Amount($)"].mean().reset_index()
-    graph_data = graph_data.sort_values("Fiscal Year")
-    
-    fig, ax = plt.subplots(facecolor=bg_color)
-    ax.set_facecolor(bg_color)
-    
-    ax.plot(graph_data["Fiscal Year"], graph_data["Amount($)"], 
-            linestyle='-', marker='o', linewidth=2.5, 
-            color=primary_color, markeredgecolor=secondary_color,
-            markerfacecolor=primary_color, markersize=8)
-    
-    ax.set_xlabel("Fiscal Year", color=secondary_color, fontweight='bold')
-    ax.set_ylabel("Average Grant Amount ($)", color=secondary_color, fontweight='bold')
-    ax.set_title("Average Grant Amount Over Time", color=secondary_color, fontsize=14, fontweight='bold')
-    ax.tick_params(axis='x', rotation=45, colors=secondary_color)
-    ax.tick_params(axis='y', colors=secondary_color)
-    
-    ax.grid(True, linestyle='--', alpha=0.4, color=secondary_color)
-    
-    for spine in ax.spines.values():
-        spine.set_edgecolor(secondary_color)
-    
-    for x, y in zip(graph_data["Fiscal Year"], graph_data["Amount($)"]):
-        ax.annotate(f"${y:.0f}", (x, y), 
-                   textcoords="offset points", 
-                   xytext=(0,10), 
-                   ha='center',
-                   color=secondary_color,
-                   fontweight='bold')
-    
-    fig.tight_layout()
-    
-    return fig
-
-def fig_to_base64(fig):
-    img_buf = io.BytesIO()
-    fig.tight_layout()
-    fig.savefig(img_buf, format='png', dpi=100)
-    img_buf.seek(0)
-    img_data = base64.b64encode(img_buf.getvalue()).decode('utf-8')
-    plt.close(fig)
-    return img_data
-
-def generate_graph_data(citations_df, grants_df, graph_type='citation_vs_grants', university=None, time_frame=None):
+def generate_graph_image(final_df, graph_type='citation_vs_grants', university=None, time_frame=None, index=None,
+                         fmt='png', dpi=DPI):
     try:
-        final_df = preprocess_data(citations_df, grants_df)
-        
-        filtered_df = filter_data(final_df, university, time_frame)
-        
-        bg_color = "#F2EAD3"  
-        text_color = "#252422"  
-        
+        with metrics.stage("filter"):
+            filtered_df = filter_data(final_df, university, time_frame, index)
+        metrics.count_rows("filter", len(filtered_df))
+    except Exception as e:
+        logger.error(f"Error generating graph: {str(e)}")
+        raise GraphMessage(f"Error generating graph: {str(e)}")
+    return render_graph_image(filtered_df, graph_type, fmt, dpi)
 
+def render_graph_image(filtered_df, graph_type='citation_vs_grants', fmt='png', dpi=DPI):
+    try:
         if filtered_df.empty:
             logger.warning("No data available after filtering")
-            fig, ax = plt.subplots(facecolor=bg_color)
-            ax.set_facecolor(bg_color)
-            ax.text(0.5, 0.5, "No data available for the selected filters", 
-                    horizontalalignment='center', verticalalignment='center', 
-                    transform=ax.transAxes, fontsize=14, fontweight='bold',
-                    color=text_color)
-            return fig_to_base64(fig)
+            raise GraphMessage("No data available for the selected filters")
         
         if graph_type == 'citation_vs_grants':
-            fig = create_citation_vs_grants_graph(filtered_df)
-        elif graph_type == 'avg_citations':
-            fig = create_avg_citations_graph(filtered_df)
-        elif graph_type == 'avg_grants':
-            fig = create_avg_grants_graph(filtered_df)
+            with metrics.stage("payload"):
+                payload = scatter_payload(filtered_df["CitationCount"].to_numpy(dtype=float),
+                                          filtered_df["Amount($)"].to_numpy(dtype=float))
+            return render_pool.render_image(graph_type, payload, fmt=fmt, dpi=dpi, local=profiling.profiled())
+        elif graph_type in ('avg_citations', 'avg_grants'):
+            column = "CitationCount" if graph_type == 'avg_citations' else "Amount($)"
+            with metrics.stage("payload"):
+                graph_data = filtered_df.groupby("Fiscal Year")[column].mean().sort_index()
+            return render_pool.render_image(graph_type, [str(year) for year in graph_data.index],
+                                            graph_data.to_numpy(dtype=float), fmt=fmt, dpi=dpi,
+                                            local=profiling.profiled())
         else:
             logger.warning(f"Unknown graph type: {graph_type}")
-            fig, ax = plt.subplots(facecolor=bg_color)
-            ax.set_facecolor(bg_color)
-            ax.text(0.5, 0.5, f"Unknown graph type: {graph_type}", 
-                    horizontalalignment='center', verticalalignment='center', 
-                    transform=ax.transAxes, fontsize=14, fontweight='bold',
-                    color=text_color)
-        
-        return fig_to_base64(fig)
+            raise GraphMessage(f"Unknown graph type: {graph_type}")
     
+    except (GraphMessage, RenderBusy, RenderTimeout, RenderWorkerDied):
+        raise
     except Exception as e:
         logger.error(f"Error generating graph: {str(e)}")
-        fig, ax = plt.subplots(facecolor=bg_color)
-        ax.set_facecolor(bg_color)
-        ax.text(0.5, 0.5, f"Error generating graph: {str(e)}", 
-                horizontalalignment='center', verticalalignment='center', 
-                transform=ax.transAxes, fontsize=14, fontweight='bold',
-                color=text_color)
-        for spine in ax.spines.values():
-            spine.set_edgecolor(text_color)
-        return fig_to_base64(fig)
+        raise GraphMessage(f"Error generating graph: {str(e)}")
+
+render_pool = RenderPool()
+bootstrap_engine = BootstrapEngine()
+
+def graph_combinations():
+    return [(graph_type, university, time_frame)
+            for graph_type in GRAPH_TYPES
+            for university in ['all'] + universities
+            for time_frame in TIME_FRAMES]
+
+def not_modified(etag):
+    """Whether the client's copy is current; a profiled request always does the work."""
+    return not profiling.profiled() and request.if_none_match.contains(etag)
+
+def cached_image(key, create, fmt='png', persist=True):
+    if profiling.profiled():
+        return create()
+    return graph_cache.get_or_create(key, create, fmt, persist)
+
+def warmup_graph_image(dataset, graph_type, university, time_frame):
+    try:
+        return generate_graph_image(dataset.merged, graph_type, university, time_frame, dataset.index)
+    except GraphMessage:
+        return None
+
+dataset_manager = DatasetManager("SCHOLAR.csv", "NSERC.csv", preprocess_data)
+graph_cache = GraphCache(disk=DiskGraphCache(os.path.join(GRAPH_CACHE_DIR, f"render-v{RENDER_VERSION}")))
+graph_warmup = GraphWarmup(
+    graph_cache,
+    key=lambda dataset, combination: graph_etag(dataset.version, *combination),
+    render=warmup_graph_image,
+    combinations=graph_combinations,
+    parallelism=render_pool.workers,
+)
 
 try:
-    citations_df = pd.read_csv("SCHOLAR.csv", header=None)
-    citations_df.columns = ["Name", "University", "Fiscal Year", "CitationWindow", "CitationCount"]
+    dataset = dataset_manager.load()
     
-    grants_df = pd.read_csv("NSERC.csv")
-    
-    logger.info(f"Citations data loaded: {len(citations_df)} records")
-    logger.info(f"Grants data loaded: {len(grants_df)} records")
+    logger.info(f"Citations data loaded: {len(dataset.citations)} records")
+    logger.info(f"Grants data loaded: {len(dataset.grants)} records")
     
     university_names = [
         "University of Calgary", 
@@ -273,16 +144,38 @@ try:
     ]
     universities = sorted(university_names)
     
-    fiscal_years = citations_df['Fiscal Year'].dropna().unique().tolist()
+    fiscal_years = dataset.citations['Fiscal Year'].dropna().unique().tolist()
     fiscal_years.sort(reverse=True)
     
 except Exception as e:
     logger.error(f"Error loading data: {str(e)}")
-    citations_df = None
-    grants_df = None
     universities = []
     fiscal_years = []
 
+def warm_on_reload(dataset, full):
+    # An ingest only appends rows: its graphs render on demand rather than all of them per batch.
+    # The running warm-up is for the version the ingest replaced, so stop it.
+    if full:
+        graph_warmup.start(dataset)
+    else:
+        graph_warmup.cancel()
+
+def startup():
+    """Start the worker pools and the graph warm-up before serving.
+
+    Not run on import: the worker processes import this module too. A server
+    that imports `main:app` calls it once; otherwise renders start their pool
+    on first use and bootstrap intervals run in-process.
+    """
+    render_pool.start()
+    bootstrap_engine.start()
+    if WARMUP_ENABLED:
+        dataset_manager.on_reload(warm_on_reload)
+        try:
+            graph_warmup.start(dataset_manager.get())
+        except RuntimeError as e:
+            logger.error(f"Error starting graph warm-up: {str(e)}")
+
 @app.route('/')
 def index():
     return render_template('index.html', 
@@ -298,75 +191,313 @@ def get_graph():
         
         logger.debug(f"Graph request - Type: {graph_type}, University: {university}, Time Frame: {time_frame}")
         
-        img_data = generate_graph_data(citations_df, grants_df, graph_type, university, time_frame)
-        return jsonify({'image': img_data})
+        dataset = dataset_manager.get()
+        etag = graph_etag(dataset.version, graph_type, university, time_frame)
+        
+        if not_modified(etag):
+            response = app.response_class(status=304)
+        else:
+            try:
+                png = cached_image(
+                    etag, lambda: generate_graph_image(dataset.merged, graph_type, university, time_frame, dataset.index))
+            except GraphMessage as e:
+                # Uncached and without an ETag, so the next request renders the graph again.
+                png, etag = message_image(str(e)), None
+            with metrics.stage("encode"):
+                response = jsonify({'image': base64.b64encode(png).decode('utf-8')})
         
+        if etag is not None:
+            response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+        
+    except (RenderBusy, RenderTimeout, RenderWorkerDied) as e:
+        logger.warning(f"Graph render unavailable: {str(e)}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Error generating graph: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/graph.<extension>')
+@app.route('/graph/image')
+def get_graph_image(extension=None):
+    try:
+        graph_type = request.args.get('type', 'citation_vs_grants')
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        
+        fmt = image_format(extension, request.accept_mimetypes)
+        if fmt is None:
+            return jsonify({'error': f"Unsupported image format: {extension}"}), 404
+        dpi = image_dpi(request.args, DPI, FIGURE_SIZE[0])
+        compress = fmt == 'svg' and 'gzip' in request.accept_encodings
+        
+        dataset = dataset_manager.get()
+        # The default PNG shares its cache entry (and the warmup's render) with /graph; other
+        # formats and resolutions are only kept in memory.
+        canonical = (fmt, dpi) == ('png', DPI)
+        variant = graph_type if canonical else f"{graph_type}.{fmt}@{dpi}"
+        key = graph_etag(dataset.version, variant, university, time_frame)
+        etag = key + '-gz' if compress else key
+        
+        if not_modified(etag):
+            response = app.response_class(status=304)
+        else:
+            try:
+                image = cached_image(
+                    key, lambda: generate_graph_image(dataset.merged, graph_type, university, time_frame,
+                                                      dataset.index, fmt=fmt, dpi=dpi), fmt, persist=canonical)
+            except GraphMessage as e:
+                image, etag = message_image(str(e), fmt, dpi), None
+            if compress:
+                with metrics.stage("encode"):
+                    image = gzip.compress(image, 6)
+            response = app.response_class(image, mimetype=IMAGE_MIMETYPES[fmt])
+            if compress:
+                response.content_encoding = 'gzip'
+        
+        if etag is not None:
+            response.set_etag(etag)
+        response.cache_control.no_cache = True
+        if fmt == 'svg':
+            response.vary.add('Accept-Encoding')
+        if extension is None:
+            response.vary.add('Accept')
+        return response
+        
+    except (RenderBusy, RenderTimeout, RenderWorkerDied) as e:
+        logger.warning(f"Graph render unavailable: {str(e)}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        logger.error(f"Error generating graph image: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/graph/data')
+def get_graph_data():
+    try:
+        graph_type = request.args.get('type', 'citation_vs_grants')
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        
+        if graph_type not in GRAPH_TYPES:
+            return jsonify({'error': f"Unknown graph type: {graph_type}"}), 400
+        
+        dataset = dataset_manager.get()
+        etag = graph_etag(dataset.version, 'data:' + graph_type, university, time_frame)
+        
+        if not_modified(etag):
+            response = app.response_class(status=304)
+        else:
+            with metrics.stage("filter"):
+                filtered_df = filter_data(dataset.merged, university, time_frame, dataset.index)
+            metrics.count_rows("filter", len(filtered_df))
+            with metrics.stage("series"):
+                series = graph_series(filtered_df, graph_type)
+            with metrics.stage("encode"):
+                response = jsonify(series)
+        
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error generating graph data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/graph/cache')
+def get_graph_cache_stats():
+    return jsonify(graph_cache.stats())
+
+@app.route('/graph/render')
+def get_render_stats():
+    return jsonify(render_pool.stats())
+
+@app.route('/graph/warmup')
+def get_warmup_status():
+    return jsonify(graph_warmup.status())
+
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/data/ingest')
+def get_ingest_status():
+    return jsonify(dataset_manager.ingest_status())
+
+def summary_stats(dataset, university, time_frame):
+    grants = dataset.grants_stats.moments('Amount($)', dataset.grants_cells(university, time_frame))
+    
+    cells = dataset.merged_cells(university, time_frame)
+    citations = dataset.stats.moments('CitationCount', cells)
+    
+    return {
+        'total_citations': int(citations.total),
+        'total_grants': int(grants.total),
+        'avg_citations': round(citations.mean, 2),
+        'avg_grants': round(grants.mean, 2),
+        'researchers_count': dataset.stats.distinct(cells)
+    }
+
 @app.route('/data/summary')
 def get_data_summary():
     try:
         university = request.args.get('university', 'all')
         time_frame = request.args.get('timeframe', 'all')
         
-        filtered_grants_df = grants_df.copy()
+        dataset = dataset_manager.get()
+        
+        return jsonify(summary_stats(dataset, university, time_frame))
+    except Exception as e:
+        logger.error(f"Error calculating summary stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def correlation_stats(comoments, spearman):
+    def rounded(value):
+        return None if np.isnan(value) else round(float(value), 4)
+
+    return {
+        'n': comoments.count,
+        'pearson': rounded(comoments.pearson),
+        'spearman': rounded(spearman),
+        'slope': rounded(comoments.slope),
+        'intercept': rounded(comoments.intercept),
+    }
+
+@app.route('/data/correlation')
+def get_data_correlation():
+    try:
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
         
-        if time_frame and time_frame != 'all':
-            if time_frame == '1y':
-                most_recent = filtered_grants_df['Fiscal Year'].max()
-                filtered_grants_df = filtered_grants_df[filtered_grants_df['Fiscal Year'] == most_recent]
-            elif time_frame == '3y':
-                years = sorted(filtered_grants_df['Fiscal Year'].unique(), reverse=True)
-                if len(years) > 3:
-                    years = years[:3]
-                filtered_grants_df = filtered_grants_df[filtered_grants_df['Fiscal Year'].isin(years)]
-            elif time_frame == '6y':
-                years = sorted(filtered_grants_df['Fiscal Year'].unique(), reverse=True)
-                if len(years) > 6:
-                    years = years[:6]
-                filtered_grants_df = filtered_grants_df[filtered_grants_df['Fiscal Year'].isin(years)]
-            elif time_frame == '10y':
-                years = sorted(filtered_grants_df['Fiscal Year'].unique(), reverse=True)
-                if len(years) > 10:
-                    years = years[:10]
-                filtered_grants_df = filtered_grants_df[filtered_grants_df['Fiscal Year'].isin(years)]
+        dataset = dataset_manager.get()
         
-        if university and university != 'all':
-            grants_with_flipped = grants_df.copy()
-            grants_with_flipped["Flipped Name"] = grants_with_flipped["Name"].apply(flip_name)
-            grants_with_flipped["Name_Lower"] = grants_with_flipped["Flipped Name"].str.lower().str.strip()
+        stats = correlation_stats(*dataset.merged_correlation(university, time_frame))
+        
+        names = [name for name in universities if university == 'all' or university.lower() in name.lower()]
+        stats['by_university'] = [
+            dict(university=name, **correlation_stats(*dataset.merged_correlation(name, time_frame)))
+            for name in names
+        ]
+        
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error calculating correlation: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/data/correlation/ci')
+def get_correlation_intervals():
+    try:
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        
+        dataset = dataset_manager.get()
+        
+        names = [name for name in universities if university == 'all' or university.lower() in name.lower()]
+        if university == 'all':
+            names = ['all'] + names
+        
+        with metrics.stage("bootstrap"):
+            intervals = bootstrap_engine.intervals(dataset, names, time_frame)
+        
+        return jsonify({
+            'timeframe': time_frame,
+            'resamples': bootstrap_engine.resamples,
+            'confidence': bootstrap_engine.confidence,
+            'intervals': intervals,
+        })
+    except Exception as e:
+        logger.error(f"Error bootstrapping correlation intervals: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Runs the bootstrap and image renders of a /dashboard request next to its own work.
+dashboard_executor = ThreadPoolExecutor(max_workers=len(GRAPH_TYPES) + 1)
+
+def submit_in_context(fn, *args):
+    # Copy the request's context so the metrics stages land in its Server-Timing.
+    return dashboard_executor.submit(contextvars.copy_context().run, fn, *args)
+
+def timed_intervals(dataset, university, time_frame, filtered_df):
+    with metrics.stage("bootstrap"):
+        return bootstrap_engine.intervals(dataset, [university], time_frame, {university: filtered_df})
+
+def cached_graph_image(dataset, filtered_df, graph_type, university, time_frame):
+    etag = graph_etag(dataset.version, graph_type, university, time_frame)
+    try:
+        cached_image(etag, lambda: render_graph_image(filtered_df, graph_type))
+    except GraphMessage:
+        # Nothing to cache; /graph.png renders the message itself.
+        pass
+
+@app.route('/dashboard')
+def get_dashboard():
+    """Summary, graph series and correlation of one filter, from one filtered frame.
+
+    `graphs` (comma-separated, default all) picks the graph types. With
+    `images=1` the default PNGs are also rendered into the graph cache, in
+    parallel, and their URLs returned, for clients that cannot draw the series.
+    """
+    try:
+        university = request.args.get('university', 'all')
+        time_frame = request.args.get('timeframe', 'all')
+        graph_types = [name for name in request.args.get('graphs', ','.join(GRAPH_TYPES)).split(',') if name]
+        images = request.args.get('images') == '1'
+        
+        unknown = [name for name in graph_types if name not in GRAPH_TYPES]
+        if unknown:
+            return jsonify({'error': f"Unknown graph type: {', '.join(unknown)}"}), 400
+        
+        dataset = dataset_manager.get()
+        variant = 'dashboard:' + ','.join(graph_types) + (':images' if images else '')
+        etag = graph_etag(dataset.version, variant, university, time_frame)
+        
+        if not_modified(etag):
+            response = app.response_class(status=304)
+        else:
+            with metrics.stage("filter"):
+                filtered_df = filter_data(dataset.merged, university, time_frame, dataset.index)
+            metrics.count_rows("filter", len(filtered_df))
             
-            citations_with_uni = citations_df.copy()
-            citations_with_uni["Name_Lower"] = citations_with_uni["Name"].str.lower().str.strip()
+            # The bootstrap and the renders share this one filtered frame.
+            intervals = submit_in_context(timed_intervals, dataset, university, time_frame, filtered_df)
             
-            uni_citations = citations_with_uni[citations_with_uni['University'].str.contains(university, case=False, na=False)]
+            renders = [submit_in_context(cached_graph_image, dataset, filtered_df, graph_type, university, time_frame)
+                       for graph_type in graph_types] if images else []
             
-            uni_researchers = set(uni_citations["Name_Lower"].unique())
+            with metrics.stage("series"):
+                graphs = {graph_type: graph_series(filtered_df, graph_type) for graph_type in graph_types}
+            with metrics.stage("summary"):
+                summary = summary_stats(dataset, university, time_frame)
             
-            filtered_grants_df = filtered_grants_df[
-                filtered_grants_df["Name"].apply(lambda x: flip_name(x).lower().strip() in uni_researchers)
-            ]
-        
-        total_grants_value = int(filtered_grants_df['Amount($)'].sum())
-        avg_grants_value = round(filtered_grants_df['Amount($)'].mean(), 2)
-        
-        final_df = preprocess_data(citations_df, grants_df)
-        filtered_df = filter_data(final_df, university, time_frame)
+            payload = {
+                'university': university,
+                'timeframe': time_frame,
+                'summary': summary,
+                'graphs': graphs,
+                'correlation': dict(intervals.result()[0], confidence=bootstrap_engine.confidence),
+            }
+            if images:
+                for future in renders:
+                    future.result()
+                payload['images'] = {
+                    graph_type: '/graph.png?' + urlencode({'type': graph_type, 'university': university,
+                                                           'timeframe': time_frame})
+                    for graph_type in graph_types
+                }
+            
+            with metrics.stage("encode"):
+                response = jsonify(payload)
         
-        stats = {
-            'total_citations': int(filtered_df['CitationCount'].sum()),
-            'total_grants': total_grants_value,
-            'avg_citations': round(filtered_df['CitationCount'].mean(), 2),
-            'avg_grants': avg_grants_value,
-            'researchers_count': filtered_df['Name'].nunique()
-        }
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
         
-        return jsonify(stats)
+    except (RenderBusy, RenderTimeout, RenderWorkerDied) as e:
+        logger.warning(f"Graph render unavailable: {str(e)}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        logger.error(f"Error calculating summary stats: {str(e)}")
+        logger.error(f"Error building dashboard: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    startup()
     app.run(host='0.0.0.0', port=5003, debug=True)
\ No newline at end of file
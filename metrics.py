@@ -0,0 +1,196 @@
+"""Per-stage request timings, exported in Prometheus text format and as Server-Timing.
+
+Code times a stage with `with stage("filter"):` (or `record("draw", seconds)`
+for time measured elsewhere, such as in a render worker) and counts rows
+with `count_rows("filter", len(df))`. Inside a request instrumented by
+`instrument(app)` the observation is labelled with the request's URL rule and
+graph type, and also summed into the response's Server-Timing header, so
+browser devtools show the breakdown. Outside a request (warmup renders) the
+endpoint label is "background".
+
+A stage's Server-Timing duration is the sum over every time it ran in the
+request, including on threads the request handed work to (as /dashboard
+does for its renders and bootstrap). Stages that overlapped in time add up
+their seconds, so they measure work done and together can exceed "total".
+
+`render()` is the /metrics page: histograms of stage and request seconds,
+and counters of rows processed and response bytes. An observation is a
+perf_counter call, a bisect and a locked increment. CITCO_METRICS=0 skips
+the request hooks.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.environ.get("CITCO_METRICS", "1") != "0"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BACKGROUND = ("background", "")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def lines(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+STAGE_SECONDS = Histogram("citco_stage_seconds", "Seconds spent in each stage of a request.",
+                          ["endpoint", "graph_type", "stage"])
+REQUEST_SECONDS = Histogram("citco_request_seconds", "Seconds from the start of a request to its response.",
+                            ["endpoint", "graph_type", "status"])
+ROWS_PROCESSED = Counter("citco_rows_processed_total", "Rows produced by each stage.",
+                         ["endpoint", "graph_type", "stage"])
+RESPONSE_BYTES = Counter("citco_response_bytes_total", "Response body bytes sent.",
+                         ["endpoint", "graph_type"])
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, ROWS_PROCESSED, RESPONSE_BYTES]
+
+
+class RequestTimings:
+    def __init__(self, endpoint, graph_type):
+        self.labels = (endpoint, graph_type)
+        self.started = time.perf_counter()
+        # stage -> seconds, in first-seen order
+        self.stages = {}
+        # Threads a request hands work to (with its context copied) record into the same stages.
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def durations(self):
+        with self._lock:
+            return list(self.stages.items())
+
+
+_current = ContextVar("citco_request_timings", default=None)
+
+
+def record(name, seconds):
+    """Add `seconds` to stage `name` of the current request (or the background series)."""
+    timings = _current.get()
+    labels = timings.labels if timings is not None else BACKGROUND
+    STAGE_SECONDS.observe(labels + (name,), seconds)
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def count_rows(name, rows):
+    timings = _current.get()
+    ROWS_PROCESSED.inc((timings.labels if timings is not None else BACKGROUND) + (name,), rows)
+
+
+def server_timing(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.durations()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def instrument(app, graph_types=()):
+    """Time every request of a Flask app; `graph_types` are the accepted values of the graph_type label."""
+    if not METRICS_ENABLED:
+        return
+    from flask import request
+
+    graph_types = set(graph_types)
+
+    @app.before_request
+    def start_timings():
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        graph_type = request.args.get('type', '')
+        _current.set(RequestTimings(endpoint, graph_type if graph_type in graph_types else ''))
+
+    @app.after_request
+    def finish_timings(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        _current.set(None)
+        total = time.perf_counter() - timings.started
+        REQUEST_SECONDS.observe(timings.labels + (str(response.status_code),), total)
+        if response.content_length:
+            RESPONSE_BYTES.inc(timings.labels, response.content_length)
+        response.headers["Server-Timing"] = server_timing(timings, total)
+        return response
+
+
+def render():
+    return "\n".join(line for metric in METRICS for line in metric.lines()) + "\n"
@@ -0,0 +1,51 @@
+import pandas as pd
+
+NAME_KEY = "Name Key"
+# Bump when the name keys change, so snapshots keyed on older ones are not reused.
+NORMALIZE_VERSION = 1
+
+
+def flip_name(name):
+    if "," in name:
+        parts = name.split(",")
+        return parts[1].strip() + " " + parts[0].strip()
+    return name.strip()
+
+
+def name_keys(names, flip=True):
+    """Canonical lowercase "first last" key for a Series of names.
+
+    Vectorized equivalent of `flip_name(name).lower().strip()` (or just
+    `name.lower().strip()` when `flip` is False, as for Scholar names).
+    """
+    names = names.astype(str)
+    if flip:
+        # flip_name only looks at the text before the first comma and between the first two.
+        parts = names.str.extract(r"^([^,]*),([^,]*)")
+        flipped = parts[1].str.strip() + " " + parts[0].str.strip()
+        names = flipped.where(parts[0].notna(), names)
+    return names.str.lower().str.strip()
+
+
+def name_key_column(df, flip=True):
+    if NAME_KEY in df.columns:
+        return df[NAME_KEY]
+    return name_keys(df["Name"], flip)
+
+
+def with_name_keys(df, flip=True):
+    return df.assign(**{NAME_KEY: name_keys(df["Name"], flip)})
+
+
+def researcher_universities(citations_df):
+    """Distinct (name key, university) pairs from the Scholar records."""
+    researchers = pd.DataFrame({
+        NAME_KEY: name_key_column(citations_df, flip=False),
+        "University": citations_df["University"],
+    })
+    return researchers.dropna(subset=["University"]).drop_duplicates().reset_index(drop=True)
+
+
+def university_researchers(researchers, university):
+    matches = researchers["University"].str.contains(university, case=False, na=False, regex=True)
+    return researchers.loc[matches, NAME_KEY].unique()
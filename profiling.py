@@ -0,0 +1,256 @@
+"""Opt-in profiles of single requests, written to disk.
+
+Off unless CITCO_PROFILE_TOKEN is set; then `install(app)` adds the hooks
+and a request carrying the token, as `?profile=<token>` or an
+`X-Profile-Token: <token>` header, runs under a profiler:
+
+- `sample` (default): a thread samples the request thread's stack every
+  CITCO_PROFILE_INTERVAL seconds and writes folded stacks (`.folded`, one
+  "frame;frame;frame count" line per stack), which flamegraph.pl and
+  speedscope read directly.
+- `cprofile` (`&profiler=cprofile`): cProfile's deterministic call counts
+  and times, written as pstats (`.prof`) for snakeviz or `python -m pstats`.
+
+Files go to CITCO_PROFILE_DIR (default `profiles/`), named by time, endpoint
+and a hash of the query, next to a `.json` file with the request details.
+The newest MAX_PROFILES are kept. `/admin/profiles?profile=<token>` lists
+them, and answers 403 without the token. One request is profiled at a time; the response's X-Profile header
+names the file, or says the profiler was busy. A profiled request is never
+answered with a 304 or from the graph caches, and its graphs are drawn
+in-process rather than in a render worker, so the profile covers the
+filtering and drawing it would otherwise skip or hand off (see `profiled`).
+"""
+import cProfile
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.environ.get("CITCO_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("CITCO_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("CITCO_PROFILE_INTERVAL", "0.001"))
+MAX_PROFILES = 50
+PROFILERS = ('sample', 'cprofile')
+
+_profiled = ContextVar("citco_profiled_request", default=False)
+
+
+def profiled():
+    """Whether the current request runs under a profiler.
+
+    Handlers skip 304s and the graph caches for such a request and render
+    in-process, so the profile shows the work rather than a cache lookup.
+    """
+    return _profiled.get()
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@lru_cache(maxsize=4096)
+def short_path(filename):
+    """File path relative to the longest sys.path entry containing it, without ';' or spaces."""
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best):].lstrip(os.sep).replace(";", "_").replace(" ", "_")
+
+
+class RequestProfiler:
+    def __init__(self, directory=PROFILE_DIR, token=PROFILE_TOKEN, interval=PROFILE_INTERVAL):
+        self.directory = directory
+        self.token = token
+        self.interval = interval
+        self._busy = threading.Lock()
+        self._local = threading.local()
+
+    def authorized(self, request):
+        supplied = request.args.get('profile') or request.headers.get('X-Profile-Token') or ""
+        return bool(self.token) and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def start(self, request):
+        if not self._busy.acquire(blocking=False):
+            self._local.active = 'busy'
+            return
+        mode = request.args.get('profiler', 'sample')
+        if mode not in PROFILERS:
+            mode = 'sample'
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        self._local.active = (mode, profiler, time.perf_counter())
+        _profiled.set(True)
+
+    def finish(self, request, response):
+        active = getattr(self._local, 'active', None)
+        self._local.active = None
+        _profiled.set(False)
+        if active is None:
+            return response
+        if active == 'busy':
+            response.headers["X-Profile"] = "busy"
+            return response
+        mode, profiler, started = active
+        try:
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+            seconds = time.perf_counter() - started
+            response.headers["X-Profile"] = self._save(request, response, mode, profiler, seconds)
+        except Exception as e:
+            logger.error(f"Error saving request profile: {str(e)}")
+        finally:
+            self._busy.release()
+        return response
+
+    def abandon(self):
+        """Stop a profile whose response never reached `finish` (the request failed outright)."""
+        active = getattr(self._local, 'active', None)
+        self._local.active = None
+        _profiled.set(False)
+        if active is None or active == 'busy':
+            return
+        mode, profiler, _ = active
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        self._busy.release()
+
+    def _save(self, request, response, mode, profiler, seconds):
+        os.makedirs(self.directory, exist_ok=True)
+        params = sorted((key, value) for key, value in request.args.items(multi=True)
+                        if key not in ('profile', 'profiler'))
+        digest = hashlib.sha1(json.dumps([request.path, params]).encode()).hexdigest()[:10]
+        endpoint = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "index"
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"{int(now % 1 * 1000):03d}"
+        name = f"{stamp}-{endpoint}-{digest}"
+        filename = name + (".prof" if mode == 'cprofile' else ".folded")
+        if mode == 'cprofile':
+            profiler.dump_stats(os.path.join(self.directory, filename))
+        else:
+            profiler.write(os.path.join(self.directory, filename))
+        details = {
+            'file': filename,
+            'profiler': mode,
+            'path': request.path,
+            'params': dict(params),
+            'status': response.status_code,
+            'seconds': round(seconds, 4),
+            'created': time.time(),
+        }
+        if mode == 'sample':
+            details['samples'] = sum(profiler.stacks.values())
+        with open(os.path.join(self.directory, name + ".json"), "w") as f:
+            json.dump(details, f)
+        self._prune()
+        logger.info(f"Profiled {request.full_path} in {seconds:.3f}s to {filename}")
+        return filename
+
+    def _prune(self):
+        profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith(".json"))
+        for entry in profiles[:-MAX_PROFILES]:
+            name = entry[:-len(".json")]
+            for suffix in (".json", ".prof", ".folded"):
+                if os.path.exists(os.path.join(self.directory, name + suffix)):
+                    os.remove(os.path.join(self.directory, name + suffix))
+
+    def profiles(self):
+        """Details of the saved profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for entry in sorted(os.listdir(self.directory), reverse=True):
+            if entry.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, entry)) as f:
+                        found.append(json.load(f))
+                except Exception as e:
+                    logger.error(f"Error reading profile details {entry}: {str(e)}")
+        return found
+
+
+def install(app):
+    """Add the profiling hooks and /admin/profiles to a Flask app, if CITCO_PROFILE_TOKEN is set."""
+    if not PROFILE_TOKEN:
+        return None
+    from flask import abort, jsonify, request, send_from_directory
+
+    profiler = RequestProfiler(PROFILE_DIR, PROFILE_TOKEN)
+
+    @app.before_request
+    def start_profile():
+        if ('profile' in request.args or 'X-Profile-Token' in request.headers) and profiler.authorized(request):
+            if request.path.startswith('/admin/profiles'):
+                return
+            profiler.start(request)
+
+    @app.after_request
+    def finish_profile(response):
+        return profiler.finish(request, response)
+
+    @app.teardown_request
+    def abandon_profile(error):
+        profiler.abandon()
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        if not profiler.authorized(request):
+            abort(403)
+        return jsonify({'directory': profiler.directory, 'profiles': profiler.profiles()})
+
+    @app.route('/admin/profiles/<name>')
+    def get_profile(name):
+        if not profiler.authorized(request):
+            abort(403)
+        return send_from_directory(os.path.abspath(profiler.directory), name, as_attachment=True)
+
+    logger.info(f"Request profiling enabled, writing to {PROFILE_DIR}")
+    return profiler
@@ -0,0 +1,536 @@
+"""Logical query plans over the citations and grants frames.
+
+A request is a small plan of nodes (Scan, Filter, Join, Project, Aggregate),
+built with `merged_query` or the node methods, and `execute` runs it after
+`optimize` has rewritten it:
+
+- Row predicates (university match, non-null and minimum checks) move below
+  a join onto the scan of the side whose columns they read, or both sides
+  for a join key, so they run before the join rather than on its output.
+- "Most recent N fiscal years" cannot be evaluated before the join, since it
+  depends on which years survive it. Directly above a join of two scans on
+  the fiscal year, the scans are limited to the N latest years both have,
+  and the join falls back to all years if one of those turns out to have no
+  matches. The filter itself still runs on the join's output.
+- Each scan reads only the columns something above it uses, so unused source
+  columns such as Project Title and Program are never copied.
+- A university and time-frame filter directly on a scan that has a
+  FilterIndex is answered from the index's per-value row ids.
+
+Time frames are "all" or "<N>y" for the N most recent fiscal years; anything
+else keeps every year.
+"""
+import numpy as np
+import pandas as pd
+
+from filter_index import time_frame_years
+from normalize import NAME_KEY, name_key_column
+
+# The time frames the dashboard offers, and the ones pre-rendered and benchmarked.
+TIME_FRAMES = ['all', '1y', '3y', '6y', '10y']
+JOIN_KEYS = ["Name", "Fiscal Year"]
+MERGED_COLUMNS = ["Name", "University", "Fiscal Year", "CitationCount", "Amount($)"]
+# Bump when merged_query changes the rows it produces, so merged snapshots from older code are not reused.
+MERGE_VERSION = 1
+_LEFT_ROW = "__left_row"
+_RIGHT_ROW = "__right_row"
+
+
+class UniversityMatches:
+    """Rows whose university contains `pattern` (a regex), ignoring case."""
+
+    def __init__(self, pattern, column="University"):
+        self.pattern = pattern
+        self.column = column
+        self.columns = (column,)
+
+    def mask(self, df):
+        return df[self.column].str.contains(self.pattern, case=False, na=False).to_numpy(dtype=bool)
+
+    def __repr__(self):
+        return f"{self.column} ~ {self.pattern!r}"
+
+
+class NotNull:
+    def __init__(self, column):
+        self.column = column
+        self.columns = (column,)
+
+    def mask(self, df):
+        return df[self.column].notna().to_numpy(dtype=bool)
+
+    def __repr__(self):
+        return f"{self.column} is not null"
+
+
+class AtLeast:
+    def __init__(self, column, value):
+        self.column = column
+        self.value = value
+        self.columns = (column,)
+
+    def mask(self, df):
+        return (df[self.column] >= self.value).to_numpy(dtype=bool)
+
+    def __repr__(self):
+        return f"{self.column} >= {self.value!r}"
+
+
+class IsIn:
+    def __init__(self, column, values):
+        self.column = column
+        self.values = list(values)
+        self.columns = (column,)
+
+    def mask(self, df):
+        return df[self.column].isin(self.values).to_numpy(dtype=bool)
+
+    def __repr__(self):
+        return f"{self.column} in {self.values!r}"
+
+
+class RecentYears:
+    """Rows in the `n` most recent fiscal years present in the input.
+
+    Not a row predicate: which rows it keeps depends on the other rows, so
+    nothing is pushed below it and it is never moved.
+    """
+
+    def __init__(self, n, column="Fiscal Year"):
+        self.n = n
+        self.column = column
+        self.columns = (column,)
+
+    def years(self, values):
+        return sorted(pd.unique(values), reverse=True)[:self.n]
+
+    def apply(self, df):
+        return df[df[self.column].isin(self.years(df[self.column]))]
+
+    def __repr__(self):
+        return f"{self.column} in latest {self.n}"
+
+
+def _apply(df, predicates):
+    if not predicates:
+        return df
+    mask = predicates[0].mask(df)
+    for predicate in predicates[1:]:
+        mask = mask & predicate.mask(df)
+    return df[mask]
+
+
+class Plan:
+    def filter(self, *predicates):
+        plan = self
+        for predicate in predicates:
+            plan = Filter(plan, predicate)
+        return plan
+
+    def where(self, university=None, time_frame=None):
+        """The dashboard's university and time-frame filter."""
+        plan = self
+        if university and university != 'all':
+            plan = plan.filter(UniversityMatches(university))
+        n_years = time_frame_years(time_frame)
+        if n_years is not None:
+            plan = plan.filter(RecentYears(n_years))
+        return plan
+
+    def join(self, other, on):
+        return Join(self, other, on)
+
+    def project(self, columns):
+        return Project(self, columns)
+
+    def aggregate(self, by, column, func):
+        return Aggregate(self, by, column, func)
+
+
+class Scan(Plan):
+    """A source frame.
+
+    `derived` maps a column to (source columns, function of the frame) for
+    columns computed at scan time, such as normalized names; they replace a
+    source column of the same name. The optimizer fills in `predicates`,
+    `needed` and `index_query`.
+    """
+
+    def __init__(self, name, frame, derived=None, index=None):
+        self.name = name
+        self.frame = frame
+        self.derived = derived or {}
+        self.index = index
+        self.predicates = []
+        self.needed = None
+        self.index_query = None
+
+    def columns(self):
+        return list(self.frame.columns) + [column for column in self.derived if column not in self.frame.columns]
+
+    def copy(self):
+        scan = Scan(self.name, self.frame, self.derived, self.index)
+        scan.predicates = list(self.predicates)
+        scan.needed = self.needed
+        scan.index_query = self.index_query
+        return scan
+
+    def execute(self, extra=()):
+        """The scanned rows; `extra` predicates are applied with the scan's own."""
+        predicates = self.predicates + list(extra)
+        wanted = self.columns() if self.needed is None else list(self.needed)
+        for predicate in predicates:
+            wanted += [column for column in predicate.columns if column not in wanted]
+
+        source = []
+        for column in wanted:
+            inputs = self.derived[column][0] if column in self.derived else [column]
+            source += [name for name in inputs if name in self.frame.columns and name not in source]
+
+        df = self.frame
+        if self.index_query is not None:
+            df = df.iloc[self.index.rows(*self.index_query)]
+        if len(source) < len(df.columns):
+            df = df[source]
+
+        # Filter on source columns first, so derived columns are only computed for the rows left.
+        raw = [predicate for predicate in predicates
+               if not any(column in self.derived for column in predicate.columns)]
+        late = [predicate for predicate in predicates if predicate not in raw]
+        df = _apply(df, raw)
+        derived = [column for column in wanted if column in self.derived]
+        first = [column for column in derived if any(column in predicate.columns for predicate in late)]
+        df = self._derive(df, first)
+        df = _apply(df, late)
+        df = self._derive(df, [column for column in derived if column not in first])
+
+        if self.needed is not None and list(df.columns) != list(self.needed):
+            df = df[list(self.needed)]
+        return df
+
+    def distinct(self, column):
+        """Values of `column` in the scanned rows, computing no other derived column."""
+        scan = self.copy()
+        scan.needed = [column]
+        return pd.unique(scan.execute()[column])
+
+    def _derive(self, df, columns):
+        if not columns:
+            return df
+        return df.assign(**{column: self.derived[column][1](df) for column in columns})
+
+    def describe(self):
+        parts = [f"Scan {self.name}"]
+        if self.index_query is not None:
+            parts.append(f"index={self.index_query}")
+        if self.needed is not None:
+            parts.append(f"columns={list(self.needed)}")
+        if self.predicates:
+            parts.append(f"where {' and '.join(map(repr, self.predicates))}")
+        return " ".join(parts)
+
+
+class Filter(Plan):
+    def __init__(self, child, predicate):
+        self.child = child
+        self.predicate = predicate
+
+    def columns(self):
+        return self.child.columns()
+
+    def execute(self):
+        df = self.child.execute()
+        if isinstance(self.predicate, RecentYears):
+            return self.predicate.apply(df)
+        return df[self.predicate.mask(df)]
+
+    def describe(self):
+        return f"Filter {self.predicate!r}"
+
+
+class Join(Plan):
+    """Inner join on `on`; a non-key column both sides have gets the side's suffix."""
+
+    def __init__(self, left, right, on, suffixes=("_x", "_y")):
+        self.left = left
+        self.right = right
+        self.on = list(on)
+        self.suffixes = suffixes
+        # A RecentYears on a join key also applied to the inputs (see the module docstring).
+        self.recent = None
+
+    def sides(self):
+        """Output column -> (side, that side's column); keys come from both sides."""
+        left, right = self.left.columns(), self.right.columns()
+        shared = (set(left) & set(right)) - set(self.on)
+        sides = {}
+        for column in left:
+            if column in self.on:
+                sides[column] = ('both', column)
+            else:
+                sides[column + self.suffixes[0] if column in shared else column] = ('left', column)
+        for column in right:
+            if column not in self.on:
+                sides[column + self.suffixes[1] if column in shared else column] = ('right', column)
+        return sides
+
+    def columns(self):
+        return list(self.sides())
+
+    def execute(self):
+        renames = {'left': {}, 'right': {}}
+        for output, (side, column) in self.sides().items():
+            if side != 'both' and output != column:
+                renames[side][column] = output
+
+        if self.recent is not None:
+            column = self.recent.column
+            # The candidate years come from the key column alone, so the
+            # other derived columns are only computed for the chosen years.
+            candidates = sorted(set(self.left.distinct(column)) & set(self.right.distinct(column)), reverse=True)
+            if len(candidates) > self.recent.n:
+                years = IsIn(column, candidates[:self.recent.n])
+                joined = self.merge(self.left.execute([years]).rename(columns=renames['left']),
+                                    self.right.execute([years]).rename(columns=renames['right']))
+                if joined[column].nunique() == len(years.values):
+                    return joined
+        return self.merge(self.left.execute().rename(columns=renames['left']),
+                          self.right.execute().rename(columns=renames['right']))
+
+    def merge(self, left, right):
+        """pd.merge in left row order, then right row order.
+
+        pandas returns that order, except that its hash join (taken when the
+        right keys are unique, which filtering can make them) does not, and
+        the output must not depend on which filters ran before the join.
+        """
+        left = left.assign(**{_LEFT_ROW: np.arange(len(left))})
+        right = right.assign(**{_RIGHT_ROW: np.arange(len(right))})
+        joined = pd.merge(left, right, on=self.on)
+        left_rows = joined[_LEFT_ROW].to_numpy()
+        right_rows = joined[_RIGHT_ROW].to_numpy()
+        ordered = (left_rows[1:] > left_rows[:-1]) | ((left_rows[1:] == left_rows[:-1])
+                                                      & (right_rows[1:] > right_rows[:-1]))
+        if not ordered.all():
+            joined = joined.iloc[np.lexsort((right_rows, left_rows))].reset_index(drop=True)
+        return joined.drop(columns=[_LEFT_ROW, _RIGHT_ROW])
+
+    def describe(self):
+        recent = f" (inputs limited to {self.recent!r})" if self.recent is not None else ""
+        return f"Join on {self.on}{recent}"
+
+
+class Project(Plan):
+    def __init__(self, child, columns):
+        self.child = child
+        self.columns_ = list(columns)
+
+    def columns(self):
+        return list(self.columns_)
+
+    def execute(self):
+        df = self.child.execute()
+        return df if list(df.columns) == self.columns_ else df[self.columns_]
+
+    def describe(self):
+        return f"Project {self.columns_}"
+
+
+class Aggregate(Plan):
+    """`func` (a pandas reduction name) of `column` per value of `by`, sorted by `by`."""
+
+    def __init__(self, child, by, column, func):
+        self.child = child
+        self.by = by
+        self.column = column
+        self.func = func
+
+    def columns(self):
+        return [self.by, self.column]
+
+    def execute(self):
+        return self.child.execute().groupby(self.by)[self.column].agg(self.func).reset_index()
+
+    def describe(self):
+        return f"Aggregate {self.func}({self.column}) by {self.by}"
+
+
+def children(plan):
+    if isinstance(plan, Join):
+        return [plan.left, plan.right]
+    if isinstance(plan, Scan):
+        return []
+    return [plan.child]
+
+
+def _wrap(plan, predicates):
+    for predicate in predicates:
+        plan = Filter(plan, predicate)
+    return plan
+
+
+def push_predicates(plan, pending=()):
+    """Copy of `plan` with row predicates moved as far down as they can go."""
+    pending = list(pending)
+    if isinstance(plan, Scan):
+        scan = plan.copy()
+        scan.predicates += pending
+        return scan
+    if isinstance(plan, Filter):
+        if not isinstance(plan.predicate, RecentYears):
+            return push_predicates(plan.child, pending + [plan.predicate])
+        child = push_predicates(plan.child)
+        join = child.child if isinstance(child, Project) else child
+        if (isinstance(join, Join) and plan.predicate.column in join.on
+                and isinstance(join.left, Scan) and isinstance(join.right, Scan)):
+            join.recent = plan.predicate
+        return _wrap(Filter(child, plan.predicate), pending)
+    if isinstance(plan, Project):
+        return Project(push_predicates(plan.child, pending), plan.columns_)
+    if isinstance(plan, Join):
+        sides = plan.sides()
+        left, right, remaining = [], [], []
+        for predicate in pending:
+            found = {sides[column][0] for column in predicate.columns}
+            # Predicates on suffixed columns stay above; a scan sees the unsuffixed names.
+            renamed = any(sides[column][1] != column for column in predicate.columns)
+            if renamed or len(found - {'both'}) > 1:
+                remaining.append(predicate)
+                continue
+            if found <= {'left', 'both'}:
+                left.append(predicate)
+            if found <= {'right', 'both'}:
+                right.append(predicate)
+        join = Join(push_predicates(plan.left, left), push_predicates(plan.right, right), plan.on, plan.suffixes)
+        return _wrap(join, remaining)
+    return _wrap(Aggregate(push_predicates(plan.child), plan.by, plan.column, plan.func), pending)
+
+
+def _indexed_university(scan):
+    """(True, pattern or None) if the index can stand in for all of the scan's predicates."""
+    if scan.index is None or scan.index_query is not None or len(scan.predicates) > 1:
+        return False, None
+    if not scan.predicates:
+        return True, None
+    predicate = scan.predicates[0]
+    if isinstance(predicate, UniversityMatches) and predicate.column == scan.index.university_column:
+        return True, predicate.pattern
+    return False, None
+
+
+def use_indexes(plan):
+    """Answer university/time-frame filters on indexed scans from the index."""
+    if isinstance(plan, Scan):
+        usable, university = _indexed_university(plan)
+        if usable and university is not None:
+            scan = plan.copy()
+            scan.index_query = (university, None)
+            scan.predicates = []
+            return scan
+        return plan
+    if isinstance(plan, Filter):
+        child = plan.child
+        if isinstance(plan.predicate, RecentYears) and isinstance(child, Scan):
+            usable, university = _indexed_university(child)
+            if usable and plan.predicate.column == child.index.year_column:
+                scan = child.copy()
+                scan.index_query = (university, f"{plan.predicate.n}y")
+                scan.predicates = []
+                return scan
+        plan.child = use_indexes(child)
+        return plan
+    if isinstance(plan, Join):
+        plan.left = use_indexes(plan.left)
+        plan.right = use_indexes(plan.right)
+        return plan
+    plan.child = use_indexes(plan.child)
+    return plan
+
+
+def prune_columns(plan, required=None):
+    """Record on each scan the columns the plan above it reads (None: all of them)."""
+    if isinstance(plan, Scan):
+        if required is not None:
+            plan.needed = [column for column in plan.columns() if column in required]
+        return
+    if isinstance(plan, Filter):
+        if required is not None:
+            required = set(required) | set(plan.predicate.columns)
+        prune_columns(plan.child, required)
+    elif isinstance(plan, Project):
+        if required is not None:
+            plan.columns_ = [column for column in plan.columns_ if column in required]
+        prune_columns(plan.child, set(plan.columns_))
+    elif isinstance(plan, Aggregate):
+        prune_columns(plan.child, {plan.by, plan.column})
+    else:
+        sides = plan.sides()
+        left = right = None
+        if required is not None:
+            left, right = set(plan.on), set(plan.on)
+            for column in required:
+                side, name = sides[column]
+                if side == 'left':
+                    left.add(name)
+                elif side == 'right':
+                    right.add(name)
+        prune_columns(plan.left, left)
+        prune_columns(plan.right, right)
+
+
+def optimize(plan):
+    plan = use_indexes(push_predicates(plan))
+    prune_columns(plan)
+    return plan
+
+
+def execute(plan):
+    return optimize(plan).execute()
+
+
+def explain(plan, depth=0):
+    """The plan as an indented tree, one node per line."""
+    lines = ["  " * depth + plan.describe()]
+    for child in children(plan):
+        lines.append(explain(child, depth + 1))
+    return "\n".join(lines)
+
+
+def fiscal_years(df):
+    return df["Fiscal Year"].astype(str).str.strip()
+
+
+def numeric(column):
+    return lambda df: pd.to_numeric(df[column], errors="coerce")
+
+
+def citations_scan(citations_df):
+    """Scholar rows with the name key as Name, stripped fiscal years and numeric citation counts."""
+    return Scan("citations", citations_df, derived={
+        "Name": (["Name", NAME_KEY], lambda df: name_key_column(df, flip=False)),
+        "Fiscal Year": (["Fiscal Year"], fiscal_years),
+        "CitationCount": (["CitationCount"], numeric("CitationCount")),
+    })
+
+
+def grants_scan(grants_df):
+    """NSERC rows with the flipped name key as Name, stripped fiscal years and numeric amounts."""
+    return Scan("grants", grants_df, derived={
+        "Name": (["Name", NAME_KEY], name_key_column),
+        "Fiscal Year": (["Fiscal Year"], fiscal_years),
+        "Amount($)": (["Amount($)"], numeric("Amount($)")),
+    })
+
+
+def merged_query(citations_df, grants_df, university=None, time_frame=None):
+    """Researcher-years with both a citation count and a grant, optionally filtered."""
+    plan = (citations_scan(citations_df)
+            .join(grants_scan(grants_df), on=JOIN_KEYS)
+            .project(MERGED_COLUMNS)
+            .filter(NotNull("CitationCount"), NotNull("Amount($)"), AtLeast("CitationCount", 0)))
+    return plan.where(university, time_frame)
+
+
+def filtered_query(df, university=None, time_frame=None, index=None):
+    """The rows of an already merged frame that match the filter, via `index` if given."""
+    return Scan("merged", df, index=index).where(university, time_frame)
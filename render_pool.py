@@ -0,0 +1,333 @@
+"""Matplotlib rendering off the request thread, in a pool of worker processes.
+
+Each worker starts with one pre-styled Figure/Axes template per graph type
+(built by render_worker) and renders by swapping the data artists only, using matplotlib's
+object API rather than pyplot's global state. The Flask side submits small
+payloads (arrays of points or yearly means), waits with a timeout and gets
+PNG bytes back. At most `max_pending` renders are in flight; further
+callers wait up to `timeout` for a slot and then get RenderBusy, so a
+burst cannot queue without bound.
+
+CITCO_RENDER_WORKERS sets the number of processes (default: one per core);
+0 renders in-process, serialized by a lock, with the same templates.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import metrics
+from graph_data import IMAGE_SAVEFIG_ARGS
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.environ.get("CITCO_RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_TIMEOUT = float(os.environ.get("CITCO_RENDER_TIMEOUT", "30"))
+
+STYLE = 'seaborn-v0_8-darkgrid'
+BG_COLOR = "#F2EAD3"
+TEXT_COLOR = "#252422"
+DPI = 100
+FIGURE_SIZE = (6.4, 4.8)
+# Bump when the templates change so cached images from older code are not served.
+RENDER_VERSION = 2
+# Modules the forkserver imports before forking workers.
+WORKER_PRELOAD = ['__main__', 'render_worker']
+
+
+class RenderBusy(Exception):
+    pass
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+class RenderWorkerDied(Exception):
+    pass
+
+
+class FigureTemplate:
+    """A styled Figure with one Axes; subclasses add the data artists they reuse."""
+
+    def __init__(self, title=None, xlabel=None, ylabel=None, rotate_x=False):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=FIGURE_SIZE, facecolor=BG_COLOR)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.ax.set_facecolor(BG_COLOR)
+        params = self.figure.subplotpars
+        self._margins = {'left': params.left, 'right': params.right, 'top': params.top, 'bottom': params.bottom}
+
+        if title is not None:
+            self.ax.set_xlabel(xlabel, color=TEXT_COLOR, fontweight='bold')
+            self.ax.set_ylabel(ylabel, color=TEXT_COLOR, fontweight='bold')
+            self.ax.set_title(title, color=TEXT_COLOR, fontsize=14, fontweight='bold')
+            if rotate_x:
+                self.ax.tick_params(axis='x', rotation=45, colors=TEXT_COLOR)
+                self.ax.tick_params(axis='y', colors=TEXT_COLOR)
+            else:
+                self.ax.tick_params(colors=TEXT_COLOR)
+            self.ax.grid(True, linestyle='--', alpha=0.4, color=TEXT_COLOR)
+            for spine in self.ax.spines.values():
+                spine.set_edgecolor(TEXT_COLOR)
+
+    def _rescale(self, *point_sets):
+        self.ax.ignore_existing_data_limits = True
+        for points in point_sets:
+            self.ax.update_datalim(points)
+        self.ax.autoscale_view()
+
+    def image(self, fmt='png', dpi=DPI):
+        buffer = io.BytesIO()
+        # tight_layout starts from the current margins; reset them so output doesn't depend on the last render.
+        self.figure.subplots_adjust(**self._margins)
+        self.figure.tight_layout()
+        self.figure.savefig(buffer, format=fmt, dpi=dpi, **IMAGE_SAVEFIG_ARGS[fmt])
+        return buffer.getvalue()
+
+
+class ScatterTemplate(FigureTemplate):
+    """Draws a graph_data.scatter_payload: the points, or their density grid as one image."""
+
+    def __init__(self, title, xlabel, ylabel, color):
+        from matplotlib.colors import LinearSegmentedColormap, LogNorm
+
+        super().__init__(title, xlabel, ylabel)
+        self.points = self.ax.scatter([], [], alpha=0.7, color=color, edgecolor=TEXT_COLOR)
+        cmap = LinearSegmentedColormap.from_list("density", ["#f6c9a8", color, TEXT_COLOR])
+        self.density = self.ax.imshow(np.ma.masked_all((1, 1)), cmap=cmap, norm=LogNorm(1, 2), origin='lower',
+                                      aspect='auto', interpolation='nearest', visible=False)
+        self.fit, = self.ax.plot([], [], linestyle='--', color=TEXT_COLOR, linewidth=2, alpha=0.8)
+
+    def draw(self, payload):
+        line = payload['line']
+        self.fit.set_visible(line is not None)
+        if line is not None:
+            self.fit.set_data(*line)
+
+        if 'density' in payload:
+            counts, extent = payload['density']
+            self.points.set_offsets(np.zeros((0, 2)))
+            self.density.set_data(np.ma.masked_equal(counts, 0))
+            self.density.set_clim(1, max(int(counts.max()), 2))
+            self.density.set_extent(extent)
+            self.density.set_visible(True)
+            self.ax.set_xlim(extent[0], extent[1], auto=None)
+            self.ax.set_ylim(extent[2], extent[3], auto=None)
+            return
+
+        points = payload['points']
+        self.points.set_offsets(points)
+        self.density.set_visible(False)
+        # The hidden image would otherwise pin the autoscaled limits to its last extent.
+        self.density.sticky_edges.x[:] = []
+        self.density.sticky_edges.y[:] = []
+        if line is None:
+            self._rescale(points)
+        else:
+            self._rescale(points, np.column_stack(line))
+
+
+class YearlyMeanTemplate(FigureTemplate):
+    def __init__(self, title, xlabel, ylabel, color, label_format):
+        super().__init__(title, xlabel, ylabel, rotate_x=True)
+        self.label_format = label_format
+        self.line, = self.ax.plot([], [], linestyle='-', marker='o', linewidth=2.5,
+                                  color=color, markeredgecolor=TEXT_COLOR,
+                                  markerfacecolor=color, markersize=8)
+        self.labels = []
+
+    def draw(self, years, values):
+        # Fiscal years are categories: plot them at 0..n-1 and label the ticks.
+        positions = np.arange(len(years))
+        values = np.asarray(values, dtype=float)
+        self.line.set_data(positions, values)
+        self.ax.set_xticks(positions, labels=years)
+
+        for label in self.labels:
+            label.remove()
+        self.labels = [
+            self.ax.annotate(self.label_format.format(value), (x, value),
+                             textcoords="offset points", xytext=(0, 10), ha='center',
+                             color=TEXT_COLOR, fontweight='bold')
+            for x, value in zip(positions, values)
+        ]
+        self._rescale(np.column_stack([positions, values]))
+
+
+class MessageTemplate(FigureTemplate):
+    def __init__(self):
+        super().__init__()
+        self.text = self.ax.text(0.5, 0.5, "", horizontalalignment='center', verticalalignment='center',
+                                 transform=self.ax.transAxes, fontsize=14, fontweight='bold', color=TEXT_COLOR)
+        for spine in self.ax.spines.values():
+            spine.set_edgecolor(TEXT_COLOR)
+
+    def draw(self, message):
+        self.text.set_text(message)
+
+
+TEMPLATES = {
+    'citation_vs_grants': lambda: ScatterTemplate("Citation Count vs Grant Amount", "Citation Count (By Year)",
+                                                  "Grant Amount ($)", "#eb5e28"),
+    'avg_citations': lambda: YearlyMeanTemplate("Average Citation Count Over Time", "Fiscal Year",
+                                                "Average Citation Count", "#2a9d8f", "{:.1f}"),
+    'avg_grants': lambda: YearlyMeanTemplate("Average Grant Amount Over Time", "Fiscal Year",
+                                             "Average Grant Amount ($)", "#D88C00", "${:.0f}"),
+    'message': MessageTemplate,
+}
+
+
+def build_templates():
+    import matplotlib.style
+    matplotlib.style.use(STYLE)
+    return {kind: factory() for kind, factory in TEMPLATES.items()}
+
+
+def _init_worker():
+    # Already imported in a worker forked from the forkserver; a spawned worker builds its templates here.
+    import render_worker  # noqa: F401
+
+
+def draw_image(template, args, fmt='png', dpi=DPI):
+    """(image bytes, draw seconds, savefig seconds) of `template` drawn with `args`."""
+    start = time.perf_counter()
+    template.draw(*args)
+    drawn = time.perf_counter()
+    image = template.image(fmt, dpi)
+    return image, drawn - start, time.perf_counter() - drawn
+
+
+def _render(kind, args, fmt, dpi):
+    import render_worker
+    return draw_image(render_worker.templates[kind], args, fmt, dpi)
+
+
+def _ping():
+    return os.getpid()
+
+
+def process_context():
+    """Start method for the render and bootstrap workers.
+
+    Forking the app itself would copy its threads' locks into the workers.
+    Workers instead fork from a forkserver that has imported the app's
+    __main__ module (which loads the data) and render_worker once; where
+    there is no forkserver they are spawned and import both themselves.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(WORKER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class RenderPool:
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, max_pending=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._local_templates = None
+        self._local_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.rendered = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def start(self):
+        """Start the worker processes and wait until each has built its templates."""
+        with self._start_lock:
+            if self.workers <= 0 or self._executor is not None:
+                return
+            try:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=process_context(),
+                                                     initializer=_init_worker)
+                for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+                    future.result(timeout=self.timeout)
+            except Exception as e:
+                logger.error(f"Error starting render workers, rendering in-process: {str(e)}")
+                self.workers = 0
+                self._executor = None
+
+    def _restart(self):
+        with self._start_lock:
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def _render_local(self, kind, args, fmt, dpi):
+        with self._local_lock:
+            if self._local_templates is None:
+                self._local_templates = build_templates()
+            return draw_image(self._local_templates[kind], args, fmt, dpi)
+
+    def render_image(self, kind, *args, fmt='png', dpi=DPI, local=False):
+        """Image bytes of graph `kind` ('citation_vs_grants', 'avg_citations', 'avg_grants' or 'message')
+        in `fmt` ('png', 'webp' or 'svg'); `local` draws it in this process even with workers."""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise RenderBusy(f"{self.max_pending} renders pending for over {self.timeout}s")
+        release = True
+        try:
+            if self._executor is None and not local:
+                self.start()
+            if self._executor is None or local:
+                image, draw_seconds, savefig_seconds = self._render_local(kind, args, fmt, dpi)
+            else:
+                try:
+                    # submit raises BrokenProcessPool too once the pool has noticed a dead worker.
+                    future = self._executor.submit(_render, kind, args, fmt, dpi)
+                    image, draw_seconds, savefig_seconds = future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    # The worker keeps going; its slot is only freed once it is done.
+                    self.timeouts += 1
+                    release = False
+                    future.add_done_callback(lambda _: self._slots.release())
+                    raise RenderTimeout(f"render of {kind} took longer than {self.timeout}s")
+                except BrokenProcessPool as e:
+                    logger.error("Render worker died, restarting the pool")
+                    self._restart()
+                    raise RenderWorkerDied(f"render worker died: {str(e)}") from e
+        finally:
+            if release:
+                self._slots.release()
+        self.rendered += 1
+        # Waiting for a slot and a worker, and moving the payload and image between processes.
+        metrics.record("render_wait", time.perf_counter() - start - draw_seconds - savefig_seconds)
+        metrics.record("draw", draw_seconds)
+        metrics.record("savefig", savefig_seconds)
+        return image
+
+    def render_png(self, kind, *args):
+        return self.render_image(kind, *args)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rendered': self.rendered,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
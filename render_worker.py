@@ -0,0 +1,14 @@
+"""State of a render worker process: matplotlib and the styled figure templates.
+
+The forkserver imports this module once (see render_pool.process_context),
+so every worker it forks starts with matplotlib loaded and the templates
+built; a spawned worker imports it from the pool initializer instead.
+The app process never imports it.
+"""
+import matplotlib
+
+matplotlib.use('Agg')
+
+from render_pool import build_templates  # noqa: E402
+
+templates = build_templates()
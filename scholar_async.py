@@ -0,0 +1,222 @@
+"""Concurrent version of the gscholar.py scraping loop.
+
+Usage: python scholar_async.py [--input NSERC_DATASET.xlsx] [--output researcher_citations.csv]
+                               [--concurrency 4] [--rps 0.5] [--limit N] [--base-url URL]
+
+Work items are the (Name, Fiscal Year) jobs in the JobStore shared with
+gscholar.py, claimed per author so each researcher is searched and fetched
+once for all of their fiscal years. Up to `concurrency` authors are in
+flight at once over one keep-alive connection pool, every HTTP request draws
+from a global requests-per-second budget, HTML is parsed on worker threads
+and a single writer task commits results to the store in batches on a
+thread, so fetching, parsing and writing overlap. The output CSV is
+exported from the store at the end.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import gscholar
+import snapshot
+from jobstore import DONE, NOT_FOUND, JobStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ScrapeError(Exception):
+    pass
+
+
+class PageNotFound(ScrapeError):
+    pass
+
+
+class RateLimiter:
+    """Token bucket shared by every request the scraper makes."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncScraper:
+    def __init__(self, base_url=gscholar.SCHOLAR_BASE_URL, concurrency=4, rate=0.5,
+                 retries=3, timeout=30, backoff=5.0):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate, burst=max(1, concurrency // 2))
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+
+    async def fetch(self, session, url):
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            self.requests += 1
+            try:
+                async with session.get(url, headers=gscholar.get_headers()) as response:
+                    if response.status == 200:
+                        return await response.text()
+                    status = response.status
+            except Exception as e:
+                status = f"{type(e).__name__}: {e}"
+            else:
+                if status == 404:
+                    raise PageNotFound(f"request failed ({status}): {url}")
+                if status not in RETRY_STATUSES:
+                    break
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        raise ScrapeError(f"request failed ({status}): {url}")
+
+    async def scrape_author(self, session, name, fiscal_years):
+        """Return (state, row) for each of an author's fiscal years from one search and one profile fetch."""
+        try:
+            html = await self.fetch(session, gscholar.search_url(name, self.base_url))
+        except PageNotFound:
+            # As in gscholar.search_author, a missing search page means no author.
+            html = None
+        author_id = html and await asyncio.to_thread(gscholar.parse_author_id, html)
+        if not author_id:
+            logger.info(f"no corresponding author found for {name}")
+            return [(NOT_FOUND, row) for row in gscholar.not_found_rows(name, fiscal_years)]
+
+        html = await self.fetch(session, gscholar.profile_url(author_id, self.base_url))
+        profile_data = await asyncio.to_thread(gscholar.parse_author_profile, html)
+
+        html = await self.fetch(session, gscholar.publications_url(author_id, self.base_url))
+        publications = await asyncio.to_thread(gscholar.parse_publications, html)
+
+        return [(DONE, row) for row in gscholar.citation_rows(profile_data, fiscal_years, publications)]
+
+    async def _worker(self, session, work, results):
+        while True:
+            item = await work.get()
+            if item is None:
+                return
+            name, fiscal_years = item
+            try:
+                scraped = await self.scrape_author(session, name, fiscal_years)
+                await results.put([(name, row[2], state, row) for state, row in scraped])
+            except Exception as e:
+                logger.error(f"error with {name}: {str(e)}")
+                self.errors += 1
+                await results.put([(name, fiscal_year, None, str(e)) for fiscal_year in fiscal_years])
+
+    async def _writer(self, store, results, batch_size=25):
+        batch = []
+        while True:
+            result = await results.get()
+            if result is not None:
+                batch.extend(result)
+            if batch and (result is None or len(batch) >= batch_size or results.empty()):
+                done = [r for r in batch if r[2] is not None]
+                failed = [(name, fiscal_year, message) for name, fiscal_year, state, message in batch
+                          if state is None]
+                # The store is synchronous SQLite; commit off the event loop so fetches keep going.
+                if done:
+                    await asyncio.to_thread(store.record, done)
+                if failed:
+                    await asyncio.to_thread(store.fail, failed)
+                self.rows += len(done)
+                batch = []
+            if result is None:
+                return
+
+    async def run(self, store, limit=None):
+        """Scrape eligible pending jobs from `store` until none are left (or `limit` authors are done)."""
+        import aiohttp
+
+        work = asyncio.Queue(maxsize=self.concurrency * 2)
+        results = asyncio.Queue()
+        start = time.monotonic()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            writer = asyncio.create_task(self._writer(store, results))
+            workers = [asyncio.create_task(self._worker(session, work, results))
+                       for _ in range(self.concurrency)]
+
+            claimed = 0
+            while limit is None or claimed < limit:
+                batch_size = self.concurrency * 2 if limit is None else min(self.concurrency * 2, limit - claimed)
+                authors = await asyncio.to_thread(store.claim_authors, batch_size)
+                if not authors:
+                    break
+                claimed += len(authors)
+                for author in authors.items():
+                    await work.put(author)
+            for _ in workers:
+                await work.put(None)
+            await asyncio.gather(*workers)
+
+            await results.put(None)
+            await writer
+
+        elapsed = time.monotonic() - start
+        stats = {
+            "rows": self.rows,
+            "errors": self.errors,
+            "requests": self.requests,
+            "seconds": elapsed,
+            "rows_per_minute": self.rows / elapsed * 60 if elapsed else 0.0,
+        }
+        logger.info(f"Scraped {stats['rows']} rows ({stats['errors']} errors, {stats['requests']} requests) "
+                    f"in {elapsed:.1f}s: {stats['rows_per_minute']:.1f} rows/min")
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Google Scholar citation counts concurrently")
+    parser.add_argument("--input", default="NSERC_DATASET.xlsx")
+    parser.add_argument("--output", default="researcher_citations.csv")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=0.5, help="global requests per second budget (0 = unlimited)")
+    parser.add_argument("--limit", type=int, help="stop after this many authors")
+    parser.add_argument("--base-url", default=gscholar.SCHOLAR_BASE_URL)
+    args = parser.parse_args()
+
+    store = JobStore(gscholar.JOBS_DB)
+    source_key = snapshot.file_digest(args.input)
+    if store.get_meta("seed_source") != source_key:
+        grouped = gscholar.load_work_items(args.input)
+        store.seed(zip(grouped["Name"], grouped["Fiscal Year"]), source_key)
+    store.import_csv(args.output)
+    print(f"Job states: {store.counts()}")
+
+    scraper = AsyncScraper(args.base_url, args.concurrency, args.rps)
+    try:
+        asyncio.run(scraper.run(store, args.limit))
+    finally:
+        store.export_csv(args.output)
+        print(f"Job states: {store.counts()}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""HTML extraction backends for Google Scholar author search and profile pages.
+
+Every backend exposes the same three methods and must return exactly what
+the BeautifulSoup reference returns:
+
+    author_id(html)     -> first profile user id linked from a search page, or None
+    profile(html)       -> {"name": ..., "affiliation": ...}
+    publications(html)  -> [(year, citations), ...] for rows that have a year
+
+tests/test_scholar_extract.py checks the backends against each other on the
+saved pages in fixtures/scholar; `python -m benchmarks.extract` reports their
+speed and memory.
+"""
+import html as html_lib
+import os
+import re
+
+from bs4 import BeautifulSoup
+
+
+def _parse_year(text):
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def _parse_citations(text):
+    if text and text.strip().isdigit():
+        return int(text)
+    return 0
+
+
+def _author_id_from_href(href):
+    return href.split('user=')[1].split('&')[0]
+
+
+class BeautifulSoupExtractor:
+    """Reference implementation: full html.parser tree plus CSS selectors."""
+
+    name = "bs4"
+
+    def author_id(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        profile_links = soup.select('a[href*="user="]')
+
+        if not profile_links:
+            return None
+
+        return _author_id_from_href(profile_links[0]['href'])
+
+    def profile(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        name_elem = soup.select_one('#gsc_prf_in')
+        affiliation_elem = soup.select_one('.gsc_prf_il')
+
+        return {
+            "name": name_elem.text if name_elem else "N/A",
+            "affiliation": affiliation_elem.text if affiliation_elem else "UNKNOWN"
+        }
+
+    def publications(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        publications = []
+        for row in soup.select('tr.gsc_a_tr'):
+            year_elem = row.select_one('.gsc_a_y')
+            year = _parse_year(year_elem.text if year_elem else None)
+            if year is None:
+                continue
+
+            citation_elem = row.select_one('.gsc_a_c')
+            publications.append((year, _parse_citations(citation_elem.text if citation_elem else None)))
+
+        return publications
+
+
+class LxmlExtractor:
+    """libxml2 parser with XPath; needs the optional lxml package."""
+
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self._parse = lxml.html.fromstring
+
+    def _fromstring(self, html):
+        # libxml2 refuses an empty document; bs4 just yields an empty tree.
+        return self._parse(html if html.strip() else "<html></html>")
+
+    @staticmethod
+    def _class_xpath(class_name):
+        return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+    def author_id(self, html):
+        links = self._fromstring(html).xpath("//a[contains(@href, 'user=')]/@href")
+        return _author_id_from_href(links[0]) if links else None
+
+    def profile(self, html):
+        tree = self._fromstring(html)
+        name_elem = tree.xpath("//*[@id='gsc_prf_in']")
+        affiliation_elem = tree.xpath(f"//*[{self._class_xpath('gsc_prf_il')}]")
+        return {
+            "name": name_elem[0].text_content() if name_elem else "N/A",
+            "affiliation": affiliation_elem[0].text_content() if affiliation_elem else "UNKNOWN"
+        }
+
+    def publications(self, html):
+        tree = self._fromstring(html)
+        year_xpath = f".//*[{self._class_xpath('gsc_a_y')}]"
+        citation_xpath = f".//*[{self._class_xpath('gsc_a_c')}]"
+
+        publications = []
+        for row in tree.xpath(f"//tr[{self._class_xpath('gsc_a_tr')}]"):
+            year_elem = row.xpath(year_xpath)
+            year = _parse_year(year_elem[0].text_content() if year_elem else None)
+            if year is None:
+                continue
+            citation_elem = row.xpath(citation_xpath)
+            publications.append((year, _parse_citations(citation_elem[0].text_content() if citation_elem else None)))
+        return publications
+
+
+def _class_element(class_name):
+    # First element carrying `class_name`, up to its closing tag (or the end of the
+    # page if it is never closed, as an HTML parser would). Only valid for elements
+    # that do not nest another tag of the same name, as on Scholar pages.
+    return re.compile(
+        r"<(?P<tag>[a-zA-Z][\w-]*)\b[^>]*?\bclass\s*=\s*(?P<q>[\"'])(?:[^\"']*\s)?"
+        + re.escape(class_name)
+        + r"(?:\s[^\"']*)?(?P=q)[^>]*>(?P<body>.*?)(?:</(?P=tag)\s*>|\Z)",
+        re.S,
+    )
+
+
+class RegexExtractor:
+    """Targeted extractor that scans the raw HTML for just the fields we read.
+
+    No tree is built, so it is the fastest backend and uses almost no memory,
+    but it relies on Scholar's markup not nesting the matched elements.
+    """
+
+    name = "regex"
+
+    _link = re.compile(r"<a\b[^>]*?\bhref\s*=\s*([\"'])([^\"']*?user=[^\"']*)\1", re.S | re.I)
+    _name = re.compile(r"<(?P<tag>[a-zA-Z][\w-]*)\b[^>]*?\bid\s*=\s*([\"'])gsc_prf_in\2[^>]*>"
+                       r"(?P<body>.*?)(?:</(?P=tag)\s*>|\Z)", re.S)
+    _affiliation = _class_element("gsc_prf_il")
+    _row = re.compile(r"<tr\b[^>]*?\bclass\s*=\s*([\"'])(?:[^\"']*\s)?gsc_a_tr(?:\s[^\"']*)?\1[^>]*>(?P<body>.*?)</tr\s*>",
+                      re.S | re.I)
+    _year = _class_element("gsc_a_y")
+    _citations = _class_element("gsc_a_c")
+    _tags = re.compile(r"<[^>]*>")
+
+    def _text(self, match):
+        if match is None:
+            return None
+        return html_lib.unescape(self._tags.sub("", match.group("body")))
+
+    def author_id(self, html):
+        match = self._link.search(html)
+        return _author_id_from_href(html_lib.unescape(match.group(2))) if match else None
+
+    def profile(self, html):
+        name = self._text(self._name.search(html))
+        affiliation = self._text(self._affiliation.search(html))
+        return {
+            "name": name if name is not None else "N/A",
+            "affiliation": affiliation if affiliation is not None else "UNKNOWN"
+        }
+
+    def publications(self, html):
+        publications = []
+        for row in self._row.finditer(html):
+            body = row.group("body")
+            year = _parse_year(self._text(self._year.search(body)))
+            if year is None:
+                continue
+            publications.append((year, _parse_citations(self._text(self._citations.search(body)))))
+        return publications
+
+
+BACKENDS = {
+    "bs4": BeautifulSoupExtractor,
+    "lxml": LxmlExtractor,
+    "regex": RegexExtractor,
+}
+
+
+def get_extractor(name=None):
+    """Backend named by `name` or $SCHOLAR_EXTRACTOR; "auto" prefers lxml and falls back to bs4."""
+    name = name or os.environ.get("SCHOLAR_EXTRACTOR", "auto")
+    if name == "auto":
+        try:
+            return LxmlExtractor()
+        except ImportError:
+            return BeautifulSoupExtractor()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown extractor backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,137 @@
+"""Local stand-in for Google Scholar's author search and profile pages.
+
+Usage: python scholar_stub.py [--port 8008] [--pages DIR] [--latency 0.05]
+
+Serves recorded pages from DIR when present (`search-<slug>.html` for an
+author search, `<user>.html` for a profile) and otherwise synthesizes a page
+with Scholar's markup, deterministically from the requested name or user id.
+Point the scrapers at it with SCHOLAR_BASE_URL=http://127.0.0.1:<port>.
+"""
+import argparse
+import hashlib
+import html
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+UNIVERSITIES = [
+    "University of Calgary", "University of Regina", "Carleton University", "Simon Fraser University",
+    "University of Alberta", "University of New Brunswick", "University of Waterloo",
+    "University of Victoria", "University of Toronto", "University of Guelph", "Brock University",
+]
+
+
+def author_id_for(name):
+    return hashlib.sha1(name.lower().encode("utf-8")).hexdigest()[:12]
+
+
+def slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def render_search_page(name, found=True):
+    results = ""
+    if found:
+        results = (f'<div class="gsc_1usr"><h3 class="gs_ai_name">'
+                   f'<a href="/citations?hl=en&amp;user={author_id_for(name)}">{html.escape(name)}</a>'
+                   f'</h3><div class="gs_ai_aff">Professor</div></div>')
+    return (f'<html><head><title>Search</title></head><body>'
+            f'<div id="gsc_sa_ccl">{results}</div></body></html>')
+
+
+def render_profile_page(author_id, publications=60):
+    rng = random.Random(author_id)
+    first = rng.choice(["Hatem", "Ana", "Wei", "Priya", "Jonathan", "Sadiksha", "Omar", "Lucie"])
+    last = rng.choice(["Abou-Zeid", "Tremblay", "Chen", "Singh", "Thomas", "Dahal", "Haddad", "Roy"])
+    rows = []
+    for i in range(publications):
+        year = rng.randint(1998, 2024)
+        citations = rng.choice(["", str(rng.randint(0, 400))])
+        rows.append(
+            f'<tr class="gsc_a_tr"><td class="gsc_a_t"><a href="#" class="gsc_a_at">Paper {i} on topic '
+            f'{rng.randint(1, 999)}</a><div class="gs_gray">{first[0]} {last}, et al.</div>'
+            f'<div class="gs_gray">Journal {rng.randint(1, 50)}</div></td>'
+            f'<td class="gsc_a_c"><a href="#" class="gsc_a_ac gs_ibl">{citations}</a></td>'
+            f'<td class="gsc_a_y"><span class="gsc_a_h gsc_a_hc gs_ibl">{year}</span></td></tr>'
+        )
+    return (f'<html><head><title>{first} {last}</title></head><body>'
+            f'<div id="gsc_prf_w"><div id="gsc_prf_in">{first} {last}</div>'
+            f'<div class="gsc_prf_il">{rng.choice(UNIVERSITIES)}</div>'
+            f'<div class="gsc_prf_il" id="gsc_prf_ivh">Verified email</div></div>'
+            f'<table id="gsc_a_t"><tbody id="gsc_a_b">{"".join(rows)}</tbody></table></body></html>')
+
+
+class ScholarStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    pages_dir = None
+    latency = 0.0
+    not_found_rate = 0.1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _recorded(self, filename):
+        if not self.pages_dir:
+            return None
+        path = os.path.join(self.pages_dir, filename)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if url.path != "/citations":
+            self.send_error(404)
+            return
+
+        if query.get("view_op") == ["search_authors"]:
+            name = query.get("mauthors", [""])[0]
+            found = int(author_id_for(name), 16) % 1000 >= self.not_found_rate * 1000
+            body = self._recorded(f"search-{slug(name)}.html") or render_search_page(name, found)
+        elif "user" in query:
+            author_id = query["user"][0]
+            body = self._recorded(f"{author_id}.html") or render_profile_page(author_id)
+        else:
+            self.send_error(400)
+            return
+
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_server(port=0, pages_dir=None, latency=0.0):
+    """Start the stub in a background thread and return (server, base_url)."""
+    handler = type("Handler", (ScholarStubHandler,), {"pages_dir": pages_dir, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Google Scholar pages")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--pages", help="directory of recorded pages")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.pages, args.latency)
+    print(f"Serving Scholar stand-in at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
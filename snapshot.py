@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get("CITCO_SNAPSHOT_DIR", "snapshot")
+SNAPSHOT_ENABLED = os.environ.get("CITCO_SNAPSHOT", "1") != "0"
+FORMAT_VERSION = 1
+
+# Snapshot an (input file, reader) pair under a table name. The merged table is
+# written by DatasetManager because it depends on the merge step, not one file.
+SOURCES = {
+    "citations": "SCHOLAR.csv",
+    "grants": "NSERC.csv",
+    "nserc_dataset": "NSERC_DATASET.xlsx",
+}
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_info(path, digest=None):
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": digest or file_digest(path),
+    }
+
+
+def table_dir(name):
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def read_manifest(name):
+    try:
+        with open(os.path.join(table_dir(name), "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def is_fresh(manifest, paths):
+    if manifest is None or len(manifest["sources"]) != len(paths):
+        return False
+    for source, path in zip(manifest["sources"], paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (source["path"] != os.path.abspath(path) or source["mtime_ns"] != stat.st_mtime_ns
+                or source["size"] != stat.st_size):
+            return False
+    return True
+
+
+def write_table(name, df, sources=(), version=None):
+    """Write `df` as one .npy file per column plus a manifest.
+
+    Numeric columns are stored as-is so they can be memory-mapped on load.
+    String columns are dictionary-encoded into int32 codes and a table of
+    unique values. The table is written to a temporary directory and moved
+    into place, so readers never see a half-written snapshot.
+    """
+    target = table_dir(name)
+    staging = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        series = df[column]
+        entry = {"name": column, "dtype": str(series.dtype), "file": f"c{i}.npy"}
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            entry["kind"] = "numeric"
+            np.save(os.path.join(staging, entry["file"]), series.to_numpy())
+        else:
+            entry["kind"] = "string"
+            entry["categories"] = f"c{i}.categories.npy"
+            codes, uniques = pd.factorize(series)
+            np.save(os.path.join(staging, entry["file"]), codes.astype(np.int32))
+            np.save(os.path.join(staging, entry["categories"]), np.asarray(uniques, dtype=str))
+        columns.append(entry)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "table": name,
+        "rows": len(df),
+        "version": version,
+        "sources": list(sources),
+        "columns": columns,
+        "created": time.time(),
+    }
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f"{target}.old-{os.getpid()}"
+    if os.path.exists(target):
+        os.replace(target, old)
+    os.replace(staging, target)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def read_table(name, manifest=None):
+    manifest = manifest or read_manifest(name)
+    if manifest is None:
+        return None
+
+    directory = table_dir(name)
+    data = {}
+    for entry in manifest["columns"]:
+        values = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+        if entry["kind"] == "numeric":
+            data[entry["name"]] = values
+            continue
+        categories = np.load(os.path.join(directory, entry["categories"])).astype(object)
+        # Missing values are stored as code -1, which wraps onto the NaN appended here.
+        decoded = np.append(categories, np.nan).take(values, mode="wrap")
+        series = pd.Series(decoded, dtype=object)
+        data[entry["name"]] = series if entry["dtype"] == "object" else series.astype(entry["dtype"])
+
+    # copy=False keeps the numeric columns backed by the read-only memory maps.
+    return pd.DataFrame(data, copy=False)
+
+
+def load_table(name, path, reader):
+    """Return `(df, sha1)` for `path`, from the snapshot when it is up to date.
+
+    When the snapshot is missing or stale the file is parsed with `reader`
+    and the snapshot is rewritten for the next start.
+    """
+    if not SNAPSHOT_ENABLED:
+        return reader(path), file_digest(path)
+
+    manifest = read_manifest(name)
+    if is_fresh(manifest, [path]):
+        try:
+            df = read_table(name, manifest)
+            logger.debug(f"Loaded {name} from snapshot ({manifest['rows']} rows)")
+            return df, manifest["sources"][0]["sha1"]
+        except Exception as e:
+            logger.error(f"Error reading {name} snapshot, falling back to {path}: {str(e)}")
+
+    df = reader(path)
+    info = source_info(path)
+    try:
+        write_table(name, df, [info])
+    except Exception as e:
+        logger.error(f"Error writing {name} snapshot: {str(e)}")
+    return df, info["sha1"]
+
+
+def read_versioned_table(name, version):
+    if not SNAPSHOT_ENABLED:
+        return None
+    manifest = read_manifest(name)
+    if manifest is None or manifest.get("version") != version:
+        return None
+    return read_table(name, manifest)
+
+
+def compile_all():
+    from dataset import load_citations_csv, load_grants_csv
+
+    readers = {
+        "citations": load_citations_csv,
+        "grants": load_grants_csv,
+        "nserc_dataset": pd.read_excel,
+    }
+    # The merged and name link tables are keyed by the source files and the MERGE_VERSION,
+    # NORMALIZE_VERSION and LINKAGE_VERSION constants; drop them here too in case a change
+    # went without a bump. The next app start rebuilds them.
+    for name in ("merged", "name_links"):
+        shutil.rmtree(table_dir(name), ignore_errors=True)
+
+    for name, path in SOURCES.items():
+        if not os.path.exists(path):
+            logger.warning(f"Skipping {name}: {path} not found")
+            continue
+        start = time.perf_counter()
+        try:
+            df = readers[name](path)
+            write_table(name, df, [source_info(path)])
+        except Exception as e:
+            logger.error(f"Error compiling {name} from {path}: {str(e)}")
+            continue
+        logger.info(f"Compiled {name}: {len(df)} rows from {path} in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        SNAPSHOT_DIR = sys.argv[1]
+    compile_all()
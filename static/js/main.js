@@ -26,7 +26,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         chartTitle.textContent = chartTitles[currentGraphType];
         
-        fetchGraph();
+        showGraph();
     });
 
     function toggleFullscreen(enterFullscreen) {
@@ -49,107 +49,340 @@ document.addEventListener('DOMContentLoaded', function() {
         toggleFullscreen(false);
     });
 
-    document.getElementById('university-select').addEventListener('change', function() {
-        fetchGraph();
-        fetchSummaryStats();
-    });
+    document.getElementById('university-select').addEventListener('change', fetchDashboard);
 
-    document.getElementById('timeframe-select').addEventListener('change', function() {
-        fetchGraph();
-        fetchSummaryStats();
-    });
+    document.getElementById('timeframe-select').addEventListener('change', fetchDashboard);
 
-    fetchGraph();
-    fetchSummaryStats();
+    fetchDashboard();
 });
 
-function fetchGraph() {
+const chartStyles = {
+    'citation_vs_grants': { primary: '#eb5e28', xLabel: 'Citation Count (By Year)', yLabel: 'Grant Amount ($)' },
+    'avg_citations': { primary: '#2a9d8f', xLabel: 'Fiscal Year', yLabel: 'Average Citation Count' },
+    'avg_grants': { primary: '#D88C00', xLabel: 'Fiscal Year', yLabel: 'Average Grant Amount ($)' }
+};
+const chartBackground = '#F2EAD3';
+const chartForeground = '#252422';
+
+function graphQuery() {
+    const university = document.getElementById('university-select').value;
+    const timeframe = document.getElementById('timeframe-select').value;
+    return `type=${currentGraphType}&university=${encodeURIComponent(university)}&timeframe=${timeframe}`;
+}
+
+function clearGraphErrors() {
+    const errorMessages = document.getElementsByClassName('error-message');
+    while (errorMessages.length > 0) {
+        errorMessages[0].parentNode.removeChild(errorMessages[0]);
+    }
+}
+
+function showGraphElement(kind) {
+    document.getElementById('graph-canvas').style.display = kind === 'canvas' ? 'block' : 'none';
+    document.getElementById('graph-img').style.display = kind === 'image' ? 'block' : 'none';
+}
+
+// The response of the last /dashboard request: summary, correlation and the
+// series of every graph type, so changing the chart needs no request.
+let dashboardData = null;
+
+function canDrawChart() {
+    const canvas = document.getElementById('graph-canvas');
+    return Boolean(canvas && canvas.getContext);
+}
+
+// One request per filter change; the server filters the data once for all of it.
+function fetchDashboard() {
     const loadingOverlay = document.getElementById('loading-overlay');
-    const graphImg = document.getElementById('graph-img');
+    const params = new URLSearchParams({
+        university: document.getElementById('university-select').value,
+        timeframe: document.getElementById('timeframe-select').value
+    });
+    if (!canDrawChart()) {
+        params.set('images', '1');
+    }
     
     loadingOverlay.style.display = 'flex';
     
-    const university = document.getElementById('university-select').value;
-    const timeframe = document.getElementById('timeframe-select').value;
-    
-    fetch(`/graph?type=${currentGraphType}&university=${university}&timeframe=${timeframe}`)
+    fetch(`/dashboard?${params}`)
         .then(response => response.json())
         .then(data => {
             if (data.error) {
-                console.error('Error fetching graph:', data.error);
-                graphImg.src = '';
-                graphImg.alt = 'Error loading graph';
-                const errorText = document.createElement('div');
-                errorText.className = 'error-message';
-                errorText.textContent = 'Error loading graph: ' + data.error;
-                document.getElementById('chart-container').appendChild(errorText);
-            } else {
-                graphImg.src = 'data:image/png;base64,' + data.image;
-                graphImg.alt = chartTitles[currentGraphType];
-                
-                const errorMessages = document.getElementsByClassName('error-message');
-                while (errorMessages.length > 0) {
-                    errorMessages[0].parentNode.removeChild(errorMessages[0]);
-                }
+                throw new Error(data.error);
             }
-            
-            loadingOverlay.style.display = 'none';
+            dashboardData = data;
+            showSummaryStats(data.summary);
+            showCorrelation(data.correlation);
+            showGraph();
         })
         .catch(error => {
-            console.error('Error:', error);
-            loadingOverlay.style.display = 'none';
+            console.error('Error fetching dashboard:', error);
+            dashboardData = null;
+            fetchGraphImage();
         });
 }
 
-function fetchSummaryStats() {
-    const university = document.getElementById('university-select').value;
-    const timeframe = document.getElementById('timeframe-select').value;
+// Draws the current chart in the browser from the dashboard series; the
+// server-rendered image is only used when that fails or canvas is unavailable.
+function showGraph() {
+    const loadingOverlay = document.getElementById('loading-overlay');
+    const series = dashboardData && dashboardData.graphs[currentGraphType];
     
-    fetch('/data/total_grants')
-        .then(response => response.json())
-        .then(totalData => {
-            const totalGrantsAll = totalData.total_grants;
-            
-            fetch(`/data/summary?university=${university}&timeframe=${timeframe}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.error) {
-                        console.error('Error fetching summary stats:', data.error);
-                    } else {
-                        document.getElementById('total-citations').textContent = data.total_citations.toLocaleString();
-                        
-                        if (data.total_grants_original && (university !== 'all' || timeframe !== 'all')) {
-                            document.getElementById('total-grants').textContent = '$' + data.total_grants_original.toLocaleString();
-                        } else if (totalGrantsAll) {
-                            document.getElementById('total-grants').textContent = '$' + totalGrantsAll.toLocaleString();
-                        } else {
-                            document.getElementById('total-grants').textContent = '$' + data.total_grants.toLocaleString();
-                        }
-                        
-                        document.getElementById('avg-citations').textContent = data.avg_citations.toLocaleString();
-                        document.getElementById('avg-grants').textContent = '$' + data.avg_grants.toLocaleString();
-                        document.getElementById('researchers-count').textContent = data.researchers_count.toLocaleString();
-                    }
-                })
-                .catch(error => {
-                    console.error('Error:', error);
-                });
-        })
-        .catch(error => {
-            console.error('Error fetching total grants:', error);
-            
-            fetch(`/data/summary?university=${university}&timeframe=${timeframe}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.error) {
-                        console.error('Error fetching summary stats:', data.error);
-                    } else {
-                        document.getElementById('total-citations').textContent = data.total_citations.toLocaleString();
-                        document.getElementById('total-grants').textContent = '$' + data.total_grants.toLocaleString();
-                        document.getElementById('avg-citations').textContent = data.avg_citations.toLocaleString();
-                        document.getElementById('avg-grants').textContent = '$' + data.avg_grants.toLocaleString();
-                        document.getElementById('researchers-count').textContent = data.researchers_count.toLocaleString();
-                    }
-                });
+    if (!series || !canDrawChart()) {
+        fetchGraphImage(dashboardData && dashboardData.images && dashboardData.images[currentGraphType]);
+        return;
+    }
+    
+    try {
+        showGraphElement('canvas');
+        drawChart(document.getElementById('graph-canvas'), series);
+        clearGraphErrors();
+        loadingOverlay.style.display = 'none';
+    } catch (error) {
+        console.warn('Client-side chart failed, using server-rendered image:', error);
+        fetchGraphImage();
+    }
+}
+
+function niceTicks(min, max, count) {
+    if (min === max) {
+        min -= 1;
+        max += 1;
+    }
+    const rawStep = (max - min) / count;
+    const magnitude = Math.pow(10, Math.floor(Math.log10(rawStep)));
+    const step = [1, 2, 2.5, 5, 10].map(m => m * magnitude).find(s => s >= rawStep);
+    const first = Math.ceil(min / step);
+    const ticks = [];
+    for (let i = first; i * step <= max + step * 1e-9; i++) {
+        ticks.push(parseFloat((i * step).toPrecision(12)) || 0);
+    }
+    return ticks;
+}
+
+function formatTick(value) {
+    const abs = Math.abs(value);
+    if (abs >= 1e6) return (value / 1e6).toLocaleString(undefined, { maximumFractionDigits: 1 }) + 'M';
+    if (abs >= 1e4) return (value / 1e3).toLocaleString(undefined, { maximumFractionDigits: 1 }) + 'k';
+    return value.toLocaleString(undefined, { maximumFractionDigits: 2 });
+}
+
+function drawChart(canvas, data) {
+    const container = canvas.parentNode;
+    const width = Math.max(container.clientWidth, 320);
+    const height = Math.max(Math.min(container.clientHeight, width * 0.75), 300);
+    const ratio = window.devicePixelRatio || 1;
+    
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+    canvas.style.width = width + 'px';
+    canvas.style.height = height + 'px';
+    
+    const ctx = canvas.getContext('2d');
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.fillStyle = chartBackground;
+    ctx.fillRect(0, 0, width, height);
+    ctx.fillStyle = chartForeground;
+    ctx.font = 'bold 14px Roboto, sans-serif';
+    ctx.textAlign = 'center';
+    
+    if (!data.n) {
+        ctx.textBaseline = 'middle';
+        ctx.fillText('No data available for the selected filters', width / 2, height / 2);
+        return;
+    }
+    
+    const style = chartStyles[data.type];
+    const isScatter = data.type === 'citation_vs_grants';
+    const plot = { left: 80, right: width - 20, top: 40, bottom: height - (isScatter ? 50 : 75) };
+    
+    ctx.textBaseline = 'top';
+    ctx.font = 'bold 16px Roboto, sans-serif';
+    ctx.fillText(chartTitles[data.type], width / 2, 10);
+    
+    let xMin, xMax, xTicks, xLabels;
+    const yValues = isScatter ? data.y_range : data.values;
+    let yMin = Math.min(...yValues);
+    let yMax = Math.max(...yValues);
+    
+    if (isScatter) {
+        [xMin, xMax] = data.x_range;
+        const xPad = (xMax - xMin || 1) * 0.05;
+        xMin -= xPad;
+        xMax += xPad;
+        xTicks = niceTicks(xMin, xMax, 6);
+        xLabels = xTicks.map(formatTick);
+    } else {
+        xMin = -0.5;
+        xMax = data.years.length - 0.5;
+        xTicks = data.years.map((_, i) => i);
+        xLabels = data.years;
+    }
+    const yPad = (yMax - yMin || 1) * (isScatter ? 0.05 : 0.15);
+    yMin -= yPad;
+    yMax += yPad;
+    const yTicks = niceTicks(yMin, yMax, 6);
+    
+    const sx = x => plot.left + (x - xMin) / (xMax - xMin) * (plot.right - plot.left);
+    const sy = y => plot.bottom - (y - yMin) / (yMax - yMin) * (plot.bottom - plot.top);
+    
+    ctx.strokeStyle = chartForeground;
+    ctx.globalAlpha = 0.4;
+    ctx.setLineDash([4, 4]);
+    ctx.lineWidth = 1;
+    yTicks.filter(t => t >= yMin && t <= yMax).forEach(t => {
+        ctx.beginPath();
+        ctx.moveTo(plot.left, sy(t));
+        ctx.lineTo(plot.right, sy(t));
+        ctx.stroke();
+    });
+    xTicks.filter(t => t >= xMin && t <= xMax).forEach(t => {
+        ctx.beginPath();
+        ctx.moveTo(sx(t), plot.top);
+        ctx.lineTo(sx(t), plot.bottom);
+        ctx.stroke();
+    });
+    ctx.setLineDash([]);
+    ctx.globalAlpha = 1;
+    ctx.strokeRect(plot.left, plot.top, plot.right - plot.left, plot.bottom - plot.top);
+    
+    ctx.font = '12px Roboto, sans-serif';
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    yTicks.filter(t => t >= yMin && t <= yMax).forEach(t => ctx.fillText(formatTick(t), plot.left - 6, sy(t)));
+    
+    xTicks.forEach((t, i) => {
+        if (t < xMin || t > xMax) return;
+        ctx.save();
+        ctx.translate(sx(t), plot.bottom + 6);
+        if (isScatter) {
+            ctx.textAlign = 'center';
+            ctx.textBaseline = 'top';
+        } else {
+            ctx.rotate(-Math.PI / 4);
+            ctx.textAlign = 'right';
+            ctx.textBaseline = 'middle';
+        }
+        ctx.fillText(xLabels[i], 0, 0);
+        ctx.restore();
+    });
+    
+    ctx.font = 'bold 13px Roboto, sans-serif';
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'bottom';
+    ctx.fillText(style.xLabel, (plot.left + plot.right) / 2, height - 4);
+    ctx.save();
+    ctx.translate(16, (plot.top + plot.bottom) / 2);
+    ctx.rotate(-Math.PI / 2);
+    ctx.textBaseline = 'top';
+    ctx.fillText(style.yLabel, 0, 0);
+    ctx.restore();
+    
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(plot.left, plot.top, plot.right - plot.left, plot.bottom - plot.top);
+    ctx.clip();
+    
+    if (isScatter) {
+        ctx.globalAlpha = 0.7;
+        ctx.fillStyle = style.primary;
+        ctx.strokeStyle = chartForeground;
+        for (let i = 0; i < data.x.length; i++) {
+            ctx.beginPath();
+            ctx.arc(sx(data.x[i]), sy(data.y[i]), 4, 0, 2 * Math.PI);
+            ctx.fill();
+            ctx.stroke();
+        }
+        if (data.fit) {
+            const [x0, x1] = data.x_range;
+            ctx.globalAlpha = 0.8;
+            ctx.lineWidth = 2;
+            ctx.setLineDash([8, 5]);
+            ctx.beginPath();
+            ctx.moveTo(sx(x0), sy(data.fit.slope * x0 + data.fit.intercept));
+            ctx.lineTo(sx(x1), sy(data.fit.slope * x1 + data.fit.intercept));
+            ctx.stroke();
+        }
+    } else {
+        ctx.strokeStyle = style.primary;
+        ctx.lineWidth = 2.5;
+        ctx.beginPath();
+        data.values.forEach((v, i) => i === 0 ? ctx.moveTo(sx(i), sy(v)) : ctx.lineTo(sx(i), sy(v)));
+        ctx.stroke();
+        
+        ctx.fillStyle = style.primary;
+        ctx.strokeStyle = chartForeground;
+        ctx.lineWidth = 1;
+        data.values.forEach((v, i) => {
+            ctx.beginPath();
+            ctx.arc(sx(i), sy(v), 5, 0, 2 * Math.PI);
+            ctx.fill();
+            ctx.stroke();
+        });
+        
+        ctx.fillStyle = chartForeground;
+        ctx.font = 'bold 12px Roboto, sans-serif';
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'bottom';
+        data.values.forEach((v, i) => {
+            const label = data.type === 'avg_grants' ? '$' + Math.round(v) : v.toFixed(1);
+            ctx.fillText(label, sx(i), sy(v) - 8);
         });
-}
\ No newline at end of file
+    }
+    ctx.restore();
+}
+
+// Server-rendered fallback: the browser loads the image itself, negotiating
+// WebP/PNG/SVG and revalidating with the ETag.
+function fetchGraphImage(url) {
+    const loadingOverlay = document.getElementById('loading-overlay');
+    const graphImg = document.getElementById('graph-img');
+    
+    loadingOverlay.style.display = 'flex';
+    showGraphElement('image');
+    
+    graphImg.onload = function() {
+        graphImg.alt = chartTitles[currentGraphType];
+        clearGraphErrors();
+        loadingOverlay.style.display = 'none';
+    };
+    graphImg.onerror = function() {
+        console.error('Error fetching graph image');
+        graphImg.alt = 'Error loading graph';
+        clearGraphErrors();
+        const errorText = document.createElement('div');
+        errorText.className = 'error-message';
+        errorText.textContent = 'Error loading graph';
+        document.getElementById('chart-container').appendChild(errorText);
+        loadingOverlay.style.display = 'none';
+    };
+    graphImg.src = url || `/graph/image?${graphQuery()}`;
+}
+
+function showSummaryStats(summary) {
+    document.getElementById('total-citations').textContent = summary.total_citations.toLocaleString();
+    document.getElementById('total-grants').textContent = '$' + summary.total_grants.toLocaleString();
+    document.getElementById('avg-citations').textContent = summary.avg_citations.toLocaleString();
+    document.getElementById('avg-grants').textContent = '$' + summary.avg_grants.toLocaleString();
+    document.getElementById('researchers-count').textContent = summary.researchers_count.toLocaleString();
+}
+
+// Pearson r of the current filter with its bootstrap confidence interval.
+function showCorrelation(result) {
+    const value = document.getElementById('correlation');
+    const note = document.getElementById('correlation-ci');
+    
+    if (!result || result.pearson === null) {
+        value.textContent = '-';
+        note.textContent = result ? `n = ${result.n}` : '';
+    } else {
+        value.textContent = result.pearson.toFixed(2);
+        if (result.pearson_ci) {
+            note.textContent = `${Math.round(result.confidence * 100)}% CI ${result.pearson_ci[0].toFixed(2)} to ${result.pearson_ci[1].toFixed(2)}, n = ${result.n}`;
+        } else if ('pearson_ci' in result) {
+            note.textContent = `n = ${result.n}, too few for an interval`;
+        } else {
+            note.textContent = `n = ${result.n}`;
+        }
+    }
+}
@@ -0,0 +1,301 @@
+import numpy as np
+import pandas as pd
+
+from normalize import NAME_KEY
+
+
+def cell_codes(shape, group_codes, year_codes):
+    """Flat cell of each row; missing (negative) codes go to the last group/year slot."""
+    groups = np.where(group_codes < 0, shape[0] - 1, group_codes)
+    years = np.where(year_codes < 0, shape[1] - 1, year_codes)
+    return groups.astype(np.int64) * shape[1] + years
+
+
+def cell_map(old_shape, shape):
+    """New flat cell of each old cell when a cube grows from `old_shape` to `shape`.
+
+    Existing cells keep their (group, year) position; only the missing-value
+    slots move to the end.
+    """
+    group_map = np.arange(old_shape[0])
+    group_map[-1] = shape[0] - 1
+    year_map = np.arange(old_shape[1])
+    year_map[-1] = shape[1] - 1
+    return (group_map[:, None] * shape[1] + year_map[None, :]).ravel()
+
+
+def select_cells(shape, group_ids=None, year_ids=None):
+    groups = np.arange(shape[0]) if group_ids is None else np.asarray(group_ids, dtype=np.int64)
+    years = np.arange(shape[1]) if year_ids is None else np.asarray(year_ids, dtype=np.int64)
+    return (groups[:, None] * shape[1] + years[None, :]).ravel()
+
+
+class Moments:
+    """Count, sum and sum of squares of the non-missing values in a selection."""
+
+    def __init__(self, count, total, total_sq):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return float('nan')
+        return max(self.total_sq - self.total * self.mean, 0.0) / (self.count - 1)
+
+
+class StatsCube:
+    """Per-(group, fiscal year) aggregates of a frame, built once per dataset version.
+
+    Every cell holds the count, sum and sum of squares of each numeric column
+    and the distinct ids (e.g. researcher names) that occur in it, so a
+    summary over any set of groups and years merges a handful of cells
+    instead of scanning rows. Rows with a missing group or year land in an
+    extra cell that is only included when that side is unfiltered.
+    """
+
+    def __init__(self, group_codes, n_groups, year_codes, n_years, columns, ids=None):
+        self.shape = (n_groups + 1, n_years + 1)
+        n_cells = self.shape[0] * self.shape[1]
+        self._moments = {name: np.zeros((3, n_cells)) for name in columns}
+        self._id_values = None
+        if ids is not None:
+            # Distinct ids per cell, stored CSR-style: cell c owns _ids[_id_offsets[c]:_id_offsets[c + 1]].
+            self._id_values = pd.Index([], dtype=object)
+            self._id_cells = np.zeros(0, dtype=np.int64)
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._id_offsets = np.zeros(n_cells + 1, dtype=np.int64)
+        self._add(group_codes, year_codes, columns, ids)
+
+    def _add(self, group_codes, year_codes, columns, ids):
+        n_cells = self.shape[0] * self.shape[1]
+        cells = cell_codes(self.shape, group_codes, year_codes)
+
+        for name, values in columns.items():
+            values = np.asarray(values, dtype=np.float64)
+            valid = ~np.isnan(values)
+            cell, value = cells[valid], values[valid]
+            self._moments[name] += np.stack([
+                np.bincount(cell, minlength=n_cells),
+                np.bincount(cell, weights=value, minlength=n_cells),
+                np.bincount(cell, weights=value * value, minlength=n_cells),
+            ])
+
+        if ids is None:
+            return
+        ids = pd.Series(ids)
+        present = ids.notna().to_numpy()
+        id_codes = self._id_values.get_indexer(ids)
+        unseen = present & (id_codes < 0)
+        if unseen.any():
+            new_values = pd.Index(pd.unique(ids[unseen]))
+            id_codes[unseen] = len(self._id_values) + new_values.get_indexer(ids[unseen])
+            self._id_values = self._id_values.append(new_values)
+
+        n_ids = max(len(self._id_values), 1)
+        pairs = np.unique(np.concatenate([
+            self._id_cells * n_ids + self._ids,
+            cells[present] * n_ids + id_codes[present],
+        ]))
+        self._id_cells = pairs // n_ids
+        self._ids = pairs % n_ids
+        self._id_offsets = np.searchsorted(self._id_cells, np.arange(n_cells + 1))
+
+    def extended(self, group_codes, n_groups, year_codes, n_years, columns, ids=None):
+        """A copy of the cube with more rows added, leaving this one untouched.
+
+        The codes must extend the ones the cube was built from: existing
+        groups and years keep their ids and new ones are numbered after them,
+        as `pd.factorize` does for rows appended to a column.
+        """
+        cube = StatsCube.__new__(StatsCube)
+        cube.shape = (n_groups + 1, n_years + 1)
+        mapping = cell_map(self.shape, cube.shape)
+
+        n_cells = cube.shape[0] * cube.shape[1]
+        cube._moments = {}
+        for name, moments in self._moments.items():
+            cube._moments[name] = np.zeros((3, n_cells))
+            cube._moments[name][:, mapping] = moments
+
+        cube._id_values = self._id_values
+        if self._id_values is not None:
+            cube._id_cells = mapping[self._id_cells]
+            cube._ids = self._ids
+            cube._id_offsets = np.searchsorted(cube._id_cells, np.arange(n_cells + 1))
+
+        cube._add(group_codes, year_codes, columns, ids)
+        return cube
+
+    @classmethod
+    def from_index(cls, index, df, columns, ids=None):
+        """Cube over the university x fiscal year cells of a FilterIndex built on `df`."""
+        return cls(index.university_codes, len(index.universities), index.year_codes, len(index.years),
+                   {column: df[column] for column in columns}, ids)
+
+    def cells(self, group_ids=None, year_ids=None):
+        return select_cells(self.shape, group_ids, year_ids)
+
+    def moments(self, column, cells):
+        count, total, total_sq = self._moments[column][:, cells].sum(axis=1)
+        return Moments(int(count), float(total), float(total_sq))
+
+    def distinct(self, cells):
+        cells = np.asarray(cells, dtype=np.int64)
+        starts = self._id_offsets[cells]
+        lengths = self._id_offsets[cells + 1] - starts
+        total = int(lengths.sum())
+        if total == 0 or len(cells) == 1:
+            return total
+        # Positions of every id stored in the selected cells, without a loop over the cells.
+        positions = np.arange(total) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return len(np.unique(self._ids[positions]))
+
+
+class CoMoments:
+    """Count, means and centered second moments of paired (x, y) values.
+
+    Merging uses the pairwise update of Chan et al. (the batch form of
+    Welford's algorithm), so no raw sums of squares are ever formed.
+    """
+
+    def __init__(self, count, mean_x, mean_y, m2_x, m2_y, c_xy):
+        self.count = count
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.m2_y = m2_y
+        self.c_xy = c_xy
+
+    @classmethod
+    def of(cls, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if not len(x):
+            return cls(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        dx = x - x.mean()
+        dy = y - y.mean()
+        return cls(len(x), float(x.mean()), float(y.mean()), float(dx @ dx), float(dy @ dy), float(dx @ dy))
+
+    @property
+    def pearson(self):
+        if self.count < 2 or self.m2_x <= 0 or self.m2_y <= 0:
+            return float('nan')
+        return self.c_xy / np.sqrt(self.m2_x * self.m2_y)
+
+    @property
+    def slope(self):
+        if self.count < 2 or self.m2_x <= 0:
+            return float('nan')
+        return self.c_xy / self.m2_x
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x
+
+
+def merge_comoments(count, mean_x, mean_y, m2_x, m2_y, c_xy):
+    """Merge arrays of per-part co-moments into one set (along the last axis)."""
+    total = count.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        merged_x = np.where(total > 0, (count * mean_x).sum(axis=-1) / total, 0.0)
+        merged_y = np.where(total > 0, (count * mean_y).sum(axis=-1) / total, 0.0)
+    dx = mean_x - merged_x[..., None]
+    dy = mean_y - merged_y[..., None]
+    return (total, merged_x, merged_y,
+            (m2_x + count * dx * dx).sum(axis=-1),
+            (m2_y + count * dy * dy).sum(axis=-1),
+            (c_xy + count * dx * dy).sum(axis=-1))
+
+
+class CorrelationCube:
+    """Per-(group, fiscal year) co-moments of two columns, for correlations and fits.
+
+    Same cell layout as StatsCube. Each cell keeps its count, means and
+    centered sums of squares and cross products; a filter merges its cells
+    into one CoMoments, and appended rows are merged into their cells by
+    `extended`.
+    """
+
+    FIELDS = ('count', 'mean_x', 'mean_y', 'm2_x', 'm2_y', 'c_xy')
+
+    def __init__(self, group_codes, n_groups, year_codes, n_years, x, y):
+        self.shape = (n_groups + 1, n_years + 1)
+        self._cells = self._comoments(cell_codes(self.shape, group_codes, year_codes), x, y)
+
+    def _comoments(self, cells, x, y):
+        n_cells = self.shape[0] * self.shape[1]
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        cells, x, y = cells[valid], x[valid], y[valid]
+
+        count = np.bincount(cells, minlength=n_cells).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_x = np.where(count > 0, np.bincount(cells, weights=x, minlength=n_cells) / count, 0.0)
+            mean_y = np.where(count > 0, np.bincount(cells, weights=y, minlength=n_cells) / count, 0.0)
+        # Second pass around each cell's own mean.
+        dx = x - mean_x[cells]
+        dy = y - mean_y[cells]
+        return np.stack([
+            count, mean_x, mean_y,
+            np.bincount(cells, weights=dx * dx, minlength=n_cells),
+            np.bincount(cells, weights=dy * dy, minlength=n_cells),
+            np.bincount(cells, weights=dx * dy, minlength=n_cells),
+        ])
+
+    def extended(self, group_codes, n_groups, year_codes, n_years, x, y):
+        """A copy of the cube with more rows merged in; codes as for StatsCube.extended."""
+        cube = CorrelationCube.__new__(CorrelationCube)
+        cube.shape = (n_groups + 1, n_years + 1)
+        old = np.zeros((len(self.FIELDS), cube.shape[0] * cube.shape[1]))
+        old[:, cell_map(self.shape, cube.shape)] = self._cells
+        new = cube._comoments(cell_codes(cube.shape, group_codes, year_codes), x, y)
+        cube._cells = np.stack(merge_comoments(*np.stack([old, new], axis=-1)))
+        return cube
+
+    def cells(self, group_ids=None, year_ids=None):
+        return select_cells(self.shape, group_ids, year_ids)
+
+    def comoments(self, cells):
+        count, mean_x, mean_y, m2_x, m2_y, c_xy = merge_comoments(*self._cells[:, cells])
+        return CoMoments(int(count), float(mean_x), float(mean_y), float(m2_x), float(m2_y), float(c_xy))
+
+
+class UniversityGroups:
+    """Groups names by the set of universities the Scholar records list them under.
+
+    A grant row belongs to exactly one group, so filtering grants by
+    university selects whole groups and never counts a row twice, even when
+    its researcher appears under several matching universities.
+    """
+
+    def __init__(self, name_keys, researchers):
+        university_codes, self.universities = pd.factorize(researchers["University"])
+        name_codes, names = pd.factorize(researchers[NAME_KEY])
+
+        # One bit per university in a row of bytes per name; names with equal rows form a group.
+        listed = (university_codes >= 0) & (name_codes >= 0)
+        name_codes, university_codes = name_codes[listed], university_codes[listed]
+        packed = np.zeros((len(names), (len(self.universities) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(packed, (name_codes, university_codes >> 3),
+                         (0x80 >> (university_codes & 7)).astype(np.uint8))
+        rows = packed.view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+        _, first, name_groups = np.unique(rows, return_index=True, return_inverse=True)
+
+        self._members = np.unpackbits(packed[first], axis=1, count=len(self.universities)).astype(bool)
+        self.size = len(first)
+        # A name with no Scholar record gets position -1, which picks the trailing -1 group.
+        positions = names.get_indexer(pd.Index(name_keys))
+        self.codes = np.append(name_groups.reshape(-1), -1)[positions].astype(np.intp)
+        self._university_names = pd.Series(self.universities, dtype=object)
+
+    def match(self, university):
+        """Ids of the groups containing a university that matches `university`."""
+        matches = self._university_names.str.contains(university, case=False, na=False, regex=True)
+        return np.flatnonzero(self._members[:, matches.to_numpy(dtype=bool)].any(axis=1))
@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import main
+from stats_cube import CorrelationCube
+
+N_GROUPS, N_YEARS = 3, 3
+SINGLE_ROW = (2, 0)
+CONSTANT_X = (1, 2)
+CONSTANT_Y = (0, 1)
+
+
+def rows():
+    """Integer counts and amounts, like the merged table, with one single-row and two constant cells."""
+    rng = np.random.default_rng(7)
+    groups, years, x, y = [], [], [], []
+    for group, year in itertools.product(range(N_GROUPS), range(N_YEARS)):
+        n = 1 if (group, year) == SINGLE_ROW else int(rng.integers(2, 12))
+        cell_x = rng.integers(0, 5000, n)
+        cell_y = rng.integers(5000, 200000, n)
+        if (group, year) == CONSTANT_X:
+            cell_x[:] = 1234
+        if (group, year) == CONSTANT_Y:
+            cell_y[:] = 25000
+        groups += [group] * n
+        years += [year] * n
+        x += cell_x.tolist()
+        y += cell_y.tolist()
+    order = rng.permutation(len(x))
+    return (np.array(groups)[order], np.array(years)[order],
+            np.array(x, dtype=float)[order], np.array(y, dtype=float)[order])
+
+
+def selections():
+    group_sets = [[g] for g in range(N_GROUPS)] + [[0, 1], [0, 2], None]
+    year_sets = [[year] for year in range(N_YEARS)] + [[1, 2], None]
+    return list(itertools.product(group_sets, year_sets))
+
+
+def cubes():
+    groups, years, x, y = rows()
+    whole = CorrelationCube(groups, N_GROUPS, years, N_YEARS, x, y)
+    half = len(x) // 2
+    # The first half only has groups and years 0 and 1 so extending also adds new ones.
+    first = (groups[:half] < 2) & (years[:half] < 2)
+    head = np.flatnonzero(first)
+    tail = np.concatenate([np.flatnonzero(~first), np.arange(half, len(x))])
+    extended = CorrelationCube(groups[head], 2, years[head], 2, x[head], y[head]).extended(
+        groups[tail], N_GROUPS, years[tail], N_YEARS, x[tail], y[tail])
+    return {"whole": whole, "extended": extended}
+
+
+@pytest.mark.parametrize("build", ["whole", "extended"])
+@pytest.mark.parametrize("group_ids,year_ids", selections())
+def test_merged_cells_match_numpy(build, group_ids, year_ids):
+    groups, years, x, y = rows()
+    cube = cubes()[build]
+    selected = (np.isin(groups, group_ids if group_ids is not None else range(N_GROUPS))
+                & np.isin(years, year_ids if year_ids is not None else range(N_YEARS)))
+    x, y = x[selected], y[selected]
+
+    comoments = cube.comoments(cube.cells(group_ids, year_ids))
+    stats = main.correlation_stats(comoments, float('nan'))
+    assert stats['n'] == len(x)
+    if len(x) < 2 or np.ptp(x) == 0:
+        assert stats['pearson'] is None and stats['slope'] is None and stats['intercept'] is None
+        return
+    slope, intercept = np.polyfit(x, y, 1)
+    assert comoments.slope == pytest.approx(slope, rel=1e-9)
+    assert comoments.intercept == pytest.approx(intercept, rel=1e-9, abs=1e-6)
+    if np.ptp(y) == 0:
+        assert stats['pearson'] is None
+    else:
+        assert comoments.pearson == pytest.approx(np.corrcoef(x, y)[0, 1], rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("build", ["whole", "extended"])
+@pytest.mark.parametrize("cell", [SINGLE_ROW, CONSTANT_X, CONSTANT_Y])
+def test_degenerate_cells_give_none_not_nan(build, cell):
+    cube = cubes()[build]
+    stats = main.correlation_stats(cube.comoments(cube.cells([cell[0]], [cell[1]])), float('nan'))
+    assert stats['pearson'] is None
+    assert stats['spearman'] is None
+    if cell == CONSTANT_Y:
+        assert stats['slope'] == 0.0
+    else:
+        assert stats['slope'] is None and stats['intercept'] is None
@@ -0,0 +1,28 @@
+import os
+
+from graph_cache import PRUNE_TO, DiskGraphCache
+
+IMAGE = b"x" * 1000
+
+
+def keys(n):
+    return [f"{i:02d}{'0' * 18}" for i in range(n)]
+
+
+def test_full_disk_cache_prunes_least_recently_used_files(tmp_path):
+    cache = DiskGraphCache(str(tmp_path), max_bytes=10 * len(IMAGE))
+    written = keys(10)
+    for age, key in enumerate(written):
+        cache.put(key, IMAGE)
+        os.utime(cache.path(key), (1000 + age, 1000 + age))
+    # Reading the two oldest files makes them the most recently used.
+    assert cache.get(written[0]) == IMAGE
+    assert cache.get(written[1]) == IMAGE
+    assert cache.pruned == 0
+
+    cache.put("ff" + "0" * 18, IMAGE)
+    stats = cache.stats()
+    assert stats['bytes'] <= PRUNE_TO * cache.max_bytes
+    assert cache.pruned == 2
+    assert [key for key in written if not os.path.exists(cache.path(key))] == written[2:4]
+    assert cache.get(written[0]) == IMAGE and cache.get(written[1]) == IMAGE
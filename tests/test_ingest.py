@@ -0,0 +1,74 @@
+import pytest
+
+import query
+import snapshot
+from dataset import DatasetManager
+from ingest import CsvTail, FileRewritten
+
+GRANTS = '''Name,Title,Amount($),Fiscal Year,Program
+"Tremblay, Ana",Sensor Networks,30000,2022-2023,Discovery Grants Program - Individual
+"Tremblay, Ana",Sensor Networks,30000,2023-2024,Discovery Grants Program - Individual
+"Chen, Bo",Graph Learning,45000,2023-2024,Discovery Grants Program - Individual
+'''
+LOADED = '''Ana Tremblay,McGill University,2022-2023,2016-2021,120
+'''
+APPENDED = '''Ana Tremblay,McGill University,2023-2024,2017-2022,150
+Bo Chen,University of Waterloo,2023-2024,2017-2022,80
+'''
+PARTIAL = 'Li Wei,University of Toronto,2023-2024,2017-2022,'
+
+
+def test_tail_reads_only_complete_appended_lines(tmp_path):
+    path = tmp_path / "SCHOLAR.csv"
+    path.write_text(LOADED)
+    tail = CsvTail(str(path), len(LOADED))
+    assert tail.read() == b""
+
+    with open(path, "a") as f:
+        f.write(APPENDED + PARTIAL)
+    assert tail.read() == APPENDED.encode()
+    assert tail.bytes_behind == len(PARTIAL)
+
+    with open(path, "a") as f:
+        f.write("95\n")
+    assert tail.read() == (PARTIAL + "95\n").encode()
+
+
+def test_tail_raises_when_the_file_is_rewritten_shorter(tmp_path):
+    path = tmp_path / "SCHOLAR.csv"
+    path.write_text(LOADED + APPENDED)
+    tail = CsvTail(str(path), len(LOADED + APPENDED))
+
+    path.write_text(APPENDED.splitlines(keepends=True)[1])
+    with pytest.raises(FileRewritten):
+        tail.read()
+
+
+def test_manager_ingests_appends_and_reloads_a_rewrite(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    citations_path = tmp_path / "SCHOLAR.csv"
+    citations_path.write_text(LOADED)
+    (tmp_path / "NSERC.csv").write_text(GRANTS)
+    manager = DatasetManager(str(citations_path), str(tmp_path / "NSERC.csv"),
+                             lambda citations, grants: query.execute(query.merged_query(citations, grants)))
+    assert len(manager.load().merged) == 1
+
+    with open(citations_path, "a") as f:
+        f.write(APPENDED + PARTIAL)
+    dataset = manager.refresh()
+    assert (manager.full_reloads, manager.incremental_updates, manager.ingested_rows) == (1, 1, 2)
+    assert dataset.citations["Name"].tolist() == ["Ana Tremblay", "Ana Tremblay", "Bo Chen"]
+    assert sorted(dataset.merged["CitationCount"]) == [80, 120, 150]
+    assert manager.ingest_status()["bytes_behind"] == len(PARTIAL)
+
+    with open(citations_path, "a") as f:
+        f.write("95\n")
+    dataset = manager.refresh()
+    assert (manager.incremental_updates, manager.ingested_rows) == (2, 3)
+    assert dataset.citations["Name"].tolist()[-1] == "Li Wei"
+
+    citations_path.write_text(APPENDED)
+    dataset = manager.refresh()
+    assert (manager.full_reloads, manager.incremental_updates) == (2, 2)
+    assert dataset.citations["Name"].tolist() == ["Ana Tremblay", "Bo Chen"]
+    assert sorted(dataset.merged["CitationCount"]) == [80, 150]
@@ -0,0 +1,59 @@
+import shutil
+
+from jobstore import DONE, NOT_FOUND, PENDING, JobStore, read_rows
+
+JOBS = [("Tremblay, Ana", "2022-2023"), ("Tremblay, Ana", "2023-2024"),
+        ("Chen, Bo", "2023-2024"), ("Wei, Li", "2023-2024")]
+CITATIONS = '''Name,University,Fiscal Year,CitationWindow,CitationCount
+Ana Tremblay,McGill University,2022-2023,2016-2021,120
+Someone Else,Brock University,2023-2024,2017-2022,7
+'''
+
+
+def job_states(store):
+    return {(name, fiscal_year): (state, attempts, count) for name, fiscal_year, state, attempts, count in
+            store._conn.execute("SELECT name, fiscal_year, state, attempts, citation_count FROM jobs")}
+
+
+def carried_names(store):
+    return [name for name, in store._conn.execute("SELECT name FROM carried_rows ORDER BY position")]
+
+
+def test_reimporting_keeps_states_and_adds_no_duplicates(tmp_path):
+    csv_path = tmp_path / "researcher_citations.csv"
+    csv_path.write_text(CITATIONS)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.seed(JOBS, "nserc-v1")
+
+    store.import_csv(str(csv_path))
+    store.import_csv(str(csv_path))
+    assert store.counts() == {DONE: 1, PENDING: 3}
+    assert carried_names(store) == ["Someone Else"]
+
+    claimed = store.claim_authors(10)
+    assert claimed == {"Tremblay, Ana": ["2023-2024"], "Chen, Bo": ["2023-2024"], "Wei, Li": ["2023-2024"]}
+    store.record([
+        ("Tremblay, Ana", "2023-2024", DONE, ["Ana Tremblay", "McGill University", "2023-2024", "2017-2022", 150]),
+        ("Wei, Li", "2023-2024", NOT_FOUND, ["Wei, Li", "NOT_FOUND", "2023-2024", "N/A", -1]),
+    ])
+    store.fail([("Chen, Bo", "2023-2024", "HTTP 429")])
+    advanced = job_states(store)
+    assert store.export_csv(str(csv_path)) == 4
+    exported = read_rows(str(csv_path))
+    store.close()
+
+    # A restart re-imports the exported file, and a copy of it that was never imported.
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.import_csv(str(csv_path))
+    copy_path = tmp_path / "restored.csv"
+    shutil.copy(csv_path, copy_path)
+    store.import_csv(str(copy_path))
+    store.seed(JOBS, "nserc-v1")
+
+    assert job_states(store) == advanced
+    assert advanced[("Chen, Bo", "2023-2024")] == (PENDING, 1, None)
+    assert carried_names(store) == ["Someone Else"]
+    assert store.export_csv(str(csv_path)) == 4
+    assert read_rows(str(csv_path)) == exported
+    assert len({tuple(row) for row in exported}) == len(exported)
+    store.close()
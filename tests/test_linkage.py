@@ -0,0 +1,47 @@
+import pandas as pd
+
+import query
+import snapshot
+from dataset import DatasetManager
+from linkage import LINK_THRESHOLD, NameLinker, name_score, name_tokens
+from normalize import NAME_KEY, name_keys
+
+GRANTS = '''Name,Title,Amount($),Fiscal Year,Program
+"Abou-Zeid, Hatem",Robust Intelligence for Beyond-5G Networks and Applications,24000,2023-2024,Discovery Grants Program - Individual
+"AbouZeid, Hatem",Robust Intelligence for Beyond-5G Networks and Applications,24000,2021-2022,Discovery Grants Program - Individual
+"AbouZeid, Hatem",Robust Intelligence for Beyond-5G Networks and Applications,24000,2022-2023,Discovery Grants Program - Individual
+'''
+CITATIONS = '''Hatem Abou-Zeid,University of Calgary,2021-2022,2015-2020,543
+Hatem Abou-Zeid,University of Calgary,2022-2023,2016-2021,798
+Hatem Abou-Zeid,University of Calgary,2023-2024,2017-2022,706
+'''
+
+
+def test_grant_spellings_share_one_key():
+    grants = pd.DataFrame({"Name": ["Abou-Zeid, Hatem", "AbouZeid, Hatem", "AbouZeid, Hatem"]})
+    grants[NAME_KEY] = name_keys(grants["Name"])
+    linker = NameLinker(grants[NAME_KEY])
+    assert linker.canonicalize(grants)[NAME_KEY].unique().tolist() == ["hatem abou-zeid"]
+    assert linker.link(pd.Series(["hatem abou-zeid"])).empty
+
+
+def test_a_given_name_prefix_alone_does_not_link():
+    grants = pd.Series(name_keys(pd.Series(["Smith, Christine", "Hall, Kimberley"])))
+    linker = NameLinker(grants)
+    assert name_score(name_tokens("chris smith"), name_tokens("christine smith")) < LINK_THRESHOLD
+    links = linker.link(pd.Series(["chris smith", "kimberly r. hall"]))
+    assert links[["Scholar Key", "Grant Key"]].values.tolist() == [["kimberly r. hall", "kimberley hall"]]
+
+
+def test_every_fiscal_year_of_a_respelled_holder_is_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    (tmp_path / "NSERC.csv").write_text(GRANTS)
+    (tmp_path / "SCHOLAR.csv").write_text(CITATIONS)
+    manager = DatasetManager(str(tmp_path / "SCHOLAR.csv"), str(tmp_path / "NSERC.csv"),
+                             lambda citations, grants: query.execute(query.merged_query(citations, grants)))
+
+    merged = manager.load().merged
+
+    assert sorted(merged["Fiscal Year"]) == ["2021-2022", "2022-2023", "2023-2024"]
+    assert set(merged["Name"]) == {"hatem abou-zeid"}
+    assert merged["Amount($)"].tolist() == [24000, 24000, 24000]
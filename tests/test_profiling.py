@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from flask import Flask
+
+import profiling
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    app = Flask(__name__)
+
+    @app.route('/data/summary')
+    def summary():
+        return {'total': sum(range(100000))}
+
+    profiling.install(app)
+    return app.test_client()
+
+
+@pytest.mark.parametrize("query", ["", "?profile=wrong", "?profile="])
+def test_profiles_listing_needs_the_token(client, query):
+    assert client.get(f"/admin/profiles{query}").status_code == 403
+    assert client.get(f"/admin/profiles/anything.json{query}").status_code == 403
+
+
+def test_wrong_token_is_not_profiled(client, tmp_path):
+    response = client.get("/data/summary?profile=wrong")
+    assert response.status_code == 200
+    assert "X-Profile" not in response.headers
+    assert not os.path.exists(tmp_path / "profiles")
+
+
+@pytest.mark.parametrize("profiler,suffix", [("sample", ".folded"), ("cprofile", ".prof")])
+def test_profiled_request_is_written_to_the_profile_dir(client, tmp_path, profiler, suffix):
+    response = client.get(f"/data/summary?profile={TOKEN}&profiler={profiler}")
+    assert response.status_code == 200
+    filename = response.headers["X-Profile"]
+    assert filename.endswith(suffix) and "data-summary" in filename
+    assert sorted(os.listdir(tmp_path / "profiles")) == sorted([filename, filename[:-len(suffix)] + ".json"])
+
+    listing = client.get("/admin/profiles", headers={"X-Profile-Token": TOKEN})
+    assert listing.status_code == 200
+    assert [details['file'] for details in listing.get_json()['profiles']] == [filename]
+    download = client.get(f"/admin/profiles/{filename}?profile={TOKEN}")
+    assert download.status_code == 200
+    assert download.data == (tmp_path / "profiles" / filename).read_bytes()
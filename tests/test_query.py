@@ -0,0 +1,128 @@
+import os
+
+import pandas as pd
+import pytest
+
+import query
+from dashboard import graph_query
+from dataset import load_citations_csv, load_grants_csv
+from filter_index import FilterIndex
+from graph_data import GRAPH_TYPES
+from normalize import name_keys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNIVERSITIES = ["all", "Calgary", "university of"]
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return (load_citations_csv(os.path.join(REPO_ROOT, "SCHOLAR.csv")),
+            load_grants_csv(os.path.join(REPO_ROOT, "NSERC.csv")))
+
+
+def naive_merged(citations, grants):
+    left = pd.DataFrame({
+        "Name": name_keys(citations["Name"], flip=False),
+        "University": citations["University"],
+        "Fiscal Year": citations["Fiscal Year"].astype(str).str.strip(),
+        "CitationCount": pd.to_numeric(citations["CitationCount"], errors="coerce"),
+    })
+    right = pd.DataFrame({
+        "Name": name_keys(grants["Name"]),
+        "Fiscal Year": grants["Fiscal Year"].astype(str).str.strip(),
+        "Amount($)": pd.to_numeric(grants["Amount($)"], errors="coerce"),
+    })
+    merged = left.merge(right, on=["Name", "Fiscal Year"])
+    return merged[merged["CitationCount"].notna() & merged["Amount($)"].notna() & (merged["CitationCount"] >= 0)]
+
+
+def naive_filter(df, university, time_frame):
+    if university != "all":
+        df = df[df["University"].str.contains(university, case=False, na=False)]
+    if time_frame != "all":
+        years = sorted(df["Fiscal Year"].unique(), reverse=True)[:int(time_frame[:-1])]
+        df = df[df["Fiscal Year"].isin(years)]
+    return df
+
+
+def naive_graph(df, graph_type):
+    if graph_type == "avg_citations":
+        return df.groupby("Fiscal Year")["CitationCount"].mean().reset_index()
+    if graph_type == "avg_grants":
+        return df.groupby("Fiscal Year")["Amount($)"].mean().reset_index()
+    return df[["CitationCount", "Amount($)"]]
+
+
+def assert_same_rows(actual, expected):
+    # Only the row order of an unaggregated join may differ from pd.merge's.
+    columns = list(expected.columns)
+    assert list(actual.columns) == columns
+    pd.testing.assert_frame_equal(actual.sort_values(columns).reset_index(drop=True),
+                                  expected.sort_values(columns).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in query.children(plan):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.parametrize("time_frame", query.TIME_FRAMES)
+@pytest.mark.parametrize("university", UNIVERSITIES)
+@pytest.mark.parametrize("graph_type", GRAPH_TYPES)
+def test_optimized_graph_query_matches_pandas(frames, graph_type, university, time_frame):
+    citations, grants = frames
+    expected = naive_graph(naive_filter(naive_merged(citations, grants), university, time_frame), graph_type)
+
+    plan = graph_query(citations, grants, graph_type, university, time_frame)
+    assert_same_rows(query.execute(query.optimize(plan)), expected)
+
+
+@pytest.mark.parametrize("time_frame", query.TIME_FRAMES)
+@pytest.mark.parametrize("university", UNIVERSITIES)
+def test_filtered_query_matches_pandas(frames, university, time_frame):
+    merged = query.execute(query.merged_query(*frames)).reset_index(drop=True)
+    expected = naive_filter(merged, university, time_frame)
+
+    for index in (None, FilterIndex(merged)):
+        actual = query.execute(query.filtered_query(merged, university, time_frame, index))
+        pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("time_frame", ["1y", "3y"])
+def test_recent_years_limit_the_join_inputs(frames, time_frame):
+    plan = query.optimize(graph_query(*frames, "citation_vs_grants", "Calgary", time_frame))
+    join = next(node for node in plan_nodes(plan) if isinstance(node, query.Join))
+    assert join.recent is not None and join.recent.n == int(time_frame[:-1])
+
+
+def test_scans_read_only_the_columns_used(frames):
+    plan = query.optimize(graph_query(*frames, "avg_grants", "Calgary", "3y"))
+    scans = {node.name: node for node in plan_nodes(plan) if isinstance(node, query.Scan)}
+    # University and CitationCount are only read by the predicates pushed onto the citations scan.
+    assert set(scans["citations"].needed) == {"Name", "Fiscal Year"}
+    assert {column for predicate in scans["citations"].predicates for column in predicate.columns} == \
+        {"University", "CitationCount"}
+    assert set(scans["grants"].needed) == {"Name", "Fiscal Year", "Amount($)"}
+
+
+def test_recent_years_fall_back_when_the_latest_shared_year_has_no_match():
+    citations = pd.DataFrame({
+        "Name": ["Ana Tremblay", "Ana Tremblay", "Li Wei"],
+        "University": ["McGill University"] * 3,
+        "Fiscal Year": ["2021-2022", "2022-2023", "2023-2024"],
+        "CitationWindow": ["", "", ""],
+        "CitationCount": [10, 20, 30],
+    })
+    grants = pd.DataFrame({
+        "Name": ["Tremblay, Ana", "Tremblay, Ana", "Chen, Bo"],
+        "Fiscal Year": ["2021-2022", "2022-2023", "2023-2024"],
+        "Amount($)": [1000, 2000, 3000],
+    })
+    # 2023-2024 is the latest year on both sides, but no one has a citation count and a grant in it.
+    expected = naive_filter(naive_merged(citations, grants), "all", "1y")
+    assert expected["Fiscal Year"].tolist() == ["2022-2023"]
+
+    plan = graph_query(citations, grants, "citation_vs_grants", "all", "1y")
+    assert_same_rows(query.execute(query.optimize(plan)), naive_graph(expected, "citation_vs_grants"))
@@ -0,0 +1,53 @@
+import glob
+import os
+
+import pytest
+
+import scholar_extract
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "scholar")
+PAGES = sorted(glob.glob(os.path.join(PAGES_DIR, "*.html")))
+METHODS = ("author_id", "profile", "publications")
+BACKENDS = [name for name in scholar_extract.BACKENDS if name != "bs4"]
+
+
+def read_page(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def extract(extractor, html):
+    return {method: getattr(extractor, method)(html) for method in METHODS}
+
+
+def malformed_pages():
+    profile = read_page(os.path.join(PAGES_DIR, "Qq7rT1sAAAAJ.html"))
+    return {
+        "truncated profile": profile[:len(profile) // 2],
+        "unclosed tags": '<html><body><div id="gsc_prf_in">Ana <b>Tremblay<div class="gsc_prf_il">McGill'
+                         '<table><tr class="gsc_a_tr"><td><a class="gsc_a_ac">12<td><span class="gsc_a_h">2019',
+        "not html": "Service unavailable\n",
+        "empty": "",
+    }
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("path", PAGES, ids=os.path.basename)
+def test_backends_match_bs4_on_saved_pages(path, backend):
+    html = read_page(path)
+    expected = extract(scholar_extract.BeautifulSoupExtractor(), html)
+    assert extract(scholar_extract.get_extractor(backend), html) == expected
+
+
+@pytest.mark.parametrize("backend", list(scholar_extract.BACKENDS))
+def test_search_without_results_has_no_author(backend):
+    html = read_page(os.path.join(PAGES_DIR, "search-nobody-known.html"))
+    assert scholar_extract.get_extractor(backend).author_id(html) is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", list(malformed_pages()))
+def test_backends_match_bs4_on_malformed_pages(name, backend):
+    html = malformed_pages()[name]
+    expected = extract(scholar_extract.BeautifulSoupExtractor(), html)
+    assert extract(scholar_extract.get_extractor(backend), html) == expected
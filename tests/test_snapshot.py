@@ -0,0 +1,40 @@
+import os
+import shutil
+
+import dataset
+import main
+import snapshot
+from dataset import DatasetManager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load(tmp_path):
+    builds = []
+
+    def build(citations, grants):
+        builds.append(1)
+        return main.preprocess_data(citations, grants)
+
+    manager = DatasetManager(str(tmp_path / "SCHOLAR.csv"), str(tmp_path / "NSERC.csv"), build)
+    return manager.load(), len(builds)
+
+
+def test_merged_snapshot_is_keyed_on_the_merge_code_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    for name in ("SCHOLAR.csv", "NSERC.csv"):
+        shutil.copy(os.path.join(REPO_ROOT, name), tmp_path / name)
+
+    first, builds = load(tmp_path)
+    assert builds == 1
+    assert snapshot.read_manifest("merged")["version"] == first.version
+    reloaded, builds = load(tmp_path)
+    assert (reloaded.version, builds) == (first.version, 0)
+    assert reloaded.merged.equals(first.merged)
+
+    for constant in ("MERGE_VERSION", "NORMALIZE_VERSION"):
+        monkeypatch.setattr(dataset, constant, getattr(dataset, constant) + 1)
+        bumped, builds = load(tmp_path)
+        assert builds == 1
+        assert bumped.version != first.version
+        assert snapshot.read_manifest("merged")["version"] == bumped.version
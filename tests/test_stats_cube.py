@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+import main
+import query
+import snapshot
+from dataset import DatasetManager
+from normalize import NAME_KEY
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNIVERSITIES = ["all", "Calgary", "university of", "Toronto", "Nowhere"]
+
+
+def recent(df, time_frame):
+    if time_frame == "all":
+        return df
+    years = sorted(df["Fiscal Year"].unique(), reverse=True)[:int(time_frame[:-1])]
+    return df[df["Fiscal Year"].isin(years)]
+
+
+def pandas_summary(dataset, university, time_frame):
+    merged = dataset.merged
+    grants = recent(dataset.grants, time_frame)
+    if university != "all":
+        merged = merged[merged["University"].str.contains(university, case=False, na=False)]
+        citations = dataset.citations
+        names = citations.loc[citations["University"].str.contains(university, case=False, na=False), NAME_KEY]
+        grants = grants[grants[NAME_KEY].isin(set(names))]
+    merged = recent(merged, time_frame)
+    return {
+        'total_citations': int(merged["CitationCount"].sum()),
+        'total_grants': int(grants["Amount($)"].sum()),
+        'avg_citations': merged["CitationCount"].mean(),
+        'avg_grants': grants["Amount($)"].mean(),
+        'researchers_count': merged["Name"].nunique(),
+    }
+
+
+@pytest.fixture
+def ingested(tmp_path, monkeypatch):
+    """The repo's data loaded in two parts, so its cubes were extended by an incremental ingest."""
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    with open(os.path.join(REPO_ROOT, "SCHOLAR.csv"), "rb") as f:
+        lines = f.readlines()
+    shutil.copy(os.path.join(REPO_ROOT, "NSERC.csv"), tmp_path / "NSERC.csv")
+    (tmp_path / "SCHOLAR.csv").write_bytes(b"".join(lines[:len(lines) // 2]))
+    manager = DatasetManager(str(tmp_path / "SCHOLAR.csv"), str(tmp_path / "NSERC.csv"), main.preprocess_data)
+    manager.load()
+    with open(tmp_path / "SCHOLAR.csv", "ab") as f:
+        f.writelines(lines[len(lines) // 2:])
+    dataset = manager.refresh()
+    assert manager.incremental_updates == 1
+    return dataset
+
+
+@pytest.mark.parametrize("time_frame", query.TIME_FRAMES)
+@pytest.mark.parametrize("university", UNIVERSITIES)
+def test_cube_summary_matches_a_pandas_scan(university, time_frame):
+    dataset = main.dataset_manager.get()
+    assert main.summary_stats(dataset, university, time_frame) == \
+        pytest.approx(pandas_summary(dataset, university, time_frame), abs=0.01, nan_ok=True)
+
+
+@pytest.mark.parametrize("time_frame", query.TIME_FRAMES)
+def test_extended_cube_summary_matches_a_pandas_scan(ingested, time_frame):
+    for university in UNIVERSITIES:
+        assert main.summary_stats(ingested, university, time_frame) == \
+            pytest.approx(pandas_summary(ingested, university, time_frame), abs=0.01, nan_ok=True)
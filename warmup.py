@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupJob:
+    def __init__(self, version, total):
+        self.version = version
+        self.total = total
+        self.rendered = 0
+        self.cached = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.time()
+        self.finished = None
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.rendered + self.cached + self.skipped + self.failed
+
+    def count(self, outcome):
+        """Record one 'rendered', 'cached', 'skipped' or 'failed' combination and return how many are done."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            return self.done
+
+    def status(self):
+        end = self.finished or time.time()
+        return {
+            'version': self.version,
+            'total': self.total,
+            'done': self.done,
+            'rendered': self.rendered,
+            'cached': self.cached,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'running': self.finished is None and not self.cancelled.is_set(),
+            'cancelled': self.cancelled.is_set(),
+            'seconds': round(end - self.started, 3),
+        }
+
+
+class GraphWarmup:
+    """Renders every graph filter combination of a dataset version into the graph cache.
+
+    `start` returns immediately; the renders run on a background thread,
+    `parallelism` at a time, and skip anything the cache (memory or disk)
+    already holds. Starting a job for a newer dataset cancels the previous
+    one. `key(dataset, combination)` names a cache entry and
+    `render(dataset, *combination)` produces it, or returns None when the
+    combination has nothing worth caching (such as a "no data" message).
+    """
+
+    def __init__(self, cache, key, render, combinations, parallelism=1):
+        self.cache = cache
+        self.key = key
+        self.render = render
+        self.combinations = combinations
+        self.parallelism = max(parallelism, 1)
+        self._job = None
+        self._lock = threading.Lock()
+
+    def start(self, dataset):
+        combinations = list(self.combinations())
+        job = WarmupJob(dataset.version, len(combinations))
+        with self._lock:
+            if self._job is not None:
+                self._job.cancelled.set()
+            self._job = job
+        threading.Thread(target=self._run, args=(job, dataset, combinations),
+                         name=f"graph-warmup-{dataset.version}", daemon=True).start()
+        return job
+
+    def cancel(self):
+        """Stop the running job, if any, after the renders already under way."""
+        with self._lock:
+            if self._job is not None:
+                self._job.cancelled.set()
+
+    def _warm(self, job, dataset, combination, progress_step):
+        if job.cancelled.is_set():
+            return
+        key = self.key(dataset, combination)
+        try:
+            if self.cache.contains(key):
+                done = job.count('cached')
+            else:
+                image = self.render(dataset, *combination)
+                if image is None:
+                    done = job.count('skipped')
+                else:
+                    self.cache.put(key, image)
+                    done = job.count('rendered')
+        except Exception as e:
+            logger.error(f"Error warming graph {combination}: {str(e)}")
+            done = job.count('failed')
+        if done % progress_step == 0 or done == job.total:
+            logger.info(f"Graph warm-up {job.version}: {done}/{job.total} "
+                        f"({job.rendered} rendered, {job.cached} cached, {job.skipped} skipped, {job.failed} failed)")
+
+    def _run(self, job, dataset, combinations):
+        logger.info(f"Graph warm-up {job.version}: {job.total} combinations, {self.parallelism} at a time")
+        progress_step = max(job.total // 10, 1)
+        with ThreadPoolExecutor(self.parallelism, thread_name_prefix="graph-warmup") as executor:
+            for combination in combinations:
+                executor.submit(self._warm, job, dataset, combination, progress_step)
+        job.finished = time.time()
+        if job.cancelled.is_set():
+            logger.info(f"Graph warm-up {job.version} cancelled after {job.done}/{job.total}")
+            return
+        logger.info(f"Graph warm-up {job.version} finished in {job.finished - job.started:.1f}s: "
+                    f"{job.rendered} rendered, {job.cached} already cached, {job.skipped} skipped, {job.failed} failed")
+
+    def status(self):
+        job = self._job
+        return job.status() if job is not None else None